@@ -4,4 +4,5 @@ api_blueprint = Blueprint('api', __name__)
 
 from . import routes_info
 from . import routes_data
-from . import routes_update_conf
\ No newline at end of file
+from . import routes_update_conf
+from . import routes_debug
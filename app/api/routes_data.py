@@ -8,9 +8,19 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from lib.update_data import CapacityConfigManager
+from lib.capacity_matrix import reload_capacity_matrix
 from lib.logger import app_logger as logger
+from app.utils import require_leader
 
-config_manager = CapacityConfigManager()
+_config_manager = None
+
+
+def get_config_manager():
+    """容量配置管理接口，第一次使用时才连接数据库，导入应用(例如基准测试)不需要数据库"""
+    global _config_manager
+    if _config_manager is None:
+        _config_manager = CapacityConfigManager()
+    return _config_manager
 
 # 辅助函数: 响应包装器
 def api_response(func):
@@ -35,25 +45,41 @@ def api_response(func):
             }), 500
     return wrapper
 
+# 辅助函数: 配置写入成功后重建内存中的容量矩阵快照
+def reload_matrix_on_write(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        code = result[1] if isinstance(result, tuple) and len(result) == 2 else 200
+        if code < 400:
+            try:
+                reload_capacity_matrix()
+            except Exception as e:
+                logger.error(f"重建容量矩阵失败: {str(e)}")
+        return result
+    return wrapper
+
 # ==================== CapacityLevel API ====================
 @api_blueprint.route('/capacity_levels', methods=['GET'])
 @api_response
 def get_capacity_levels():
     """获取所有容量级别"""
-    levels = config_manager.get_capacity_level()
+    levels = get_config_manager().get_capacity_level()
     return [{"id": level.id, "user_capacity": level.user_capacity} for level in levels]
 
 @api_blueprint.route('/capacity_levels/<int:id>', methods=['GET'])
 @api_response
 def get_capacity_level(id):
     """获取特定容量级别"""
-    level = config_manager.get_capacity_level(id=id)
+    level = get_config_manager().get_capacity_level(id=id)
     if not level:
         return {"message": f"未找到ID为 {id} 的容量级别"}, 404
     return {"id": level.id, "user_capacity": level.user_capacity}
 
 @api_blueprint.route('/capacity_levels', methods=['POST'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def create_capacity_level():
     """创建新的容量级别"""
     data = request.get_json()
@@ -61,7 +87,7 @@ def create_capacity_level():
         return {"message": "缺少必要参数: user_capacity"}, 400
     
     user_capacity = data['user_capacity']
-    level = config_manager.create_capacity_level(user_capacity)
+    level = get_config_manager().create_capacity_level(user_capacity)
     
     if not level:
         return {"message": f"创建容量级别失败，用户容量 {user_capacity} 可能已存在"}, 400
@@ -69,26 +95,30 @@ def create_capacity_level():
     return {"id": level.id, "user_capacity": level.user_capacity}, 201
 
 @api_blueprint.route('/capacity_levels/<int:id>', methods=['PUT'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def update_capacity_level(id):
     """更新容量级别"""
     data = request.get_json()
     if not data or 'user_capacity' not in data:
         return {"message": "缺少必要参数: user_capacity"}, 400
     
-    success = config_manager.update_capacity_level(id, data['user_capacity'])
+    success = get_config_manager().update_capacity_level(id, data['user_capacity'])
     
     if not success:
         return {"message": f"更新容量级别失败，ID {id} 不存在或用户容量已被使用"}, 400
     
-    level = config_manager.get_capacity_level(id=id)
+    level = get_config_manager().get_capacity_level(id=id)
     return {"id": level.id, "user_capacity": level.user_capacity}
 
 @api_blueprint.route('/capacity_levels/<int:id>', methods=['DELETE'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def delete_capacity_level(id):
     """删除容量级别"""
-    success = config_manager.delete_capacity_level(id)
+    success = get_config_manager().delete_capacity_level(id)
     
     if not success:
         return {"message": f"删除容量级别失败，ID {id} 不存在"}, 404
@@ -100,14 +130,14 @@ def delete_capacity_level(id):
 @api_response
 def get_all_services():
     """获取所有服务配置"""
-    services = config_manager.get_service_config()
+    services = get_config_manager().get_service_config()
     return [format_service(service) for service in services]
 
 @api_blueprint.route('/capacity_levels/<int:capacity_id>/services', methods=['GET'])
 @api_response
 def get_level_services(capacity_id):
     """获取特定容量级别的所有服务配置"""
-    services = config_manager.get_service_config(capacity_level_id=capacity_id)
+    services = get_config_manager().get_service_config(capacity_level_id=capacity_id)
     if services is None:
         return {"message": f"获取服务配置失败或容量级别 {capacity_id} 不存在"}, 404
     return [format_service(service) for service in services]
@@ -116,13 +146,15 @@ def get_level_services(capacity_id):
 @api_response
 def get_service(id):
     """获取特定服务配置"""
-    service = config_manager.get_service_config(id=id)
+    service = get_config_manager().get_service_config(id=id)
     if not service:
         return {"message": f"未找到ID为 {id} 的服务配置"}, 404
     return format_service(service)
 
 @api_blueprint.route('/services', methods=['POST'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def create_service():
     """创建新的服务配置"""
     data = request.get_json()
@@ -132,7 +164,7 @@ def create_service():
         if field not in data:
             return {"message": f"缺少必要参数: {field}"}, 400
     
-    service = config_manager.create_service_config(
+    service = get_config_manager().create_service_config(
         capacity_level_id=data['capacity_level_id'],
         service_name=data['service_name'],
         namespace=data['namespace'],
@@ -147,11 +179,13 @@ def create_service():
     return format_service(service), 201
 
 @api_blueprint.route('/services/<int:id>', methods=['PUT'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def update_service(id):
     """更新服务配置"""
     data = request.get_json()
-    success = config_manager.update_service_config(
+    success = get_config_manager().update_service_config(
         id=id,
         replicas=data.get('replicas'),
         hpa_name=data.get('hpa_name'),
@@ -161,14 +195,16 @@ def update_service(id):
     if not success:
         return {"message": f"更新服务配置失败，ID {id} 不存在"}, 404
     
-    service = config_manager.get_service_config(id=id)
+    service = get_config_manager().get_service_config(id=id)
     return format_service(service)
 
 @api_blueprint.route('/services/<int:id>', methods=['DELETE'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def delete_service(id):
     """删除服务配置"""
-    success = config_manager.delete_service_config(id)
+    success = get_config_manager().delete_service_config(id)
     
     if not success:
         return {"message": f"删除服务配置失败，ID {id} 不存在"}, 404
@@ -180,14 +216,14 @@ def delete_service(id):
 @api_response
 def get_all_redis_configs():
     """获取所有Redis配置"""
-    configs = config_manager.get_redis_config()
+    configs = get_config_manager().get_redis_config()
     return [format_redis(config) for config in configs]
 
 @api_blueprint.route('/capacity_levels/<int:capacity_id>/redis', methods=['GET'])
 @api_response
 def get_level_redis(capacity_id):
     """获取特定容量级别的Redis配置"""
-    config = config_manager.get_redis_config(capacity_level_id=capacity_id)
+    config = get_config_manager().get_redis_config(capacity_level_id=capacity_id)
     if not config:
         return {"message": f"未找到容量级别 {capacity_id} 的Redis配置"}, 404
     return format_redis(config)
@@ -196,20 +232,22 @@ def get_level_redis(capacity_id):
 @api_response
 def get_redis(id):
     """获取特定Redis配置"""
-    config = config_manager.get_redis_config(id=id)
+    config = get_config_manager().get_redis_config(id=id)
     if not config:
         return {"message": f"未找到ID为 {id} 的Redis配置"}, 404
     return format_redis(config)
 
 @api_blueprint.route('/redis', methods=['POST'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def create_redis():
     """创建新的Redis配置"""
     data = request.get_json()
     if 'capacity_level_id' not in data:
         return {"message": "缺少必要参数: capacity_level_id"}, 400
     
-    config = config_manager.create_redis_config(
+    config = get_config_manager().create_redis_config(
         capacity_level_id=data['capacity_level_id'],
         instance_type=data.get('instance_type'),
         memory_gb=data.get('memory_gb'),
@@ -222,11 +260,13 @@ def create_redis():
     return format_redis(config), 201
 
 @api_blueprint.route('/redis/<int:id>', methods=['PUT'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def update_redis(id):
     """更新Redis配置"""
     data = request.get_json()
-    success = config_manager.update_redis_config(
+    success = get_config_manager().update_redis_config(
         id=id,
         instance_type=data.get('instance_type'),
         memory_gb=data.get('memory_gb'),
@@ -236,14 +276,16 @@ def update_redis(id):
     if not success:
         return {"message": f"更新Redis配置失败，ID {id} 不存在"}, 404
     
-    config = config_manager.get_redis_config(id=id)
+    config = get_config_manager().get_redis_config(id=id)
     return format_redis(config)
 
 @api_blueprint.route('/redis/<int:id>', methods=['DELETE'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def delete_redis(id):
     """删除Redis配置"""
-    success = config_manager.delete_redis_config(id)
+    success = get_config_manager().delete_redis_config(id)
     
     if not success:
         return {"message": f"删除Redis配置失败，ID {id} 不存在"}, 404
@@ -255,14 +297,14 @@ def delete_redis(id):
 @api_response
 def get_all_postgres_configs():
     """获取所有Postgres配置"""
-    configs = config_manager.get_postgres_config()
+    configs = get_config_manager().get_postgres_config()
     return [format_postgres(config) for config in configs]
 
 @api_blueprint.route('/capacity_levels/<int:capacity_id>/postgres', methods=['GET'])
 @api_response
 def get_level_postgres(capacity_id):
     """获取特定容量级别的Postgres配置"""
-    config = config_manager.get_postgres_config(capacity_level_id=capacity_id)
+    config = get_config_manager().get_postgres_config(capacity_level_id=capacity_id)
     if not config:
         return {"message": f"未找到容量级别 {capacity_id} 的Postgres配置"}, 404
     return format_postgres(config)
@@ -271,20 +313,22 @@ def get_level_postgres(capacity_id):
 @api_response
 def get_postgres(id):
     """获取特定Postgres配置"""
-    config = config_manager.get_postgres_config(id=id)
+    config = get_config_manager().get_postgres_config(id=id)
     if not config:
         return {"message": f"未找到ID为 {id} 的Postgres配置"}, 404
     return format_postgres(config)
 
 @api_blueprint.route('/postgres', methods=['POST'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def create_postgres():
     """创建新的Postgres配置"""
     data = request.get_json()
     if 'capacity_level_id' not in data:
         return {"message": "缺少必要参数: capacity_level_id"}, 400
     
-    config = config_manager.create_postgres_config(
+    config = get_config_manager().create_postgres_config(
         capacity_level_id=data['capacity_level_id'],
         instance_type=data.get('instance_type'),
         cpu=data.get('cpu'),
@@ -297,11 +341,13 @@ def create_postgres():
     return format_postgres(config), 201
 
 @api_blueprint.route('/postgres/<int:id>', methods=['PUT'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def update_postgres(id):
     """更新Postgres配置"""
     data = request.get_json()
-    success = config_manager.update_postgres_config(
+    success = get_config_manager().update_postgres_config(
         id=id,
         instance_type=data.get('instance_type'),
         cpu=data.get('cpu'),
@@ -311,14 +357,16 @@ def update_postgres(id):
     if not success:
         return {"message": f"更新Postgres配置失败，ID {id} 不存在"}, 404
     
-    config = config_manager.get_postgres_config(id=id)
+    config = get_config_manager().get_postgres_config(id=id)
     return format_postgres(config)
 
 @api_blueprint.route('/postgres/<int:id>', methods=['DELETE'])
+@require_leader
 @api_response
+@reload_matrix_on_write
 def delete_postgres(id):
     """删除Postgres配置"""
-    success = config_manager.delete_postgres_config(id)
+    success = get_config_manager().delete_postgres_config(id)
     
     if not success:
         return {"message": f"删除Postgres配置失败，ID {id} 不存在"}, 404
@@ -330,7 +378,7 @@ def delete_postgres(id):
 @api_response
 def get_config_for_capacity(user_capacity):
     """获取适合特定用户容量的完整配置"""
-    config = config_manager.get_complete_config(user_capacity)
+    config = get_config_manager().get_complete_config(user_capacity)
     
     if not config:
         return {"message": f"未找到适合用户容量 {user_capacity} 的配置"}, 404
@@ -0,0 +1,106 @@
+from . import api_blueprint
+from flask import jsonify, request, make_response
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conf import settings
+from lib.logger import app_logger as logger
+from lib.profiler import get_cycle_profiler, get_memory_tracker
+from app.utils import require_debug_token
+
+
+def _download(content, filename, mimetype):
+    response = make_response(content)
+    response.headers["Content-Type"] = mimetype
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def _report_response(report):
+    '''按 ?format=text|pstats 返回剖析报告，文本报告支持 ?sort=cumulative&limit=50'''
+    if request.args.get("format") == "pstats":
+        return _download(report.pstats_bytes(), f"{report.kind}-{report.id}.pstats", "application/octet-stream")
+    sort = request.args.get("sort", "cumulative")
+    limit = request.args.get("limit", 50, type=int)
+    response = _download(report.text(sort, limit), f"{report.kind}-{report.id}.txt", "text/plain; charset=utf-8")
+    response.headers["X-Profile-Id"] = report.id
+    return response
+
+
+@api_blueprint.route('/debug/profile', methods=['GET'])
+@require_debug_token
+def debug_profile_status():
+    '''正在进行的检查剖析和已有的报告列表'''
+    return jsonify(get_cycle_profiler().status())
+
+
+@api_blueprint.route('/debug/profile/cycles', methods=['POST'])
+@require_debug_token
+def debug_profile_cycles():
+    '''剖析接下来的 N 次 check_and_scale(?runs=N，默认1)，完成后通过 /debug/profile/<id> 下载'''
+    runs = request.args.get("runs", 1, type=int)
+    if not 1 <= runs <= settings.DEBUG_PROFILE_MAX_RUNS:
+        return jsonify({"status": "error", "message": f"runs 必须在 1 到 {settings.DEBUG_PROFILE_MAX_RUNS} 之间"}), 400
+    report = get_cycle_profiler().arm(runs)
+    return jsonify(report.summary()), 202
+
+
+@api_blueprint.route('/debug/profile/status', methods=['GET'])
+@require_debug_token
+def debug_profile_status_request():
+    '''在 cProfile 下执行一次 /status 的状态收集(不经过快照缓存)并返回报告'''
+    from app.api.routes_info import collect_status
+    logger.info("profiler -- 剖析一次状态收集")
+    report, _ = get_cycle_profiler().profile_call("status", collect_status)
+    return _report_response(report)
+
+
+@api_blueprint.route('/debug/profile/<report_id>', methods=['GET'])
+@require_debug_token
+def debug_profile_report(report_id):
+    '''下载剖析报告，未完成的检查剖析返回已采集部分'''
+    report = get_cycle_profiler().get(report_id)
+    if report is None:
+        return jsonify({"status": "error", "message": f"未找到报告 {report_id}"}), 404
+    return _report_response(report)
+
+
+@api_blueprint.route('/debug/memory', methods=['GET'])
+@require_debug_token
+def debug_memory_status():
+    '''tracemalloc 状态'''
+    return jsonify(get_memory_tracker().status())
+
+
+@api_blueprint.route('/debug/memory/start', methods=['POST'])
+@require_debug_token
+def debug_memory_start():
+    '''开启 tracemalloc(?frames=10)并记录基准快照'''
+    frames = request.args.get("frames", 10, type=int)
+    tracker = get_memory_tracker()
+    tracker.start(frames)
+    return jsonify(tracker.status())
+
+
+@api_blueprint.route('/debug/memory/snapshot', methods=['GET'])
+@require_debug_token
+def debug_memory_snapshot():
+    '''与上一次快照比较增长最多的分配位置(?limit=30&key_type=lineno|traceback|filename)，本次快照成为新的基准'''
+    tracker = get_memory_tracker()
+    if not tracker.is_tracing():
+        return jsonify({"status": "error", "message": "tracemalloc 未开启，先调用 /debug/memory/start"}), 409
+    key_type = request.args.get("key_type", "lineno")
+    if key_type not in ("lineno", "traceback", "filename"):
+        return jsonify({"status": "error", "message": "key_type 只能是 lineno、traceback 或 filename"}), 400
+    limit = request.args.get("limit", 30, type=int)
+    return _download(tracker.snapshot(limit, key_type), "tracemalloc-diff.txt", "text/plain; charset=utf-8")
+
+
+@api_blueprint.route('/debug/memory/stop', methods=['POST'])
+@require_debug_token
+def debug_memory_stop():
+    '''关闭 tracemalloc，停止记录分配'''
+    tracker = get_memory_tracker()
+    tracker.stop()
+    return jsonify(tracker.status())
@@ -1,72 +1,57 @@
 from . import api_blueprint
-from flask import jsonify
+from flask import jsonify, request, make_response
 
 import sys
 import os
+import time
+import threading
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from conf import settings
 from lib.logger import app_logger as logger
-from lib.get_analytics_user import get_active_users
-from lib.aws_db import AWSDBManager
-from lib.aws_eks import EKSManager
-from lib.k8s_client import K8sClient
-from lib.query_data import ScalingConfigManager
-
-
-
-@api_blueprint.route('/status')
-def status_info():
-    '''获取当前在线人数、数据库配置、EKS节点信息以及deployment的信息'''
-    aws_db_manager = AWSDBManager(
-        access_key_id=settings.AWS_ACCESS_KEY_ID,
-        secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION
-    )
-
-    aws_eks_manager = EKSManager(
-        settings.AWS_REGION, 
-        settings.AWS_ACCESS_KEY_ID, 
-        settings.AWS_SECRET_ACCESS_KEY, 
-        settings.EKS_CLUSTER_NAME
-    )
-
-    k8s_client = K8sClient(
-        kube_config_path=settings.KUBE_FILE_PATH,
-        context_name=settings.CLUSTER_CONTEXT
-    )
-
-    scaling_manager = ScalingConfigManager()
-
-    user_count = get_active_users(settings.KEY_FILE_LOCATION, settings.PROPERTY_ID)
-
-    redis_node_type = aws_db_manager.get_elasticache_redis_node_type(settings.REDIS_OSS_NAME)
-    rds_instance_types = aws_db_manager.get_rds_cluster_instance_type(settings.RDS_CLUSTER_NAME)
-    if rds_instance_types:
-        highest_id = None
-        highest_type = None
-        max_value = -1
-        for instance_id, instance_type in rds_instance_types.items():
-            logger.info(f"实例 {instance_id}: {instance_type}")
-            size = instance_type.split('.')[-1]  # 获取最后一部分，如large, xlarge, 8xlarge
-            if size == "large":
-                value = 1
-            elif size == "xlarge":
-                value = 2
-            elif "xlarge" in size:
-                value = int(size.replace("xlarge", "") or "0") + 2
-            if value > max_value:
-                max_value = value
-                highest_id = instance_id
-                highest_type = instance_type
-    rds_highest_type = highest_type
-
-    
-    nodegroups = aws_eks_manager.list_nodegroups()
-    node_info = {}
-
-    for nodegroup_name in nodegroups:
-        desired_size = aws_eks_manager.get_nodegroup_desired_size(nodegroup_name)
-        node_info[nodegroup_name] = desired_size
+from lib.clients import get_client_registry
+from lib.status_snapshot import SnapshotRefresher
+from lib.timeseries import get_timeseries_store
+from lib.sampler import get_user_sampler, read_active_users
+from lib.check_scheduler import get_check_scheduler
+from lib.cluster_controller import get_cluster_controller
+from lib.leader_election import get_leader_elector
+from lib import metrics
+from app.utils import with_cluster
+from core.core import get_highest_instance_config
+
+
+# 只有集群状态参与 ETag，ga_stats、sampler、active_user_time 每次刷新都会变化
+STATUS_ETAG_KEYS = ["db_conf", "eks_node", "k8s_dep_info", "k8s_affinity", "active_user"]
+
+# 每个集群一个状态快照，默认配置的键为None
+_status_refreshers = {}
+_status_refresher_lock = threading.Lock()
+
+
+def collect_status(cluster=None):
+    '''
+    获取当前在线人数、数据库配置、EKS节点信息以及deployment的信息
+
+    Args:
+        cluster (ClusterWorker): 多集群模式下的集群，为None时使用默认配置
+    '''
+    registry = cluster.registry if cluster is not None else get_client_registry()
+    conf = registry.conf
+    aws_db_manager = registry.aws_db_manager()
+    aws_eks_manager = registry.eks_manager()
+    k8s_client = registry.k8s_client()
+    scaling_manager = registry.scaling_manager()
+
+    # 在线人数来自采样缓冲，缓冲过旧时才直接查询GA
+    sampler = cluster.service.sampler if cluster is not None else get_user_sampler()
+    sample_time, user_count = read_active_users(sampler, conf.SAMPLE_MAX_AGE)
+
+    redis_node_type = aws_db_manager.get_elasticache_redis_node_type(conf.REDIS_OSS_NAME)
+    rds_members = aws_db_manager.describe_rds_cluster_members(conf.RDS_CLUSTER_NAME)
+    rds_instance_types = {instance_id: member["instance_class"] for instance_id, member in rds_members.items()}
+    _, rds_highest_type = get_highest_instance_config(rds_instance_types)
+
+    node_info = aws_eks_manager.get_nodegroup_desired_sizes()
 
     k8s_dep_info = []
     k8s_affinity = []
@@ -74,21 +59,20 @@ def status_info():
 
     complete_config = scaling_manager.get_complete_config(user_count)
 
-    nodegroup_expr = None
+    # 每个命名空间只LIST一次HPA
+    hpa_configs = k8s_client.get_hpa_scaling_configs(list(complete_config["services"].keys()))
+
     for namespace, services in complete_config["services"].items(): 
         for service_name, service_config in services.items(): 
             pod_count_info = k8s_client.get_deployment_pod_count(
                 deployment_name=service_name,
                 namespace=namespace
             )
-            hpa_config = k8s_client.get_hpa_scaling_config(
-                hpa_name=service_config['hpa_name'],
-                namespace=namespace
-            )
+            hpa_config = hpa_configs[namespace].get(service_config['hpa_name']) or {}
 
             k8s_dep_info.append({
                     service_name:pod_count_info['current_replicas'],
-                    service_config['hpa_name']:hpa_config['min_replicas']
+                    service_config['hpa_name']:hpa_config.get('min_replicas')
                 })
             
             if service_config.get('pool_name'):
@@ -96,7 +80,7 @@ def status_info():
                     deployment_name=service_name,
                     namespace=namespace
                 )
-                # print(service_config.get('pool_name'))
+                nodegroup_expr = None
                 if node_affinity and node_affinity.required_during_scheduling_ignored_during_execution:
                     node_selector_terms = node_affinity.required_during_scheduling_ignored_during_execution.node_selector_terms
                     if node_selector_terms:
@@ -110,17 +94,127 @@ def status_info():
                                             'values': expr.values
                                         }
                                         break
-                # print(nodegroup_expr)
                 if nodegroup_expr:
-                    # print(f"当前节点组亲和性: {nodegroup_expr}")
-                    # print(nodegroup_expr.get('key'))
-                    # print(nodegroup_expr.get('values'))
                     k8s_affinity.append({service_name:nodegroup_expr.get('values')})
 
-    return jsonify({
+    return {
+        "cluster": registry.name,
         "active_user": user_count,
-        "db_conf":{"RDS":rds_highest_type,"Redis":redis_node_type},
+        "active_user_time": sample_time,
+        "ga_stats": sampler.source.stats(),
+        "sampler": sampler.stats(),
+        "db_conf":{"RDS":rds_highest_type,"Redis":redis_node_type,"RDS_members":rds_members},
         "eks_node":node_info,
         "k8s_dep_info":k8s_dep_info,
         "k8s_affinity":k8s_affinity
-        }), 200
\ No newline at end of file
+        }
+
+
+def get_status_refresher(cluster=None):
+    '''获取集群的状态快照刷新器，首次使用时启动后台刷新'''
+    key = cluster.name if cluster is not None else None
+    refresher = _status_refreshers.get(key)
+    if refresher is None:
+        with _status_refresher_lock:
+            refresher = _status_refreshers.get(key)
+            if refresher is None:
+                refresher = SnapshotRefresher(
+                    lambda: collect_status(cluster),
+                    interval=settings.STATUS_REFRESH_INTERVAL,
+                    name=f"status-{key}" if key else "status",
+                    etag_keys=STATUS_ETAG_KEYS
+                )
+                refresher.start()
+                _status_refreshers[key] = refresher
+    return refresher
+
+
+@api_blueprint.route('/status')
+@with_cluster
+def status_info(cluster=None):
+    '''返回后台维护的状态快照，支持 ETag/If-None-Match，?refresh=1 强制立即重建，?cluster= 选择集群'''
+    refresher = get_status_refresher(cluster)
+    if request.args.get('refresh') == '1':
+        logger.info("status -- 收到强制刷新请求")
+        refresher.refresh()
+
+    snapshot = refresher.get()
+    if snapshot["data"] is None:
+        return jsonify({"status": "error", "message": snapshot["last_error"]}), 503
+
+    etag = f'"{snapshot["etag"]}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = make_response("", 304)
+    else:
+        response = jsonify(dict(
+            snapshot["data"],
+            version=snapshot["version"],
+            generated_at=snapshot["generated_at"],
+            age_seconds=snapshot["age_seconds"],
+            last_error=snapshot["last_error"]
+        ))
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api_blueprint.route('/history')
+@with_cluster
+def history_info(cluster=None):
+    '''在线人数历史，from/to 为秒级时间戳，step 为步长(秒)，?cluster= 选择集群'''
+    try:
+        end = float(request.args.get('to') or time.time())
+        start = float(request.args.get('from') or end - 86400)
+        step = int(request.args['step']) if request.args.get('step') else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "from/to/step 必须为数字"}), 400
+    if step is not None and step <= 0:
+        return jsonify({"status": "error", "message": "step 必须大于0"}), 400
+
+    store = cluster.service.history if cluster is not None else get_timeseries_store()
+    result = store.query(start, end, step)
+    return jsonify(dict(result, **{"from": start, "to": end}))
+
+
+@api_blueprint.route('/scheduler')
+def scheduler_info():
+    '''伸缩检查调度状态: 模式、当前间隔及原因、下次执行时间'''
+    check_scheduler = get_check_scheduler()
+    if check_scheduler is None:
+        return jsonify({"status": "error", "message": "检查调度器未启动"}), 503
+    return jsonify(check_scheduler.status())
+
+
+@api_blueprint.route('/clusters')
+def clusters_info():
+    '''多集群模式下每个集群的调度状态、启动错误和采样状态'''
+    controller = get_cluster_controller()
+    if controller is None:
+        return jsonify({"status": "error", "message": "未开启多集群模式(clusters 为空)"}), 503
+    return jsonify(controller.status())
+
+
+@api_blueprint.route('/leader')
+def leader_info():
+    '''主节点选举状态: 本副本标识、当前持有者、租约时长和最近一次切换耗时'''
+    elector = get_leader_elector()
+    if elector is None:
+        return jsonify({"enabled": False, "is_leader": True})
+    return jsonify(elector.stats())
+
+
+@api_blueprint.route('/cassette')
+def cassette_info():
+    '''外部调用录制或回放状态: 录像文件、按来源和操作统计的调用次数，回放时还包括重复和未命中次数'''
+    cassette = get_client_registry().cassette
+    if cassette is None:
+        return jsonify({"mode": "off"})
+    return jsonify(cassette.stats())
+
+
+@api_blueprint.route('/metrics')
+def metrics_info():
+    '''Prometheus 文本格式的指标: 外部调用和检查阶段耗时分布、伸缩判断结果、在线人数和级别、调度延迟'''
+    response = make_response(metrics.render())
+    response.headers["Content-Type"] = metrics.CONTENT_TYPE
+    return response
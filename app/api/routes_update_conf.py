@@ -7,109 +7,76 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from lib.logger import app_logger as logger
-from lib.query_data import ScalingConfigManager
-from lib.aws_db import AWSDBManager
-from lib.aws_eks import EKSManager
-from lib.k8s_client import K8sClient
+from lib.clients import get_client_registry
+from lib.actuator import get_actuation_engine, format_results, ACTION_HPA_MIN
+from lib.reconciler import Reconciler
+from app.utils import require_leader, with_cluster
 from core.core import get_highest_instance_config
-from conf import settings
 
 
+def cluster_clients(cluster):
+    '''集群的 (客户端注册表, 执行器)，cluster 为None时为默认配置'''
+    if cluster is None:
+        return get_client_registry(), get_actuation_engine()
+    return cluster.registry, cluster.service.actuation_engine
+
 
 @api_blueprint.route('/upgrade/<int:capacity>', methods=['PUT'])
-def upgrade_level(capacity):
+@require_leader
+@with_cluster
+def upgrade_level(capacity, cluster=None):
     '''
     升级到指定的人数容量级别
-    前提是DB已经升级到指定配置
+    前提是DB已经升级到指定配置，?cluster= 选择集群
 
     1.配置比升级预估低，通知升级，不升级
     2.配置比升级预估高或者相等，通知信息，升级
 
     '''
-    scaling_manager = ScalingConfigManager()
-
-    aws_db_manager = AWSDBManager(
-        access_key_id=settings.AWS_ACCESS_KEY_ID,
-        secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION
-    )
-    aws_eks_manager = EKSManager(
-        settings.AWS_REGION, 
-        settings.AWS_ACCESS_KEY_ID, 
-        settings.AWS_SECRET_ACCESS_KEY, 
-        settings.EKS_CLUSTER_NAME
-    )
-    k8s_client = K8sClient(
-        kube_config_path=settings.KUBE_FILE_PATH,
-        context_name=settings.CLUSTER_CONTEXT
-    )
+    registry, actuation_engine = cluster_clients(cluster)
+    conf = registry.conf
+    scaling_manager = registry.scaling_manager()
+    aws_db_manager = registry.aws_db_manager()
+    aws_eks_manager = registry.eks_manager()
+    k8s_client = registry.k8s_client()
+    reconciler = Reconciler(k8s_client, actuation_engine, read_executor=registry.read_executor())
 
     complete_config = scaling_manager.get_complete_config(capacity)
 
     # 如果是 600 级别 代表降级到平常级别
     if capacity == 600:
-        # hpa 还是需要更新
-        scaling_res = []
+        # 更新节点组最小值，同一个节点组只更新一次
+        pool_states = {}
         for namespace, services in complete_config["services"].items():
             for service_name, service_config in services.items():
-                # 更新HPA最小副本数
-                if service_config["hpa_name"]:
-                    try:
-                        hpa_name = service_config["hpa_name"]
-                        replicas = service_config["replicas"]
-                        
-                        # 调用K8s客户端更新HPA
-                        k8s_client.update_hpa_scaling(
-                            namespace=namespace,
-                            hpa_name=hpa_name,
-                            min_replicas=replicas
-                        )
-                        
-                        scaling_res.append(
-                            f"successful:{namespace}/{hpa_name}->hpa_min:{replicas}"
-                        )
-                        logger.info(f"已将 {namespace}/{hpa_name} 最小副本数更新为 {replicas}")
-                    except Exception as e:
-                        error_msg = f"failure:{namespace}/{hpa_name}->hpa_min:{str(e)}"
-                        scaling_res.append(error_msg)
-                        logger.error(error_msg)
-                
-                # 删除节点亲和性
-                if service_config["pool_name"]:
-                    try:
-                        # 调用K8s客户端删除节点亲和性
-                        # 更新节点组最小值
-                        state = aws_eks_manager.update_nodegroup_scaling(service_config["pool_name"],0,20,0)
-                        if  service_config["pool_name"]:
-                            k8s_client.remove_node_affinity(
-                                deployment_name=service_name,
-                                namespace=namespace
-                            )
-                            scaling_res.append(
-                                f"successful:{namespace}/{service_name}->node_affinity_remove:{service_config['pool_name']}-->node_pool_upgrade:{state}"
-                            )
-                            logger.info(f"已将 {namespace}/{service_name} 节点亲和性删除{service_config['pool_name']}-->node_pool_upgrade:{state}")
-                    except Exception as e:
-                        error_msg = f"failure:{namespace}/{service_name}->node_affinity_remove:{str(e)}-->node_pool_upgrade:{state}"
-                        scaling_res.append(error_msg)
-                        logger.error(error_msg)
+                pool = service_config["pool_name"]
+                if pool and pool not in pool_states:
+                    pool_states[pool] = aws_eks_manager.update_nodegroup_scaling(pool,0,20,0)
+
+        # hpa 还是需要更新，同时删除节点亲和性
+        plan, report = reconciler.reconcile(complete_config, remove_affinity=True)
+        scaling_res = format_results(report["results"], {
+            ACTION_HPA_MIN: ("successful:{target}->hpa_min:{value}", "failure:{target}->hpa_min:{error}"),
+            None: ("successful:{target}->node_affinity_remove:{value}-->node_pool_upgrade:{state}",
+                   "failure:{target}->node_affinity_remove:{error}-->node_pool_upgrade:{state}")
+        }, state=lambda res: pool_states.get(res["value"]))
 
         # 返回结果
-        return jsonify({"upgrade_capacity":capacity,"k8s_res":scaling_res}), 200 
+        return jsonify({"upgrade_capacity":capacity,"k8s_res":scaling_res,"k8s_detail":report["results"],"unchanged":plan["unchanged"],"elapsed_ms":report["elapsed_ms"]}), 200 
 
     # 下面是升级到600以上的级别
     # 根据数据库中的级别，找到对应的 hpa 和 node_affinity
     # 比对数据库配置
-    rds_instance_type = aws_db_manager.get_rds_cluster_instance_type(settings.RDS_CLUSTER_NAME)
+    rds_instance_type = aws_db_manager.get_rds_cluster_instance_type(conf.RDS_CLUSTER_NAME)
     if not rds_instance_type:
-        logger.error(f"获取RDS实例类型失败: {settings.RDS_CLUSTER_NAME}")
+        logger.error(f"获取RDS实例类型失败: {conf.RDS_CLUSTER_NAME}")
     # 获取最高配置的RDS节点类型
     _, rds_highest_type = get_highest_instance_config(rds_instance_type)
 
     # 获取当前Redis实例类型
-    redis_type = aws_db_manager.get_elasticache_redis_node_type(settings.REDIS_OSS_NAME)
+    redis_type = aws_db_manager.get_elasticache_redis_node_type(conf.REDIS_OSS_NAME)
     if not redis_type:
-        logger.error(f"获取Redis实例类型失败: {settings.REDIS_OSS_NAME}")
+        logger.error(f"获取Redis实例类型失败: {conf.REDIS_OSS_NAME}")
 
     # 获取目标实例类型
     target_db_type = complete_config["postgres"]['instance_type']
@@ -179,11 +146,7 @@ def upgrade_level(capacity):
     scaling_results = []
 
     # 更新节点组最小值
-    nodegroups = aws_eks_manager.list_nodegroups()
-    node_info = {}
-    for nodegroup_name in nodegroups:
-        desired_size = aws_eks_manager.get_nodegroup_desired_size(nodegroup_name)
-        node_info[nodegroup_name] = desired_size
+    node_info = aws_eks_manager.get_nodegroup_desired_sizes()
     for pool in node_info:
         if node_info[pool] == 0:
             up_pool_state = aws_eks_manager.update_nodegroup_scaling(pool,0,20,1)
@@ -194,49 +157,33 @@ def upgrade_level(capacity):
             logger.error(f"eks_pool:{pool},is_upgrade:{up_pool_state}")
 
 
-    # 遍历所有服务并进行更新
-    for namespace, services in complete_config["services"].items():
-        for service_name, service_config in services.items():
-            # 更新HPA最小副本数
-            if service_config["hpa_name"]:
-                try:
-                    hpa_name = service_config["hpa_name"]
-                    replicas = service_config["replicas"]
-                    
-                    # 调用K8s客户端更新HPA
-                    k8s_client.update_hpa_scaling(
-                        namespace=namespace,
-                        hpa_name=hpa_name,
-                        min_replicas=replicas
-                    )
-                    
-                    scaling_results.append(
-                        f"successful:{namespace}/{hpa_name}->hpa_min:{replicas}"
-                    )
-                    logger.info(f"已将 {namespace}/{hpa_name} 最小副本数更新为 {replicas}")
-                except Exception as e:
-                    error_msg = f"failure:{namespace}/{hpa_name}->hpa_min:{str(e)}"
-                    scaling_results.append(error_msg)
-                    logger.error(error_msg)
-            
-            # 更新节点亲和性
-            if service_config["pool_name"]:
-                try:
-                    # 调用K8s客户端更新节点亲和性
-                    if  service_config["pool_name"]:
-                        k8s_client.set_nodegroup_affinity(
-                            namespace=namespace,
-                            deployment_name=service_name,
-                            nodegroup_key="eks.amazonaws.com/nodegroup",
-                            nodegroup_values=service_config["pool_name"]
-                        )
-                        scaling_results.append(
-                            f"successful:{namespace}/{service_name}-->node_affinity:{service_config['pool_name']}"
-                        )
-                        logger.info(f"已将 {namespace}/{service_name} 节点亲和性更新为 {service_config['pool_name']}")
-                except Exception as e:
-                    error_msg = f"failure:{namespace}/{service_name}->node_affinity:{str(e)}"
-                    scaling_results.append(error_msg)
-                    logger.error(error_msg)
-
-    return jsonify({"upgrade_capacity":capacity,"state":is_ready,"db_conf":{"rds":db_status,"redis":redis_status},"k8s_res":scaling_results}), 200
+    # 并发更新所有服务的HPA和节点亲和性
+    plan, report = reconciler.reconcile(complete_config)
+    scaling_results.extend(format_results(report["results"], {
+        ACTION_HPA_MIN: ("successful:{target}->hpa_min:{value}", "failure:{target}->hpa_min:{error}"),
+        None: ("successful:{target}-->node_affinity:{value}", "failure:{target}->node_affinity:{error}")
+    }))
+
+    return jsonify({"upgrade_capacity":capacity,"state":is_ready,"db_conf":{"rds":db_status,"redis":redis_status},"k8s_res":scaling_results,"k8s_detail":report["results"],"unchanged":plan["unchanged"],"elapsed_ms":report["elapsed_ms"]}), 200
+
+
+@api_blueprint.route('/plan/<int:capacity>', methods=['GET'])
+@with_cluster
+def plan_level(capacity, cluster=None):
+    '''
+    预览升级到指定级别时会执行的变更(dry-run)，不做任何修改，?cluster= 选择集群
+    600 级别与 /upgrade 一致，目标状态为移除节点亲和性
+    '''
+    registry, actuation_engine = cluster_clients(cluster)
+    complete_config = registry.scaling_manager().get_complete_config(capacity)
+    if not complete_config:
+        return jsonify({"status": "error", "message": f"未找到适合用户容量 {capacity} 的配置"}), 404
+
+    reconciler = Reconciler(registry.k8s_client(), actuation_engine, read_executor=registry.read_executor())
+    plan = reconciler.plan(complete_config, remove_affinity=capacity == 600)
+    return jsonify({
+        "capacity": capacity,
+        "target_level": complete_config["capacity_level"]["user_capacity"],
+        "changes": plan["changes"],
+        "unchanged": plan["unchanged"]
+    }), 200
@@ -0,0 +1,64 @@
+from flask import jsonify, request
+from functools import wraps
+import hmac
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from lib.leader_election import is_leader, get_leader_elector
+from lib.cluster_controller import get_cluster_controller
+from conf import settings
+
+
+def require_leader(func):
+    """
+    开启选举时写操作只在主节点执行，避免与主节点的伸缩检查同时修改；
+    写入后在主节点上重建容量矩阵快照，其他副本在成为主节点时重新加载(见 start_leader_elector)
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_leader():
+            return jsonify({
+                "status": "error",
+                "message": "本副本不是主节点，请在主节点上执行",
+                "leader": get_leader_elector().holder
+            }), 409
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def require_debug_token(func):
+    """调试接口需要 X-Debug-Token 请求头与 debug_token 一致，未配置 debug_token 时调试接口不可用"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not settings.DEBUG_TOKEN:
+            return jsonify({"status": "error", "message": "调试接口未开启"}), 404
+        token = request.headers.get("X-Debug-Token", "")
+        if not hmac.compare_digest(token.encode(), settings.DEBUG_TOKEN.encode()):
+            return jsonify({"status": "error", "message": "X-Debug-Token 无效"}), 401
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def with_cluster(func):
+    """
+    按 ?cluster=<名称> 选择多集群模式下的集群，以 cluster 参数传入对应的 ClusterWorker，不带参数时为None(默认配置)；
+    集群不存在时返回404，尚未启动完成或启动失败时返回503
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        name = request.args.get("cluster")
+        if not name:
+            return func(*args, cluster=None, **kwargs)
+        controller = get_cluster_controller()
+        worker = controller.get(name) if controller is not None else None
+        if worker is None:
+            return jsonify({
+                "status": "error",
+                "message": f"集群 {name} 不存在",
+                "clusters": list(controller.workers) if controller is not None else []
+            }), 404
+        if not worker.is_ready():
+            return jsonify({"status": "error", "message": f"集群 {name} 尚未启动", "error": worker.error}), 503
+        return func(*args, cluster=worker, **kwargs)
+    return wrapper
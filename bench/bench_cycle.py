@@ -0,0 +1,269 @@
+# 伸缩检查端到端基准测试: 用进程内替身代替GA、AWS和Kubernetes，测量不同服务规模下的耗时、外部调用次数和内存峰值
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import logger
+from lib.cluster_controller import ClusterConfig
+from conf.settings import get_project_root
+from bench.fakes import LatencyModel, FakeCloud, FakeClientRegistry, create_synthetic_matrix, service_name, namespace_name
+
+
+SCENARIO_CYCLE_NOOP = "cycle-noop"
+SCENARIO_CYCLE_UPGRADE = "cycle-upgrade"
+SCENARIO_UPGRADE = "upgrade"
+SCENARIOS = (SCENARIO_CYCLE_NOOP, SCENARIO_CYCLE_UPGRADE, SCENARIO_UPGRADE)
+
+
+def bench_conf(workdir, args):
+    """基准测试使用的集群配置: 参考服务为合成矩阵的第一个服务，关闭预测、连续读数和冷却，每个周期都查询GA"""
+    return ClusterConfig({
+        "name": "bench",
+        "hpa_namespace": namespace_name(0, args.services_per_namespace),
+        "hpa_name": f"{service_name(0)}-hpa",
+        "hpa_service_name": service_name(0),
+        "history_dir": os.path.join(workdir, "history"),
+        "scaling_state_file": os.path.join(workdir, "scaling_state.json"),
+        "forecast_enabled": False,
+        "scale_up_consecutive": 1,
+        "scale_cooldown_seconds": 0,
+        "sample_max_age": 0,
+        "k8s_informer_enabled": False,
+        "cassette_mode": "off",
+        "cycle_deadline_seconds": args.deadline
+    })
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(ratio * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(durations):
+    """耗时统计(毫秒)"""
+    values = [round(value * 1000, 3) for value in durations]
+    return {
+        "min": min(values),
+        "median": round(statistics.median(values), 3),
+        "p95": percentile(values, 0.95),
+        "max": max(values),
+        "mean": round(statistics.mean(values), 3)
+    }
+
+
+def group_calls(counter):
+    """{(source, operation): n} -> {source: {operation: n}}"""
+    calls = {}
+    for (source, operation), count in sorted(counter.items()):
+        calls.setdefault(source, {})[operation] = count
+    return calls
+
+
+class ScenarioRunner:
+    """一个场景、一个服务规模的运行环境"""
+
+    def __init__(self, scenario, services, args, workdir):
+        self.scenario = scenario
+        self.services = services
+        self.matrix = create_synthetic_matrix(services, args.levels, args.services_per_namespace, args.nodegroups)
+        self.target = self.matrix.capacities[len(self.matrix.capacities) // 2]
+        latency = LatencyModel(args.latency_ms, args.jitter_ms, args.source_latency, seed=args.seed)
+        # cycle-noop 的人数低于600且线上为默认级别，只执行读取和判断
+        users = 300 if scenario == SCENARIO_CYCLE_NOOP else self.target - 100
+        self.cloud = FakeCloud(self.matrix, latency, users=users, rds_readers=args.rds_readers, nodegroups=args.nodegroups)
+        self.registry = FakeClientRegistry(self.cloud, bench_conf(workdir, args))
+        self.service = None
+        self.client = None
+        self._saved_globals = None
+
+    def setup(self):
+        if self.scenario == SCENARIO_UPGRADE:
+            import lib.clients
+            import lib.actuator
+            from lib.actuator import create_actuation_engine
+            from app import create_app
+
+            # /api/upgrade 使用进程内默认的注册表和执行器
+            self._saved_globals = (lib.clients._registry, lib.actuator._shared_engine)
+            lib.clients._registry = self.registry
+            lib.actuator._shared_engine = create_actuation_engine(self.registry.conf)
+            self.client = create_app().test_client()
+        else:
+            from core.core import AutoScalingService
+            self.service = AutoScalingService(self.registry)
+
+    def run_once(self):
+        """恢复线上状态后执行一次，返回本次的外部调用次数"""
+        self.cloud.reset()
+        self.registry.eks_manager().invalidate_nodegroup_cache()
+        before = self.cloud.snapshot_calls()
+        if self.scenario == SCENARIO_UPGRADE:
+            response = self.client.put(f"/api/upgrade/{self.target}")
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/upgrade/{self.target} 返回 {response.status_code}: {response.get_data(as_text=True)}")
+        else:
+            self.service.check_and_scale()
+        return self.cloud.snapshot_calls() - before
+
+    def teardown(self):
+        if self.service is not None:
+            self.service._notifier.shutdown(wait=True)
+            self.service.actuation_engine.shutdown()
+            self.service.history.close()
+        if self._saved_globals is not None:
+            import lib.clients
+            import lib.actuator
+            lib.actuator._shared_engine.shutdown()
+            lib.clients._registry, lib.actuator._shared_engine = self._saved_globals
+        self.registry.close()
+
+
+def run_scenario(scenario, services, args):
+    """
+    运行一个场景
+
+    先执行 warmup 次(创建客户端等一次性开销)，再计时执行 iterations 次，
+    最后在 tracemalloc 下单独执行一次统计内存峰值，计时结果不受 tracemalloc 影响
+    """
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        runner = ScenarioRunner(scenario, services, args, workdir)
+        try:
+            runner.setup()
+            for _ in range(args.warmup):
+                runner.run_once()
+
+            durations = []
+            calls = None
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                calls = runner.run_once()
+                durations.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            try:
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                runner.run_once()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            result = {
+                "scenario": scenario,
+                "services": services,
+                "namespaces": len(runner.cloud.namespaces()),
+                "nodegroups": args.nodegroups,
+                "levels": len(runner.matrix.levels),
+                "target_level": runner.target,
+                "iterations": args.iterations,
+                "wall_ms": summarize(durations),
+                "calls": group_calls(calls),
+                "calls_total": sum(calls.values()),
+                "peak_memory_kb": round((peak - baseline) / 1024, 1)
+            }
+            if runner.service is not None:
+                result["cycle_report"] = runner.service.last_cycle_report
+            return result
+        finally:
+            runner.teardown()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=get_project_root(), stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def parse_source_latency(values):
+    """ga=80 rds=40 -> {"ga": 80.0, "rds": 40.0}"""
+    result = {}
+    for value in values or []:
+        source, _, ms = value.partition("=")
+        if not ms:
+            raise argparse.ArgumentTypeError(f"--source-latency 格式应为 来源=毫秒: {value}")
+        result[source] = float(ms)
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="check_and_scale / upgrade_level 基准测试")
+    parser.add_argument("--services", type=int, nargs="+", default=[10, 100, 1000], help="每个级别的服务数，可以指定多个")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--levels", type=int, default=6, help="容量级别数")
+    parser.add_argument("--services-per-namespace", type=int, default=20)
+    parser.add_argument("--nodegroups", type=int, default=8)
+    parser.add_argument("--rds-readers", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每次外部调用的平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟的随机浮动范围(±)")
+    parser.add_argument("--source-latency", nargs="*", metavar="SOURCE=MS",
+                        help="按来源指定平均延迟，来源为 ga、rds、elasticache、eks、k8s、feishu")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--deadline", type=float, default=600, help="cycle_deadline_seconds")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="结果JSON文件，默认 data/bench/cycle-<时间>.json")
+    args = parser.parse_args(argv)
+    args.source_latency = parse_source_latency(args.source_latency)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 默认的INFO日志每个服务都会输出多行，会掩盖被测代码本身的耗时
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = []
+    for scenario in scenarios:
+        for services in args.services:
+            result = run_scenario(scenario, services, args)
+            results.append(result)
+            wall = result["wall_ms"]
+            print(f"{scenario:<14} services={services:<5} median={wall['median']:>10.2f}ms p95={wall['p95']:>10.2f}ms "
+                  f"calls={result['calls_total']:<6} peak={result['peak_memory_kb']:>10.1f}KiB")
+
+    report = {
+        "benchmark": "cycle",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "levels": args.levels,
+            "services_per_namespace": args.services_per_namespace,
+            "nodegroups": args.nodegroups,
+            "rds_readers": args.rds_readers,
+            "latency": LatencyModel(args.latency_ms, args.jitter_ms, args.source_latency, seed=args.seed).describe(),
+            "log_level": args.log_level
+        },
+        "results": results
+    }
+
+    output = args.output or os.path.join(
+        get_project_root(), "data", "bench", f"cycle-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+# 基准测试使用的进程内云服务替身: GA、boto3(rds、elasticache、eks)、Kubernetes
+import sys
+import os
+import time
+import random
+import threading
+from collections import Counter
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.clients import ClientRegistry
+from lib.query_data import ScalingConfigManager
+from lib.capacity_matrix import CapacityMatrix
+
+
+# 合成容量矩阵中的DB类型，尺寸后缀需要能被 get_highest_instance_config 解析
+BASE_REDIS_TYPE = "cache.m6g.large"
+SCALED_REDIS_TYPE = "cache.c7gn.xlarge"
+BASE_POSTGRES_TYPE = "db.r7g.large"
+SCALED_POSTGRES_TYPE = "db.r5.8xlarge"
+TOP_POSTGRES_TYPE = "db.r5.12xlarge"
+
+# 与真实API一致的分页大小
+EKS_PAGE_SIZE = 100
+RDS_PAGE_SIZE = 100
+
+
+class LatencyModel:
+    """
+    注入的调用延迟
+
+    每次调用延迟 mean ± jitter 毫秒(均匀分布)，sources 中可以按来源(ga、rds、elasticache、eks、k8s、feishu)单独指定平均值；
+    随机数使用固定种子，同样的参数多次运行的延迟序列相同
+    """
+
+    def __init__(self, mean_ms=0, jitter_ms=0, sources=None, seed=0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.sources = dict(sources or {})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, source):
+        """本次调用的延迟(秒)"""
+        mean = self.sources.get(source, self.mean_ms)
+        if not mean and not self.jitter_ms:
+            return 0
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0, mean + jitter) / 1000
+
+    def describe(self):
+        return {"mean_ms": self.mean_ms, "jitter_ms": self.jitter_ms, "sources": self.sources}
+
+
+def build_synthetic_levels(services, levels=6, services_per_namespace=20, nodegroups=8):
+    """
+    生成合成的容量级别数据，格式与 CapacityMatrix 的输入相同
+
+    第一个级别为 600(默认级别)，之后依次为 1000、2000、3000...；第一个服务为参考服务，
+    每个级别的副本数不同，用于判断当前级别；所有服务都配置HPA和节点组
+
+    Args:
+        services (int): 每个级别的服务数
+        levels (int): 级别数，至少为2
+        services_per_namespace (int): 每个命名空间的服务数
+        nodegroups (int): 节点组数，服务按顺序分配到各节点组
+
+    Returns:
+        list: 级别字典列表
+    """
+    if levels < 2:
+        raise ValueError("levels 至少为2")
+    capacities = [600] + [1000 * index for index in range(1, levels)]
+
+    result = []
+    for index, capacity in enumerate(capacities):
+        level_services = []
+        for number in range(services):
+            name = service_name(number)
+            # 参考服务每个级别的副本数都不同
+            replicas = 2 + 2 * index if number == 0 else 2 + index * (1 + number % 3)
+            level_services.append({
+                "namespace": namespace_name(number, services_per_namespace),
+                "service_name": name,
+                "replicas": replicas,
+                "hpa_name": f"{name}-hpa",
+                "pool_name": nodegroup_name(number % nodegroups)
+            })
+
+        if index == 0:
+            redis_type, postgres_type = BASE_REDIS_TYPE, BASE_POSTGRES_TYPE
+        elif index == levels - 1:
+            redis_type, postgres_type = SCALED_REDIS_TYPE, TOP_POSTGRES_TYPE
+        else:
+            redis_type, postgres_type = SCALED_REDIS_TYPE, SCALED_POSTGRES_TYPE
+        result.append({
+            "id": index + 1,
+            "user_capacity": capacity,
+            "services": level_services,
+            "redis": {"instance_type": redis_type, "memory_gb": 6, "bandwidth_gb": 10 if index == 0 else 40},
+            "postgres": {"instance_type": postgres_type, "cpu": 2 if index == 0 else 32, "memory_gb": 16 if index == 0 else 256}
+        })
+    return result
+
+
+def service_name(number):
+    return f"svc-{number}"
+
+
+def namespace_name(number, services_per_namespace):
+    return f"ns-{number // services_per_namespace}"
+
+
+def nodegroup_name(number):
+    return f"ng-{number}"
+
+
+class FakeCloud:
+    """
+    模拟的线上状态
+
+    保存HPA最小副本数、Deployment节点组亲和性、节点组伸缩配置、RDS/Redis实例类型和在线人数，
+    所有替身客户端读写同一份状态；每次调用都计数并按 LatencyModel 等待
+    """
+
+    def __init__(self, matrix, latency=None, users=0, rds_readers=2, nodegroups=8):
+        """
+        初始化
+
+        Args:
+            matrix (CapacityMatrix): 容量矩阵，线上状态初始化为最低级别
+            latency (LatencyModel): 注入的延迟，默认不延迟
+            users (int): GA返回的在线人数
+            rds_readers (int): RDS读副本数
+            nodegroups (int): 节点组数
+        """
+        self.matrix = matrix
+        self.latency = latency or LatencyModel()
+        self.users = users
+        self.rds_readers = rds_readers
+        self.nodegroup_count = nodegroups
+
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """恢复到最低级别的线上状态: HPA为默认副本数、没有节点亲和性、节点组期望节点数为0"""
+        base = self.matrix.capacities[0]
+        top = self.matrix.capacities[-1]
+        with self._lock:
+            self.hpas = {}
+            self.deployments = {}
+            for entry in self.matrix.services[base]:
+                self.hpas[(entry.namespace, entry.hpa_name)] = {"min": entry.replicas, "max": 50}
+                self.deployments[(entry.namespace, entry.service_name)] = {"replicas": entry.replicas, "pool": None}
+            self.nodegroups = {
+                nodegroup_name(number): {"minSize": 0, "maxSize": 20, "desiredSize": 0}
+                for number in range(self.nodegroup_count)
+            }
+            # DB已经是最高级别的配置，基础设施检查总是通过
+            self.rds_writer_type = self.matrix.postgres[top].instance_type
+            self.rds_reader_type = self.matrix.postgres[base].instance_type
+            self.redis_type = self.matrix.redis[top].instance_type
+
+    def call(self, source, operation):
+        """记录一次外部调用并注入延迟"""
+        with self._lock:
+            self.calls[(source, operation)] += 1
+        delay = self.latency.delay(source)
+        if delay:
+            time.sleep(delay)
+
+    def snapshot_calls(self):
+        with self._lock:
+            return Counter(self.calls)
+
+    def namespaces(self):
+        return sorted({namespace for namespace, _ in self.hpas})
+
+
+def _client_error(code, message, operation):
+    from botocore.exceptions import ClientError
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def _api_exception(status, reason):
+    from kubernetes.client.rest import ApiException
+    return ApiException(status=status, reason=reason)
+
+
+def _ok():
+    return {"ResponseMetadata": {"HTTPStatusCode": 200}}
+
+
+class FakePaginator:
+    """与 botocore Paginator 相同的 paginate 接口，每一页计为一次调用"""
+
+    def __init__(self, cloud, source, operation, items, key, page_size, token_key):
+        self.cloud = cloud
+        self.source = source
+        self.operation = operation
+        self.items = items
+        self.key = key
+        self.page_size = page_size
+        self.token_key = token_key
+
+    def paginate(self, **kwargs):
+        items = self.items()
+        for start in range(0, max(len(items), 1), self.page_size):
+            self.cloud.call(self.source, self.operation)
+            page = {self.key: items[start:start + self.page_size]}
+            if start + self.page_size < len(items):
+                page[self.token_key] = str(start + self.page_size)
+            yield page
+
+
+class FakeRDSClient:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def _members(self):
+        members = [("writer-0", self.cloud.rds_writer_type, True)]
+        members.extend((f"reader-{number}", self.cloud.rds_reader_type, False) for number in range(self.cloud.rds_readers))
+        return members
+
+    def describe_db_clusters(self, DBClusterIdentifier):
+        self.cloud.call("rds", "describe_db_clusters")
+        return {"DBClusters": [{
+            "DBClusterIdentifier": DBClusterIdentifier,
+            "DBClusterMembers": [
+                {"DBInstanceIdentifier": instance_id, "IsClusterWriter": is_writer}
+                for instance_id, _, is_writer in self._members()
+            ]
+        }]}
+
+    def get_paginator(self, operation):
+        if operation != "describe_db_instances":
+            raise NotImplementedError(operation)
+        return FakePaginator(self.cloud, "rds", operation, lambda: [
+            {"DBInstanceIdentifier": instance_id, "DBInstanceClass": instance_type, "DBInstanceStatus": "available"}
+            for instance_id, instance_type, _ in self._members()
+        ], "DBInstances", RDS_PAGE_SIZE, "Marker")
+
+
+class FakeElastiCacheClient:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def describe_replication_groups(self, ReplicationGroupId):
+        self.cloud.call("elasticache", "describe_replication_groups")
+        return {"ReplicationGroups": [{"ReplicationGroupId": ReplicationGroupId, "CacheNodeType": self.cloud.redis_type}]}
+
+    def describe_cache_clusters(self, CacheClusterId):
+        self.cloud.call("elasticache", "describe_cache_clusters")
+        return {"CacheClusters": [{"CacheClusterId": CacheClusterId, "CacheNodeType": self.cloud.redis_type}]}
+
+
+class FakeEKSClient:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def describe_cluster(self, name):
+        self.cloud.call("eks", "describe_cluster")
+        return {"cluster": {"name": name, "status": "ACTIVE"}}
+
+    def get_paginator(self, operation):
+        if operation != "list_nodegroups":
+            raise NotImplementedError(operation)
+        return FakePaginator(self.cloud, "eks", operation, lambda: sorted(self.cloud.nodegroups),
+                             "nodegroups", EKS_PAGE_SIZE, "nextToken")
+
+    def describe_nodegroup(self, clusterName, nodegroupName):
+        self.cloud.call("eks", "describe_nodegroup")
+        scaling_config = self.cloud.nodegroups.get(nodegroupName)
+        if scaling_config is None:
+            raise _client_error("ResourceNotFoundException", f"nodegroup {nodegroupName} not found", "DescribeNodegroup")
+        return {"nodegroup": {
+            "nodegroupName": nodegroupName,
+            "clusterName": clusterName,
+            "status": "ACTIVE",
+            "scalingConfig": dict(scaling_config),
+            "labels": {"eks.amazonaws.com/nodegroup": nodegroupName}
+        }}
+
+    def update_nodegroup_config(self, clusterName, nodegroupName, scalingConfig):
+        self.cloud.call("eks", "update_nodegroup_config")
+        if nodegroupName not in self.cloud.nodegroups:
+            raise _client_error("ResourceNotFoundException", f"nodegroup {nodegroupName} not found", "UpdateNodegroupConfig")
+        self.cloud.nodegroups[nodegroupName] = dict(scalingConfig)
+        return _ok()
+
+
+class FakeSession:
+    """替代 boto3.Session，只提供 client()"""
+
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def client(self, service_name, config=None, **kwargs):
+        clients = {"rds": FakeRDSClient, "elasticache": FakeElastiCacheClient, "eks": FakeEKSClient}
+        if service_name not in clients:
+            raise NotImplementedError(service_name)
+        return clients[service_name](self.cloud)
+
+
+def _affinity(pool):
+    """与 kubernetes 客户端反序列化的 V1Affinity 属性相同"""
+    if pool is None:
+        return None
+    expression = SimpleNamespace(key="eks.amazonaws.com/nodegroup", operator="In", values=[pool])
+    term = SimpleNamespace(match_expressions=[expression], match_fields=None)
+    node_affinity = SimpleNamespace(
+        required_during_scheduling_ignored_during_execution=SimpleNamespace(node_selector_terms=[term]),
+        preferred_during_scheduling_ignored_during_execution=None
+    )
+    return SimpleNamespace(node_affinity=node_affinity, pod_affinity=None, pod_anti_affinity=None)
+
+
+class FakeAppsApi:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def _deployment(self, name, namespace):
+        state = self.cloud.deployments.get((namespace, name))
+        if state is None:
+            raise _api_exception(404, f"deployment {namespace}/{name} not found")
+        replicas = state["replicas"]
+        return SimpleNamespace(
+            metadata=SimpleNamespace(name=name, namespace=namespace),
+            spec=SimpleNamespace(
+                replicas=replicas,
+                selector=SimpleNamespace(match_labels={"app": name}),
+                template=SimpleNamespace(spec=SimpleNamespace(affinity=_affinity(state["pool"])))
+            ),
+            status=SimpleNamespace(replicas=replicas, available_replicas=replicas, ready_replicas=replicas)
+        )
+
+    def read_namespaced_deployment(self, name, namespace):
+        self.cloud.call("k8s", "read_namespaced_deployment")
+        return self._deployment(name, namespace)
+
+    def patch_namespaced_deployment(self, name, namespace, body):
+        self.cloud.call("k8s", "patch_namespaced_deployment")
+        state = self.cloud.deployments.get((namespace, name))
+        if state is None:
+            raise _api_exception(404, f"deployment {namespace}/{name} not found")
+        affinity = body["spec"]["template"]["spec"]["affinity"]
+        if affinity is None:
+            state["pool"] = None
+        else:
+            terms = affinity["nodeAffinity"]["requiredDuringSchedulingIgnoredDuringExecution"]["nodeSelectorTerms"]
+            state["pool"] = terms[0]["matchExpressions"][0]["values"][0]
+        return self._deployment(name, namespace)
+
+
+class FakeAutoscalingApi:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def _hpa(self, name, namespace):
+        state = self.cloud.hpas[(namespace, name)]
+        return SimpleNamespace(
+            metadata=SimpleNamespace(name=name, namespace=namespace),
+            spec=SimpleNamespace(min_replicas=state["min"], max_replicas=state["max"], metrics=[]),
+            status=SimpleNamespace(current_replicas=state["min"])
+        )
+
+    def list_namespaced_horizontal_pod_autoscaler(self, namespace):
+        self.cloud.call("k8s", "list_namespaced_horizontal_pod_autoscaler")
+        names = sorted(name for hpa_namespace, name in self.cloud.hpas if hpa_namespace == namespace)
+        return SimpleNamespace(items=[self._hpa(name, namespace) for name in names])
+
+    def read_namespaced_horizontal_pod_autoscaler(self, name, namespace):
+        self.cloud.call("k8s", "read_namespaced_horizontal_pod_autoscaler")
+        if (namespace, name) not in self.cloud.hpas:
+            raise _api_exception(404, f"hpa {namespace}/{name} not found")
+        return self._hpa(name, namespace)
+
+    def patch_namespaced_horizontal_pod_autoscaler(self, name, namespace, body):
+        self.cloud.call("k8s", "patch_namespaced_horizontal_pod_autoscaler")
+        state = self.cloud.hpas.get((namespace, name))
+        if state is None:
+            raise _api_exception(404, f"hpa {namespace}/{name} not found")
+        if "minReplicas" in body["spec"]:
+            state["min"] = body["spec"]["minReplicas"]
+        if "maxReplicas" in body["spec"]:
+            state["max"] = body["spec"]["maxReplicas"]
+        return self._hpa(name, namespace)
+
+
+class FakeApiClient:
+    def close(self):
+        pass
+
+
+def create_fake_k8s_client(cloud):
+    """
+    使用替身API的 K8sClient
+
+    K8sClient 的读取、比较和patch逻辑保持不变，只替换 apps_api / autoscaling_api
+    """
+    from lib.k8s_client import K8sClient
+
+    k8s_client = K8sClient.__new__(K8sClient)
+    k8s_client.kube_config_path = "<fake>"
+    k8s_client.context_name = None
+    k8s_client.api_client = FakeApiClient()
+    k8s_client.apps_api = FakeAppsApi(cloud)
+    k8s_client.core_api = None
+    k8s_client.autoscaling_api = FakeAutoscalingApi(cloud)
+    k8s_client.informer = None
+    return k8s_client
+
+
+class FakeActiveUserSource:
+    """替代 ActiveUserSource，返回 FakeCloud.users"""
+
+    def __init__(self, cloud):
+        self.cloud = cloud
+        self.last_quota = {}
+        self.fetch_count = 0
+
+    def get_active_users(self):
+        self.cloud.call("ga", "run_realtime_report")
+        self.fetch_count += 1
+        return self.cloud.users
+
+    def stats(self):
+        return {"fetch_count": self.fetch_count, "quota": self.last_quota}
+
+    def close(self):
+        pass
+
+
+class FakeFeishuBot:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def send_rich_text(self, title, content):
+        self.cloud.call("feishu", "send_rich_text")
+        return {"code": 0}
+
+
+class FakeClientRegistry(ClientRegistry):
+    """
+    使用替身客户端的注册表
+
+    AWSDBManager、EKSManager、K8sClient、UserSampler 等业务代码保持不变，
+    只在 boto3 会话、Kubernetes API、GA 和飞书这一层替换，基准测试覆盖真实的调用路径
+    """
+
+    def __init__(self, cloud, conf=None):
+        super().__init__(conf)
+        self.cloud = cloud
+
+    def boto3_session(self):
+        return self._get_or_create("boto3_session", lambda: FakeSession(self.cloud))
+
+    def _create_k8s_client(self):
+        return create_fake_k8s_client(self.cloud)
+
+    def active_user_source(self):
+        return self._get_or_create("active_user_source", lambda: FakeActiveUserSource(self.cloud))
+
+    def scaling_manager(self):
+        return self._get_or_create("scaling_manager", lambda: ScalingConfigManager(matrix=self.cloud.matrix))
+
+    def feishu_bot(self):
+        return self._get_or_create("feishu_bot", lambda: FakeFeishuBot(self.cloud))
+
+
+def create_synthetic_matrix(services, levels=6, services_per_namespace=20, nodegroups=8):
+    """合成的容量矩阵快照"""
+    return CapacityMatrix(build_synthetic_levels(services, levels, services_per_namespace, nodegroups))
@@ -0,0 +1,110 @@
+# 用录制的外部调用(cassette_mode: record)离线重放伸缩检查，复现线上周期的耗时和调用次数
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+import yaml
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import logger
+from lib.cluster_controller import ClusterConfig
+from lib.cassette import LATENCY_ORIGINAL, LATENCY_NONE
+from conf.settings import get_project_root
+from bench.bench_cycle import summarize, git_commit
+
+
+def parse_overrides(values):
+    """key=value -> {key: yaml解析后的value}，用于还原录制时的配置(例如 scale_up_consecutive=1)"""
+    overrides = {}
+    for value in values or []:
+        key, _, raw = value.partition("=")
+        if not raw:
+            raise argparse.ArgumentTypeError(f"--set 格式应为 key=value: {value}")
+        overrides[key.lower()] = yaml.safe_load(raw)
+    return overrides
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线重放录制的伸缩检查")
+    parser.add_argument("cassette", help="cassette_mode: record 录制的JSONL文件")
+    parser.add_argument("--cycles", type=int, default=1, help="重放的检查次数")
+    parser.add_argument("--latency", choices=(LATENCY_ORIGINAL, LATENCY_NONE), default=LATENCY_ORIGINAL,
+                        help="original 按录制时的耗时等待，none 立即返回")
+    parser.add_argument("--set", dest="overrides", nargs="*", metavar="KEY=VALUE", help="覆盖配置项(config.yaml中的键)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="结果JSON文件，默认 data/bench/replay-<时间>.json")
+    args = parser.parse_args(argv)
+    args.overrides = parse_overrides(args.overrides)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    from core.core import AutoScalingService
+    from lib.clients import ClientRegistry
+
+    with tempfile.TemporaryDirectory(prefix="replay-") as workdir:
+        # 在线人数历史和扩容状态使用临时目录，不影响本地的 data/
+        definition = {
+            "history_dir": os.path.join(workdir, "history"),
+            "scaling_state_file": os.path.join(workdir, "scaling_state.json"),
+            "k8s_informer_enabled": False
+        }
+        definition.update(args.overrides)
+        definition.update({
+            "name": "replay",
+            "cassette_mode": "replay",
+            "cassette_file": os.path.abspath(args.cassette),
+            "cassette_replay_latency": args.latency
+        })
+        registry = ClientRegistry(ClusterConfig(definition))
+        service = AutoScalingService(registry)
+        try:
+            durations = []
+            cycles = []
+            for _ in range(args.cycles):
+                start = time.perf_counter()
+                service.check_and_scale()
+                durations.append(time.perf_counter() - start)
+                cycles.append(service.last_cycle_report)
+                wall = round(durations[-1] * 1000, 2)
+                print(f"cycle {len(cycles)}: {wall}ms calls={service.last_cycle_report['calls']}")
+            service._notifier.shutdown(wait=True)
+            cassette = registry.cassette.stats()
+        finally:
+            service.actuation_engine.shutdown()
+            service.history.close()
+            registry.close()
+
+    report = {
+        "benchmark": "replay",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cassette": os.path.abspath(args.cassette),
+        "params": {"cycles": args.cycles, "latency": args.latency, "overrides": args.overrides},
+        "wall_ms": summarize(durations),
+        "replay": cassette,
+        "cycles": cycles
+    }
+    if cassette["misses"]:
+        print(f"警告: {cassette['misses']} 次请求在录像中不存在，重放结果与录制时的决策路径不同")
+
+    output = args.output or os.path.join(
+        get_project_root(), "data", "bench", f"replay-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import yaml
 import inspect
 import os
+import socket
 from lib.logger import app_logger as logger
 
 
@@ -66,6 +67,67 @@ try:
     HPA_NAMESPACE = config["hpa_namespace"]
     HPA_SERVICE_NAME = config["hpa_service_name"]
     CHECK_TIME = config["check_time"]
+    GA_TIMEOUT = config.get("ga_timeout", 10)
+    MOCK_USERS_URL = config.get("mock_users_url", "")
+    ACTUATION_MAX_WORKERS = config.get("actuation_max_workers", 8)
+    ACTUATION_NAMESPACE_CONCURRENCY = config.get("actuation_namespace_concurrency", 4)
+    STATUS_REFRESH_INTERVAL = config.get("status_refresh_interval", 60)
+    AWS_MAX_POOL_CONNECTIONS = config.get("aws_max_pool_connections", 20)
+    AWS_MAX_ATTEMPTS = config.get("aws_max_attempts", 5)
+    K8S_POOL_MAXSIZE = config.get("k8s_pool_maxsize", 20)
+    K8S_INFORMER_ENABLED = config.get("k8s_informer_enabled", False)
+    EKS_DESCRIBE_CONCURRENCY = config.get("eks_describe_concurrency", 8)
+    EKS_INVENTORY_TTL = config.get("eks_inventory_ttl", 15)
+    FORECAST_ENABLED = config.get("forecast_enabled", False)
+    FORECAST_LEAD_SECONDS = config.get("forecast_lead_seconds", 600)
+    FORECAST_ALPHA = config.get("forecast_alpha", 0.5)
+    FORECAST_BETA = config.get("forecast_beta", 0.3)
+    FORECAST_WINDOW = config.get("forecast_window", 30)
+    HISTORY_DIR = config.get("history_dir", "data/history")
+    if not os.path.isabs(HISTORY_DIR):
+        HISTORY_DIR = os.path.join(get_project_root(), HISTORY_DIR)
+    HISTORY_RAW_CAPACITY = config.get("history_raw_capacity", 200000)
+    SIGNAL_WINDOW = config.get("signal_window", 10)
+    SIGNAL_MIN_SAMPLES = config.get("signal_min_samples", 5)
+    SIGNAL_MAD_THRESHOLD = config.get("signal_mad_threshold", 3.5)
+    SCALE_UP_CONSECUTIVE = config.get("scale_up_consecutive", 2)
+    SCALE_DOWN_RATIO = config.get("scale_down_ratio", 0.8)
+    SCALE_COOLDOWN_SECONDS = config.get("scale_cooldown_seconds", 600)
+    SCALING_STATE_FILE = config.get("scaling_state_file", "data/scaling_state.json")
+    SAMPLE_INTERVAL = config.get("sample_interval", 20)
+    SAMPLE_MAX_INTERVAL = config.get("sample_max_interval", 300)
+    SAMPLE_MAX_AGE = config.get("sample_max_age", 120)
+    SAMPLE_BUFFER_SIZE = config.get("sample_buffer_size", 1000)
+    GA_QUOTA_RESERVE = config.get("ga_quota_reserve", 0.2)
+    CYCLE_READ_WORKERS = config.get("cycle_read_workers", 8)
+    CYCLE_READ_TIMEOUT = config.get("cycle_read_timeout", 15)
+    CYCLE_READ_TIMEOUTS = config.get("cycle_read_timeouts") or {}
+    CHECK_MODE = config.get("check_mode", "fixed")
+    CHECK_INTERVAL_FLOOR = config.get("check_interval_floor", 60)
+    CHECK_INTERVAL_CEILING = config.get("check_interval_ceiling", 900)
+    CHECK_NEAR_RATIO = config.get("check_near_ratio", 0.15)
+    CHECK_QUIET_RATIO = config.get("check_quiet_ratio", 0.5)
+    CYCLE_DEADLINE_SECONDS = config.get("cycle_deadline_seconds", 120)
+    CYCLE_STAGE_SHARES = config.get("cycle_stage_shares") or {}
+    CLUSTERS = config.get("clusters") or []
+    LEADER_ELECTION = config.get("leader_election", "none")
+    LEADER_IDENTITY = config.get("leader_identity") or f"{socket.gethostname()}-{os.getpid()}"
+    LEADER_LEASE_NAME = config.get("leader_lease_name", "eks-autoscaling")
+    LEADER_LEASE_NAMESPACE = config.get("leader_lease_namespace", "default")
+    LEADER_LEASE_SECONDS = config.get("leader_lease_seconds", 15)
+    LEADER_RETRY_SECONDS = config.get("leader_retry_seconds", 5)
+    LEADER_LOCK_FILE = config.get("leader_lock_file", "data/leader.lock")
+    if not os.path.isabs(LEADER_LOCK_FILE):
+        LEADER_LOCK_FILE = os.path.join(get_project_root(), LEADER_LOCK_FILE)
+    DEBUG_TOKEN = config.get("debug_token") or ""
+    DEBUG_PROFILE_MAX_RUNS = config.get("debug_profile_max_runs", 20)
+    CASSETTE_MODE = config.get("cassette_mode", "off")
+    CASSETTE_FILE = config.get("cassette_file", "data/cassettes/cycle.jsonl")
+    if not os.path.isabs(CASSETTE_FILE):
+        CASSETTE_FILE = os.path.join(get_project_root(), CASSETTE_FILE)
+    CASSETTE_REPLAY_LATENCY = config.get("cassette_replay_latency", "original")
+    if not os.path.isabs(SCALING_STATE_FILE):
+        SCALING_STATE_FILE = os.path.join(get_project_root(), SCALING_STATE_FILE)
 
 except Exception as e:
     logger.error("conf -- 加载配置失败")
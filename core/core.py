@@ -1,132 +1,195 @@
 import sys
 import os
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from lib.logger import app_logger as logger
-from lib.get_analytics_user import get_active_users
 from lib.get_analytics_user import get_mock_users
-from lib.query_data import ScalingConfigManager
-from lib.feishu_bot import FeishuRichTextBot
-from lib.aws_db import AWSDBManager
-from lib.aws_eks import EKSManager
-from lib.k8s_client import K8sClient
-from conf import settings
+from lib.clients import get_client_registry
+from lib.actuator import get_actuation_engine, create_actuation_engine, format_results, ACTION_HPA_MIN
+from lib.reconciler import Reconciler
+from lib.forecaster import create_forecaster
+from lib.timeseries import get_timeseries_store, create_timeseries_store
+from lib.signal_filter import create_signal_filter, DIRECTION_DOWN
+from lib.sampler import get_user_sampler, create_user_sampler
+from lib.cycle_context import CycleContext
+from lib.errors import CapacityLevelError, DeadlineExceeded
+from lib.cycle_budget import CycleBudget, STAGE_SIGNAL, STAGE_INVENTORY, STAGE_ACTUATION, STAGE_NOTIFY
+from lib import metrics
 
 
 class AutoScalingService:
-    def __init__(self):
-        """初始化自动伸缩服务"""
-        self.scaling_manager = ScalingConfigManager()
-        self.feishu_bot = FeishuRichTextBot(
-            webhook_url=settings.FEISHU_WEBHOOK_URL,
-            max_retries=5,
-            retry_delay=1
-        )
-        self.aws_db_manager = AWSDBManager(
-            access_key_id=settings.AWS_ACCESS_KEY_ID,
-            secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
-        )
-        self.k8s_client = K8sClient(
-            kube_config_path=settings.KUBE_FILE_PATH,
-            context_name=settings.CLUSTER_CONTEXT
-        )
-        self.aws_eks_manager = EKSManager(
-            settings.AWS_REGION, 
-            settings.AWS_ACCESS_KEY_ID, 
-            settings.AWS_SECRET_ACCESS_KEY, 
-            settings.EKS_CLUSTER_NAME
-        )
+    def __init__(self, registry=None, actuation_engine=None):
+        """
+        初始化自动伸缩服务
 
-        # 记录上次扩容事件
-        self.last_scaling_time = None
-        self.last_level = None
+        Args:
+            registry (ClientRegistry): 客户端注册表，默认使用进程内共享的注册表；
+                传入集群注册表(多集群模式)时，采样器和时序存储按该集群的配置单独创建
+            actuation_engine (ActuationEngine): 多集群共用的执行器，为None时集群注册表按该集群的配置单独创建
+        """
+        self.registry = registry or get_client_registry()
+        self.conf = self.registry.conf
+        self.cluster_name = self.registry.name
+        self.metrics_cluster = metrics.cluster_label(self.cluster_name)
+        self.scaling_manager = self.registry.scaling_manager()
+        self.feishu_bot = self.registry.feishu_bot()
+        self.aws_db_manager = self.registry.aws_db_manager()
+        self.k8s_client = self.registry.k8s_client()
+        self.aws_eks_manager = self.registry.eks_manager()
+        if self.cluster_name is None:
+            # 在线人数历史和采样缓冲与 /api/status 共享，执行线程池与 /api/upgrade 共享
+            self.history = get_timeseries_store()
+            self.sampler = get_user_sampler()
+            self.actuation_engine = get_actuation_engine()
+        else:
+            self.history = create_timeseries_store(self.conf)
+            self.sampler = create_user_sampler(self.registry, history=self.history, conf=self.conf)
+            self.actuation_engine = actuation_engine or create_actuation_engine(self.conf)
+        self.reconciler = Reconciler(self.k8s_client, self.actuation_engine, read_executor=self.registry.read_executor())
+        # 样本时间、冷却和检查间隔使用的时钟，从模拟服务读取在线人数时为虚拟时间
+        self.clock = self.sampler.buffer.clock
+        # 在线人数预测器，未开启时为None
+        self.forecaster = create_forecaster(self.conf)
+        # 启动时用最近的在线人数历史预热预测器
+        if self.forecaster is not None:
+            for timestamp, value in self.history.latest(self.conf.FORECAST_WINDOW):
+                self.forecaster.observe(value, timestamp)
+
+        # 离群值过滤、升降级迟滞，上次扩容事件保存在状态文件中
+        self.signal_filter = create_signal_filter(self.conf, clock=self.clock)
+        self.signal_filter.warm_up(int(value) for _, value in self.history.latest(self.conf.SIGNAL_WINDOW))
+        # 已经处理过的最后一个样本，之后的样本在下个周期处理
+        latest = self.history.latest(1)
+        self._last_sample_ts = latest[0][0] if latest else None
+        self._last_filtered = None
+        # 最近一次检查的信号，供自适应调度使用
+        self.last_signal = None
+        # 最近一次检查的阶段耗时和外部调用统计
+        self.last_cycle_report = None
+        # 飞书通知在单独的线程中按顺序发送
+        self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feishu-notify")
         
         logger.info("自动伸缩服务已初始化")
     
-    def get_current_capacity_level(self):
+    def get_current_capacity_level(self, ctx=None):
         """
         根据线上的DB配置以及HPA最小配置 获取到当前配置级别
-        """
-        try:
-            # 获取DB 配置类型
-            rds_instance_types = self.aws_db_manager.get_rds_cluster_instance_type(settings.RDS_CLUSTER_NAME)
-            if rds_instance_types:
-                rds_highest_id, rds_highest_type = get_highest_instance_config(rds_instance_types)
-                logger.info(f"最高配置实例: {rds_highest_id}: {rds_highest_type}")
-            else:
-                logger.error(f"RDS集群 {settings.RDS_CLUSTER_NAME} 实例类型查询失败")
 
-            # 获取Redis类型
-            redis_node_type = self.aws_db_manager.get_elasticache_redis_node_type(settings.REDIS_OSS_NAME)
-            if redis_node_type:
-                logger.info(f"Redis实例 {settings.REDIS_OSS_NAME} 当前节点类型: {redis_node_type}")
-            else:
-                logger.error(f"Redis实例 {settings.REDIS_OSS_NAME} 节点类型查询失败")
+        Args:
+            ctx (CycleContext): 伸缩周期上下文，为None时单独创建
 
-            # 直接通过 istio的replic rds redis 获取当前级别
-            # 当前istio-ingress hpa min
-            istio_ingress_hpa = self.k8s_client.get_hpa_scaling_config(
-                hpa_name=settings.HPA_NAME,
-                namespace=settings.HPA_NAMESPACE
-            )
-            istio_ingress_hpa_min = istio_ingress_hpa['min_replicas']
-
-            # 比对配置 返回当前数据库中记录的 level 
-            capacity_level = self.scaling_manager.determine_capacity_level(
-                hpa_name=settings.HPA_NAME, 
-                namespace=settings.HPA_NAMESPACE, 
-                service_name=settings.HPA_SERVICE_NAME,
-                redis_instance_type=redis_node_type, 
-                postgres_instance_type=rds_highest_type,
-                replicas=istio_ingress_hpa_min
+        Raises:
+            CapacityLevelError: 依赖读取失败或线上配置无法对应到任何级别
+        """
+        ctx = ctx or CycleContext(self.registry, self.sampler)
+
+        # RDS、Redis、入口HPA 三个读取相互独立，并发执行
+        results, errors = ctx.gather({
+            "rds": ctx.rds_instance_types,
+            "elasticache": ctx.redis_node_type,
+            "k8s": lambda: ctx.hpa_configs(self.conf.HPA_NAMESPACE)
+        }, keys=ctx.input_keys())
+        if errors:
+            raise CapacityLevelError(
+                f"获取当前容量级别失败: {'; '.join(str(error) for error in errors.values())}", errors
             )
-            return capacity_level.user_capacity
 
-        except Exception as e:
-            logger.error(f"获取当前容量级别时发生错误: {str(e)}")
-            return 0
+        # 获取DB 配置类型
+        rds_instance_types = results["rds"]
+        if not rds_instance_types:
+            raise CapacityLevelError(f"RDS集群 {self.conf.RDS_CLUSTER_NAME} 实例类型查询失败")
+        rds_highest_id, rds_highest_type = get_highest_instance_config(rds_instance_types)
+        logger.info(f"最高配置实例: {rds_highest_id}: {rds_highest_type}")
+
+        # 获取Redis类型
+        redis_node_type = results["elasticache"]
+        if redis_node_type:
+            logger.info(f"Redis实例 {self.conf.REDIS_OSS_NAME} 当前节点类型: {redis_node_type}")
+        else:
+            logger.error(f"Redis实例 {self.conf.REDIS_OSS_NAME} 节点类型查询失败")
+
+        # 直接通过 istio的replic rds redis 获取当前级别
+        # 当前istio-ingress hpa min
+        hpa_config = results["k8s"].get(self.conf.HPA_NAME)
+        if not hpa_config:
+            raise CapacityLevelError(f"未找到HPA {self.conf.HPA_NAMESPACE}/{self.conf.HPA_NAME}")
+        istio_ingress_hpa_min = hpa_config['min_replicas']
+
+        # 比对配置 返回当前数据库中记录的 level 
+        capacity_level = self.scaling_manager.determine_capacity_level(
+            hpa_name=self.conf.HPA_NAME, 
+            namespace=self.conf.HPA_NAMESPACE, 
+            service_name=self.conf.HPA_SERVICE_NAME,
+            redis_instance_type=redis_node_type, 
+            postgres_instance_type=rds_highest_type,
+            replicas=istio_ingress_hpa_min
+        )
+        if capacity_level is None:
+            raise CapacityLevelError(
+                f"线上配置无法对应到任何级别: HPA最小副本 {istio_ingress_hpa_min}，Redis {redis_node_type}，RDS {rds_highest_type}"
+            )
+        return capacity_level.user_capacity
 
     def check_and_scale(self):
         """检查用户数量并执行伸缩操作"""
+        # 本周期的时间预算，按 signal/inventory/actuation/notify 分配到各阶段
+        budget = CycleBudget(self.conf.CYCLE_DEADLINE_SECONDS, self.conf.CYCLE_STAGE_SHARES)
+        # 本周期内的外部读取只执行一次，读取超时不超过所在阶段的剩余预算
+        ctx = CycleContext(self.registry, self.sampler, budget=budget)
         try:
-            # 获取当前活跃用户数
-            user_count = get_active_users(settings.KEY_FILE_LOCATION, settings.PROPERTY_ID)
-            # user_count = get_mock_users(api_url="http://10.4.59.123:5000/api/online-users")
-            # user_count = 1000
-            
-            # 判断是否需要扩容及获取目标级别
-            scaling_required, target_level, current_capacity = self._evaluate_scaling_need(user_count)
+            with budget.stage(STAGE_SIGNAL):
+                # GA、RDS、Redis、入口HPA 并发读取，后续步骤直接使用本周期缓存
+                ctx.gather_inputs()
+
+                # 获取当前活跃用户数，离群读数用窗口中位数代替
+                user_count, filtered_count, is_outlier, readings = self._ingest_samples(ctx)
+                # user_count = get_mock_users(api_url="http://10.4.59.123:5000/api/online-users")
+                # user_count = 1000
+
+                # 预测值高于当前值时按预测值选择级别，提前完成扩容
+                forecast_count = self._forecast_users()
+                decision_count = max(filtered_count, forecast_count) if forecast_count is not None else filtered_count
+                logger.info(f"当前活跃用户数: {user_count}，过滤后: {filtered_count}{'(离群)' if is_outlier else ''}，"
+                            f"预测用户数: {forecast_count}，用于决策的用户数: {decision_count}")
+                self._record_signal(ctx, user_count, filtered_count, forecast_count)
+
+                # 判断是否需要扩容及获取目标级别
+                # 最新读数之前的读数也计入升级的连续次数
+                scaling_required, target_level, current_capacity = self._evaluate_scaling_need(
+                    decision_count, ctx, earlier_counts=readings[:-1], latest_is_new=bool(readings)
+                )
             if not scaling_required:
                 return
-            
-            # 获取完整配置
-            complete_config = self.scaling_manager.get_complete_config(user_count)
-            
-            # 检查基础设施是否满足要求
-            infrastructure_ready, db_status, redis_status = self._check_infrastructure(complete_config)
-            
+
+            with budget.stage(STAGE_INVENTORY):
+                # 获取完整配置
+                complete_config = ctx.complete_config(target_level.user_capacity)
+
+                # 检查基础设施是否满足要求
+                infrastructure_ready, db_status, redis_status = self._check_infrastructure(complete_config, ctx)
+                if infrastructure_ready:
+                    node_info = ctx.nodegroup_desired_sizes()
+
             # 准备并发送通知
             self._send_scaling_notification(
                 user_count, current_capacity, target_level.user_capacity, 
-                infrastructure_ready, db_status, redis_status, complete_config
+                infrastructure_ready, db_status, redis_status, complete_config,
+                forecast_count=forecast_count
             )
             
             # 如果基础设施已准备好，执行K8s资源伸缩
             if infrastructure_ready:
-                # 判断节点组情况，如果期望值为0 需要修改，如果不为0 不用处理，直接升级
-                nodegroups = self.aws_eks_manager.list_nodegroups()
-                node_info = {}
-                for nodegroup_name in nodegroups:
-                    desired_size = self.aws_eks_manager.get_nodegroup_desired_size(nodegroup_name)
-                    node_info[nodegroup_name] = desired_size
-                for pool in node_info:
-                    if node_info[pool] == 0:
-                        up_pool_state = self.aws_eks_manager.update_nodegroup_scaling(pool,0,20,1)
-
-                scaling_results = self._scale_kubernetes_resources(complete_config)
-                if scaling_results:
+                with budget.stage(STAGE_ACTUATION):
+                    # 判断节点组情况，如果期望值为0 需要修改，如果不为0 不用处理，直接升级
+                    for pool in node_info:
+                        if node_info[pool] == 0:
+                            up_pool_state = self.aws_eks_manager.update_nodegroup_scaling(pool,0,20,1)
+
+                    scaling_results = self._scale_kubernetes_resources(complete_config, ctx)
+
+                with budget.stage(STAGE_NOTIFY):
                     scaling_message = []
                     for res in scaling_results:
                         scaling_message.append(
@@ -134,46 +197,152 @@ class AutoScalingService:
                                 {"tag": "text", "text": str(res)},
                             ]
                         )
-                self.feishu_bot.send_rich_text(
-                    title = f"⚠️ 资源伸缩信息",
-                    content = scaling_message
-                )
+                    self._notify(
+                        title = f"⚠️ 资源伸缩信息",
+                        content = scaling_message
+                    )
                 self._update_scaling_history(target_level.user_capacity)
-                
+
+        except DeadlineExceeded as e:
+            # 预算用完的阶段推迟到下一个周期，不视为服务异常
+            logger.warning(str(e))
         except Exception as e:
             error_message = [
                 [
                     {"tag": "text", "text": "错误信息"},
-                    {"tag": "text", "text": {str(e)}},
+                    {"tag": "text", "text": f"{type(e).__name__}: {str(e)}"},
                 ]
             ]
             logger.error(error_message, exc_info=True)
             # 发送错误通知
-            self.feishu_bot.send_rich_text(
+            self._notify(
                 title="❌ 自动伸缩服务异常",
                 content=error_message
             )
+        finally:
+            self.last_cycle_report = dict(budget.report(), **ctx.stats())
+            self._observe_cycle(self.last_cycle_report)
+            logger.info(f"本次检查完成，{ctx.summary()}")
+
+    def _observe_cycle(self, report):
+        """各阶段耗时、超出预算和推迟次数写入 /api/metrics"""
+        cluster = self.metrics_cluster
+        metrics.CYCLE_SECONDS.observe(report["elapsed_ms"] / 1000, cluster=cluster)
+        for stage, info in report["stages"].items():
+            if info["deferred"]:
+                metrics.CYCLE_STAGE_DEFERRED.inc(cluster=cluster, stage=stage)
+                continue
+            metrics.CYCLE_STAGE_SECONDS.observe(info["elapsed_ms"] / 1000, cluster=cluster, stage=stage)
+            if info["overrun"]:
+                metrics.CYCLE_STAGE_OVERRUNS.inc(cluster=cluster, stage=stage)
+
+    def _record_decision(self, outcome):
+        """伸缩判断结果计数: upgrade、downgrade-notify、noop、cooldown"""
+        metrics.SCALING_DECISIONS.inc(cluster=self.metrics_cluster, outcome=outcome)
+
+    def _notify(self, title, content):
+        """
+        飞书通知放入后台线程发送，重试等待不占用检查周期的时间预算
+        """
+        def send():
+            try:
+                self.feishu_bot.send_rich_text(title=f"[{self.cluster_name}] {title}" if self.cluster_name else title, content=content)
+            except Exception as e:
+                logger.error(f"发送飞书通知失败: {title}: {str(e)}")
+        self._notifier.submit(send)
+
+    def _ingest_samples(self, ctx):
+        """
+        处理上个周期以来采样到的所有样本(过滤离群值并更新预测器)
+
+        Returns:
+            tuple: (最新在线人数, 过滤后的人数, 是否离群, 本周期处理的过滤后读数列表)
+        """
+        # 缓冲中的样本过旧或采样未启动时直接查询一次
+        latest = ctx.active_users()
+        samples = self.sampler.buffer.since(self._last_sample_ts)
+        readings = []
+        for timestamp, value in samples:
+            filtered_count, is_outlier = self.signal_filter.filter(value)
+            readings.append(filtered_count)
+            if self.forecaster is not None:
+                self.forecaster.observe(filtered_count, timestamp)
+            self._last_sample_ts = timestamp
+            self._last_filtered = (filtered_count, is_outlier)
+        logger.info(f"本周期处理样本 {len(samples)} 个，最新样本时间 {datetime.fromtimestamp(latest[0]).strftime('%H:%M:%S')}")
+
+        filtered_count, is_outlier = self._last_filtered or (latest[1], False)
+        return latest[1], filtered_count, is_outlier, readings
+
+    def _record_signal(self, ctx, user_count, filtered_count, forecast_count):
+        """记录本次检查的在线人数、增速和所处级别的边界"""
+        level = ctx.target_level(filtered_count)
+        trend = self.forecaster.stats()["trend_per_minute"] if self.forecaster is not None else None
+        metrics.CURRENT_USERS.set(user_count, cluster=self.metrics_cluster)
+        self.last_signal = {
+            "time": self.clock.time(),
+            "user_count": user_count,
+            "filtered_count": filtered_count,
+            "forecast_count": forecast_count,
+            "trend_per_minute": trend,
+            "boundary": level.user_capacity if level else None
+        }
+
+    def _forecast_users(self):
+        """
+        预热时间之后的预测人数
+
+        Returns:
+            int|None: 预测人数，未开启预测时返回None
+        """
+        if self.forecaster is None:
+            return None
+        return self.forecaster.forecast(self.conf.FORECAST_LEAD_SECONDS)
 
-    def _evaluate_scaling_need(self, user_count):
-        """评估是否需要进行扩容"""
+    def _evaluate_scaling_need(self, user_count, ctx, earlier_counts=(), latest_is_new=True):
+        """
+        评估是否需要进行扩容
+
+        Args:
+            user_count (int): 用于决策的在线人数
+            ctx (CycleContext): 本周期的读取上下文
+            earlier_counts (list): 上次检查之后、最新读数之前的过滤后读数，计入升级的连续次数
+            latest_is_new (bool): 上次检查之后是否有新样本
+        """
         # 获取目标容量级别
-        target_level = self.scaling_manager.get_target_level(user_count)
+        target_level = ctx.target_level(user_count)
         if not target_level:
             logger.error("无法确定目标容量级别")
+            self._record_decision(metrics.OUTCOME_NOOP)
             return False, None, None
         
         level_user_capacity = target_level.user_capacity
+        metrics.TARGET_LEVEL.set(level_user_capacity, cluster=self.metrics_cluster)
 
         logger.info(f"目标容量级别: {level_user_capacity}")
         
         # 获取当前系统配置的容量级别
-        current_capacity = self.get_current_capacity_level()
-        
+        current_capacity = self.get_current_capacity_level(ctx)
+        metrics.CURRENT_LEVEL.set(current_capacity, cluster=self.metrics_cluster)
+
+        # 迟滞判断：升级需要连续多次读数，降级需要低于更低的阈值
+        earlier_targets = []
+        for count in earlier_counts:
+            level = ctx.target_level(count)
+            earlier_targets.append(level.user_capacity if level else None)
+        decision = self.signal_filter.evaluate(
+            user_count, current_capacity, level_user_capacity, self.scaling_manager.matrix.capacities,
+            earlier_targets=earlier_targets, latest_is_new=latest_is_new
+        )
+        logger.info(f"信号过滤 -- 方向: {decision['direction']}，允许: {decision['allowed']}，{decision['reason']}")
 
         # 如果用户数低于600 不需要操作
         if user_count < 600:
             # 还是需要检查当前配置是否高于600，高于600 还是需要降配
-            if current_capacity > 600:
+            if current_capacity > 600 and decision["direction"] == DIRECTION_DOWN and not decision["allowed"]:
+                logger.info("用户数低于600，但未达到降级阈值，暂不发送降配通知")
+                self._record_decision(metrics.OUTCOME_COOLDOWN)
+            elif current_capacity > 600:
                 logger.info(f"用户数低于600，但当前配置容量级别为{current_capacity}，需要降配")
                 
                 # 发送降级通知但不执行操作
@@ -198,17 +367,22 @@ class AutoScalingService:
                         {"tag": "text", "text": "根据配置，需上线手动调整降配"},
                     ]
                 ]
-                self.feishu_bot.send_rich_text(
+                self._notify(
                     title = f"⚠️ 降配通知 - 用户数低于600",
                     content = message_content
                 )
+                self._record_decision(metrics.OUTCOME_DOWNGRADE_NOTIFY)
             else:
                 logger.info("用户数低于600，当前配置适合，不需要操作")
+                self._record_decision(metrics.OUTCOME_NOOP)
 
             return False, None, None
         
         # 检查是否需要降级 - 如果目标容量小于当前容量，只发送通知不执行操作
         is_downgrade = level_user_capacity < current_capacity
+        if is_downgrade and not decision["allowed"]:
+            self._record_decision(metrics.OUTCOME_COOLDOWN)
+            return False, None, None
         if is_downgrade:
             logger.info(f"检测到降级请求（当前:{current_capacity} -> 目标:{level_user_capacity}），仅发送通知不执行操作")
             
@@ -234,27 +408,30 @@ class AutoScalingService:
                     {"tag": "text", "text": "根据配置，需上线手动调整降配"},
                 ]
             ]
-            self.feishu_bot.send_rich_text(
+            self._notify(
                 title = f"⚠️ 降配通知",
                 content = message_content
             )
+            self._record_decision(metrics.OUTCOME_DOWNGRADE_NOTIFY)
             return False, None, None
         
         # 如果目标级别与当前级别相同，不执行操作
         if level_user_capacity == current_capacity:
             logger.info(f"目标容量级别与当前配置相同 ({level_user_capacity})，无需操作")
+            self._record_decision(metrics.OUTCOME_NOOP)
             return False, None, None
         
-        # 检查是否与上次扩容级别相同且时间间隔小于10分钟
-        current_time = datetime.now()
-        if (self.last_scaling_time and self.last_level == level_user_capacity and 
-            (current_time - self.last_scaling_time).seconds < 600):
-            logger.info(f"最近已执行过级别 {level_user_capacity} 的扩容，跳过")
+        # 连续读数不足或同一级别仍在冷却中
+        if not decision["allowed"]:
+            self._record_decision(metrics.OUTCOME_COOLDOWN)
             return False, None, None
-        
+
+        # 按连续多次读数中最小的目标级别扩容
+        target_level = ctx.target_level(decision["target_capacity"])
+        self._record_decision(metrics.OUTCOME_UPGRADE)
         return True, target_level, current_capacity
 
-    def _check_infrastructure(self, complete_config):
+    def _check_infrastructure(self, complete_config, ctx):
         """
         检查数据库和Redis配置是否满足目标配置，仅比较实例类型 
         如果目标配置比当前配置大的多也是可以升级
@@ -262,9 +439,9 @@ class AutoScalingService:
         """
         try:
             # 获取当前RDS实例类型
-            rds_instance_type = self.aws_db_manager.get_rds_cluster_instance_type(settings.RDS_CLUSTER_NAME)
+            rds_instance_type = ctx.rds_instance_types()
             if not rds_instance_type:
-                logger.error(f"获取RDS实例类型失败: {settings.RDS_CLUSTER_NAME}")
+                logger.error(f"获取RDS实例类型失败: {self.conf.RDS_CLUSTER_NAME}")
                 return False, None, None
             
 
@@ -272,9 +449,9 @@ class AutoScalingService:
             _, highest_rds_type = get_highest_instance_config(rds_instance_type)
 
             # 获取当前Redis实例类型
-            redis_type = self.aws_db_manager.get_elasticache_redis_node_type(settings.REDIS_OSS_NAME)
+            redis_type = ctx.redis_node_type()
             if not redis_type:
-                logger.error(f"获取Redis实例类型失败: {settings.REDIS_OSS_NAME}")
+                logger.error(f"获取Redis实例类型失败: {self.conf.REDIS_OSS_NAME}")
                 return False, None, None
             
             # 获取目标实例类型
@@ -346,59 +523,26 @@ class AutoScalingService:
             logger.error(f"检查基础设施时发生错误: {str(e)}")
             return False, None, None
 
-    def _scale_kubernetes_resources(self, complete_config):
+    def _scale_kubernetes_resources(self, complete_config, ctx=None):
         """执行Kubernetes资源的伸缩操作"""
         scaling_results = []
-        
-        # 遍历所有服务并进行更新
-        for namespace, services in complete_config["services"].items():
-            for service_name, service_config in services.items():
-                # 更新HPA最小副本数
-                if service_config["hpa_name"]:
-                    try:
-                        hpa_name = service_config["hpa_name"]
-                        replicas = service_config["replicas"]
-                        
-                        # 调用K8s客户端更新HPA
-                        self.k8s_client.update_hpa_scaling(
-                            namespace=namespace,
-                            hpa_name=hpa_name,
-                            min_replicas=replicas
-                        )
-                        
-                        scaling_results.append(
-                            f"- ✅ 已将 {namespace}/{hpa_name} 最小副本数更新为 {replicas}"
-                        )
-                        logger.info(f"已将 {namespace}/{hpa_name} 最小副本数更新为 {replicas}")
-                    except Exception as e:
-                        error_msg = f"- ❌ 更新 {namespace}/{hpa_name} 失败: {str(e)}"
-                        scaling_results.append(error_msg)
-                        logger.error(error_msg)
-                
-                # 更新节点亲和性
-                if service_config["pool_name"]:
-                    try:
-                        # 调用K8s客户端更新节点亲和性
-                        if  service_config["pool_name"]:
-                            self.k8s_client.set_nodegroup_affinity(
-                                namespace=namespace,
-                                deployment_name=service_name,
-                                nodegroup_key="eks.amazonaws.com/nodegroup",
-                                nodegroup_values=service_config["pool_name"]
-                            )
-                            scaling_results.append(
-                                f"- ✅ 已将 {namespace}/{service_name} 节点亲和性更新为 {service_config['pool_name']}"
-                            )
-                            logger.info(f"已将 {namespace}/{service_name} 节点亲和性更新为 {service_config['pool_name']}")
-                    except Exception as e:
-                        error_msg = f"- ❌ 更新 {namespace}/{service_name} 节点亲和性失败: {str(e)}"
-                        scaling_results.append(error_msg)
-                        logger.error(error_msg)
-        
+
+        # 只对与线上状态不一致的HPA和节点亲和性并发执行更新
+        # 执行时间不超过actuation阶段的剩余预算，未开始的变更推迟到下一个周期
+        timeout = ctx.budget.remaining() if ctx is not None and ctx.budget is not None else None
+        plan, report = self.reconciler.reconcile(complete_config, ctx=ctx, timeout=timeout)
+        scaling_results.extend(format_results(report["results"], {
+            ACTION_HPA_MIN: ("- ✅ 已将 {target} 最小副本数更新为 {value} ({elapsed_ms}ms)", "- ❌ 更新 {target} 失败: {error}"),
+            None: ("- ✅ 已将 {target} 节点亲和性更新为 {value} ({elapsed_ms}ms)", "- ❌ 更新 {target} 节点亲和性失败: {error}")
+        }))
+        if plan["unchanged"]:
+            scaling_results.append(f"- ℹ️ {len(plan['unchanged'])} 项配置已是目标值，未执行更新")
+
         return scaling_results
 
     def _send_scaling_notification(self, user_count, current_capacity, target_capacity, 
-                                infrastructure_ready, db_status, redis_status, complete_config):
+                                infrastructure_ready, db_status, redis_status, complete_config,
+                                forecast_count=None):
         """发送扩容通知，使用飞书富文本格式"""
         message_title = f"🚨 [生产环境] 系统资源通知"
         
@@ -414,6 +558,11 @@ class AutoScalingService:
                 {"tag": "text", "text": "👥 当前活跃用户数: "},
                 {"tag": "text", "text": str(user_count)}
             ],
+            # 预测用户数
+            [
+                {"tag": "text", "text": "📈 预测活跃用户数: "},
+                {"tag": "text", "text": f"{forecast_count} ({self.conf.FORECAST_LEAD_SECONDS}秒后)" if forecast_count is not None else "未开启"}
+            ],
             # 当前配置级别
             [
                 {"tag": "text", "text": "⚙️ 当前系统配置容纳级别: "},
@@ -489,16 +638,15 @@ class AutoScalingService:
             ])
         
         # 发送通知
-        self.feishu_bot.send_rich_text(
+        self._notify(
             title=message_title,
             content=message_content
         )
         logger.info(f"已发送扩容通知: {message_title}")
 
     def _update_scaling_history(self, target_capacity):
-        """更新扩容历史记录"""
-        self.last_scaling_time = datetime.now()
-        self.last_level = target_capacity
+        """更新扩容历史记录，开始冷却"""
+        self.signal_filter.record_scaling(target_capacity)
 
 def get_highest_instance_config(instance_types):
     """
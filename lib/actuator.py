@@ -0,0 +1,248 @@
+# HPA 与节点亲和性的并发执行模块
+import sys
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.metrics import observe_call
+
+
+NODEGROUP_KEY = "eks.amazonaws.com/nodegroup"
+
+# 执行动作类型
+ACTION_HPA_MIN = "hpa_min"
+ACTION_SET_AFFINITY = "set_affinity"
+ACTION_REMOVE_AFFINITY = "remove_affinity"
+
+
+def build_actions(complete_config, remove_affinity=False):
+    """
+    根据级别完整配置生成需要执行的动作列表
+
+    Args:
+        complete_config (dict): ScalingConfigManager.get_complete_config 返回的配置
+        remove_affinity (bool): 为True时移除节点亲和性(降级到默认级别)，否则设置为配置中的节点组
+
+    Returns:
+        list: 动作字典列表 {"kind", "namespace", "name", "value"}
+    """
+    actions = []
+    for namespace, services in complete_config["services"].items():
+        for service_name, service_config in services.items():
+            if service_config["hpa_name"]:
+                actions.append({
+                    "kind": ACTION_HPA_MIN,
+                    "namespace": namespace,
+                    "name": service_config["hpa_name"],
+                    "value": service_config["replicas"]
+                })
+            if service_config["pool_name"]:
+                actions.append({
+                    "kind": ACTION_REMOVE_AFFINITY if remove_affinity else ACTION_SET_AFFINITY,
+                    "namespace": namespace,
+                    "name": service_name,
+                    "value": service_config["pool_name"]
+                })
+    return actions
+
+
+def format_results(results, templates, **fields):
+    """
+    把执行结果转换为文字描述列表
+
+    Args:
+        results (list): ActuationEngine.run 报告中的 results
+        templates (dict): {动作类型: (成功模板, 失败模板)}，键 None 为其他动作类型的默认模板；
+            模板中可以使用 target(命名空间/名称) 和结果中的字段(value、error、elapsed_ms 等)
+        fields: 额外的模板字段，值为接收单个结果的函数
+
+    Returns:
+        list: 每个结果一行
+    """
+    lines = []
+    for res in results:
+        succeeded, failed = templates.get(res["kind"]) or templates[None]
+        values = dict(res, target=f"{res['namespace']}/{res['name']}")
+        values.update((name, field(res)) for name, field in fields.items())
+        lines.append((succeeded if res["success"] else failed).format(**values))
+    return lines
+
+
+def observed_key(action):
+    """计划阶段读取到的对象在 observed 中的键"""
+    return (action["kind"], action["namespace"], action["name"])
+
+
+class ActuationEngine:
+    """
+    K8s资源伸缩执行器
+
+    使用有界线程池并发执行HPA和Deployment的patch操作，
+    每个命名空间单独限制并发数，汇总每个目标的执行结果和耗时；
+    多集群模式下各集群共用一个执行器，并发数按 (集群的K8s客户端, 命名空间) 分别计算
+    """
+
+    def __init__(self, max_workers=8, namespace_concurrency=4):
+        """
+        初始化执行器
+
+        Args:
+            max_workers (int): 线程池最大线程数
+            namespace_concurrency (int): 单个命名空间同时执行的最大patch数
+        """
+        self.max_workers = max_workers
+        self.namespace_concurrency = namespace_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="actuator")
+        # 每个 (K8s客户端, 命名空间) 正在执行的动作数，以及超出并发数后等待的动作
+        self._running = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _dispatch(self, slot, task):
+        """
+        命名空间未达到并发上限时提交到线程池，否则排队
+
+        排队的动作由同一命名空间执行完的线程接着执行，线程池中的线程不会阻塞等待命名空间的并发名额，
+        一个命名空间的大量变更不会占住线程而拖慢其他命名空间
+        """
+        with self._lock:
+            if self._running.get(slot, 0) >= self.namespace_concurrency:
+                self._pending.setdefault(slot, deque()).append(task)
+                return
+            self._running[slot] = self._running.get(slot, 0) + 1
+        self._executor.submit(self._drain, slot, task)
+
+    def _drain(self, slot, task):
+        """执行一个动作后继续执行该命名空间排队的动作，没有排队时释放名额"""
+        while task is not None:
+            k8s_client, action, current, future = task
+            # 已超时取消的动作不再执行
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._apply(k8s_client, action, current))
+            with self._lock:
+                pending = self._pending.get(slot)
+                if pending:
+                    task = pending.popleft()
+                else:
+                    task = None
+                    self._running[slot] -= 1
+
+    def _apply(self, k8s_client, action, current=None):
+        """
+        执行单个动作，返回结果字典
+
+        current 为计划阶段读取到的HPA配置或Deployment，传入时不再重新读取
+        """
+        result = dict(action, success=False, error=None, elapsed_ms=None)
+        namespace = action["namespace"]
+        start = time.perf_counter()
+        try:
+            with observe_call("k8s", action["kind"]):
+                if action["kind"] == ACTION_HPA_MIN:
+                    k8s_client.update_hpa_scaling(
+                        namespace=namespace,
+                        hpa_name=action["name"],
+                        min_replicas=action["value"],
+                        current=current
+                    )
+                elif action["kind"] == ACTION_SET_AFFINITY:
+                    k8s_client.set_nodegroup_affinity(
+                        namespace=namespace,
+                        deployment_name=action["name"],
+                        nodegroup_key=NODEGROUP_KEY,
+                        nodegroup_values=action["value"],
+                        deployment=current
+                    )
+                elif action["kind"] == ACTION_REMOVE_AFFINITY:
+                    k8s_client.remove_node_affinity(
+                        deployment_name=action["name"],
+                        namespace=namespace,
+                        deployment=current
+                    )
+                else:
+                    raise ValueError(f"未知的动作类型: {action['kind']}")
+            result["success"] = True
+            logger.info(f"actuator -- {action['kind']} {namespace}/{action['name']} -> {action['value']} 执行成功")
+        except Exception as e:
+            result["error"] = str(e)
+            logger.error(f"actuator -- {action['kind']} {namespace}/{action['name']} 执行失败: {str(e)}")
+        finally:
+            result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    def run(self, k8s_client, actions, timeout=None, observed=None):
+        """
+        并发执行动作列表
+
+        Args:
+            k8s_client (K8sClient): K8s客户端
+            actions (list): build_actions 生成的动作列表
+            timeout (float): 总超时(秒)，超时后尚未开始的动作被取消(deferred)，为None时等待全部完成
+            observed (dict): Reconciler.plan 读取到的对象 {observed_key(动作): HPA配置或Deployment}
+
+        Returns:
+            dict: {"success": 是否全部成功, "succeeded": 成功数, "failed": 失败数, "deferred": 取消数,
+                   "elapsed_ms": 总耗时, "results": 每个目标的结果(与actions顺序一致)}
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        observed = observed or {}
+        futures = []
+        for action in actions:
+            future = Future()
+            futures.append(future)
+            self._dispatch((id(k8s_client), action["namespace"]), (k8s_client, action, observed.get(observed_key(action)), future))
+        results = []
+        for action, future in zip(actions, futures):
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                deferred = future.cancel()
+                error = "超出时间预算，已取消，下个周期重试" if deferred else "超出时间预算，仍在后台执行"
+                logger.warning(f"actuator -- {action['kind']} {action['namespace']}/{action['name']} {error}")
+                results.append(dict(action, success=False, deferred=deferred, error=error, elapsed_ms=None))
+        failed = sum(1 for res in results if not res["success"])
+        deferred_count = sum(1 for res in results if res.get("deferred"))
+
+        report = {
+            "success": failed == 0,
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "deferred": deferred_count,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            "results": results
+        }
+        logger.info(f"actuator -- 执行完成: 成功 {report['succeeded']} 失败 {failed} 总耗时 {report['elapsed_ms']}ms")
+        return report
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False)
+
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+
+def create_actuation_engine(conf=None):
+    """根据配置创建执行器"""
+    if conf is None:
+        from conf import settings as conf
+    return ActuationEngine(
+        max_workers=conf.ACTUATION_MAX_WORKERS,
+        namespace_concurrency=conf.ACTUATION_NAMESPACE_CONCURRENCY
+    )
+
+
+def get_actuation_engine():
+    """获取进程内共享的执行器，调度任务和REST接口共用一个线程池"""
+    global _shared_engine
+    if _shared_engine is None:
+        with _shared_engine_lock:
+            if _shared_engine is None:
+                _shared_engine = create_actuation_engine()
+    return _shared_engine
@@ -10,7 +10,7 @@ from lib.logger import app_logger as logger
 class AWSDBManager:
     """AWS数据库管理类，用于管理RDS和ElastiCache Redis实例"""
     
-    def __init__(self, region_name, access_key_id, secret_access_key):
+    def __init__(self, region_name, access_key_id, secret_access_key, session=None, client_config=None):
         """
         初始化AWS数据库管理器
         
@@ -18,60 +18,92 @@ class AWSDBManager:
             region_name (str): AWS区域名称
             access_key_id (str): AWS访问密钥ID
             secret_access_key (str): AWS私有访问密钥
+            session (boto3.Session): 共享的boto3会话，为None时单独创建客户端
+            client_config (botocore.config.Config): 连接池和重试配置
         """
         self.region_name = region_name
         self.access_key_id = access_key_id
         self.secret_access_key = secret_access_key
         
         # 初始化AWS客户端
+        if session is not None:
+            self.rds_client = session.client('rds', config=client_config)
+            self.elasticache_client = session.client('elasticache', config=client_config)
+            return
+
         self.rds_client = boto3.client(
             'rds',
             region_name=self.region_name,
             aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key
+            aws_secret_access_key=self.secret_access_key,
+            config=client_config
         )
         
         self.elasticache_client = boto3.client(
             'elasticache',
             region_name=self.region_name,
             aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key
+            aws_secret_access_key=self.secret_access_key,
+            config=client_config
         )
     
-    def get_rds_cluster_instance_type(self, cluster_name):
+    def describe_rds_cluster_members(self, cluster_name):
         """
-        查询RDS集群的实例类型信息
-        
+        批量查询RDS集群所有成员的实例类型、角色和状态
+
+        集群成员通过一次按 db-cluster-id 过滤的分页 describe_db_instances 查询，
+        读副本增加时API调用次数保持不变
+
         Args:
             cluster_name (str): RDS集群名称
-            
+
         Returns:
-            dict: 包含实例ID和对应实例类型的字典，失败则返回空字典
+            dict: {instance_id: {"instance_class", "role", "status"}}，失败则返回空字典
         """
         try:
-            # 获取集群实例信息
+            # 集群成员的读写角色只在 describe_db_clusters 中返回
             response = self.rds_client.describe_db_clusters(DBClusterIdentifier=cluster_name)
             if not response['DBClusters']:
                 logger.error(f"aws db -- 未找到RDS集群: {cluster_name}")
                 return {}
-                
-            db_cluster = response['DBClusters'][0]
-            db_instance_identifiers = [member['DBInstanceIdentifier'] for member in db_cluster['DBClusterMembers']]
-            
-            instance_types = {}
-            for instance_id in db_instance_identifiers:
-                instance_info = self.rds_client.describe_db_instances(DBInstanceIdentifier=instance_id)
-                instance_class = instance_info['DBInstances'][0]['DBInstanceClass']
-                instance_types[instance_id] = instance_class
-                
-            return instance_types
-            
+
+            roles = {
+                member['DBInstanceIdentifier']: 'writer' if member.get('IsClusterWriter') else 'reader'
+                for member in response['DBClusters'][0]['DBClusterMembers']
+            }
+
+            members = {}
+            paginator = self.rds_client.get_paginator('describe_db_instances')
+            for page in paginator.paginate(Filters=[{'Name': 'db-cluster-id', 'Values': [cluster_name]}]):
+                for instance in page['DBInstances']:
+                    instance_id = instance['DBInstanceIdentifier']
+                    members[instance_id] = {
+                        "instance_class": instance['DBInstanceClass'],
+                        "role": roles.get(instance_id, 'reader'),
+                        "status": instance.get('DBInstanceStatus')
+                    }
+
+            return members
+
         except ClientError as e:
-            logger.error(f"aws db -- 查询RDS集群实例类型时出错: {str(e)}")
+            logger.error(f"aws db -- 查询RDS集群成员时出错: {str(e)}")
             return {}
         except Exception as e:
             logger.error(f"aws db -- 发生未预期的错误: {str(e)}")
             return {}
+
+    def get_rds_cluster_instance_type(self, cluster_name):
+        """
+        查询RDS集群的实例类型信息
+        
+        Args:
+            cluster_name (str): RDS集群名称
+            
+        Returns:
+            dict: 包含实例ID和对应实例类型的字典，失败则返回空字典
+        """
+        members = self.describe_rds_cluster_members(cluster_name)
+        return {instance_id: member["instance_class"] for instance_id, member in members.items()}
     
     def upgrade_rds_cluster_instance_type(self, cluster_name, new_instance_type):
         """
@@ -3,6 +3,9 @@ import boto3
 from botocore.exceptions import ClientError
 import sys
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from lib.logger import app_logger as logger
 
@@ -12,7 +15,8 @@ class EKSManager:
     AWS EKS集群管理工具类，用于管理EKS集群的节点组配置
     """
 
-    def __init__(self, region_name, access_key_id, secret_access_key, cluster_name):
+    def __init__(self, region_name, access_key_id, secret_access_key, cluster_name, session=None, client_config=None,
+                 describe_concurrency=8, inventory_ttl=15):
         """
         初始化EKS管理器
 
@@ -21,14 +25,27 @@ class EKSManager:
             access_key_id (str): AWS访问密钥ID
             secret_access_key (str): AWS秘密访问密钥
             cluster_name (str): EKS集群名称
+            session (boto3.Session): 共享的boto3会话，为None时单独创建客户端
+            client_config (botocore.config.Config): 连接池和重试配置
+            describe_concurrency (int): 并发describe节点组的最大线程数
+            inventory_ttl (int): 节点组清单缓存时间(秒)，0表示不缓存
         """
         logger.info(f"aws eks -- 初始化EKS管理器，连接到集群: {cluster_name} 区域: {region_name}")
         try:
-            self.client = boto3.client('eks',
-                                       region_name=region_name,
-                                       aws_access_key_id=access_key_id,
-                                       aws_secret_access_key=secret_access_key)
+            if session is not None:
+                self.client = session.client('eks', config=client_config)
+            else:
+                self.client = boto3.client('eks',
+                                           region_name=region_name,
+                                           aws_access_key_id=access_key_id,
+                                           aws_secret_access_key=secret_access_key,
+                                           config=client_config)
             self.cluster_name = cluster_name
+            self.describe_concurrency = max(1, describe_concurrency)
+            self.inventory_ttl = inventory_ttl
+            # 节点组名称 -> (获取时间, describe_nodegroup 返回的 nodegroup)
+            self._nodegroup_cache = {}
+            self._cache_lock = threading.Lock()
             self._validate_cluster()
         except ClientError as e:
             logger.error(f"aws eks -- 初始化EKS客户端失败: {str(e)}")
@@ -76,6 +93,7 @@ class EKSManager:
                 }
             )
 
+            self.invalidate_nodegroup_cache(nodegroup)
             status_code = response['ResponseMetadata']['HTTPStatusCode']
             if status_code == 200:
                 logger.info(f"aws eks -- 成功提交节点组 {nodegroup} 伸缩配置更新请求")
@@ -130,15 +148,17 @@ class EKSManager:
 
     def list_nodegroups(self):
         """
-        列出EKS集群中所有节点组的名称
+        列出EKS集群中所有节点组的名称(自动翻页)
 
         Returns:
             list: 节点组名称列表
         """
         logger.info(f"aws eks -- 获取集群 {self.cluster_name} 的所有节点组")
         try:
-            response = self.client.list_nodegroups(clusterName=self.cluster_name)
-            nodegroups = response.get('nodegroups', [])
+            nodegroups = []
+            paginator = self.client.get_paginator('list_nodegroups')
+            for page in paginator.paginate(clusterName=self.cluster_name):
+                nodegroups.extend(page.get('nodegroups', []))
             logger.info(f"aws eks -- 找到 {len(nodegroups)} 个节点组")
             logger.debug(f"aws eks -- 节点组列表: {nodegroups}")
             return nodegroups
@@ -146,6 +166,93 @@ class EKSManager:
             logger.error(f"aws eks -- 获取节点组列表失败: {str(e)}")
             return []
 
+    def invalidate_nodegroup_cache(self, nodegroup_name=None):
+        """清除节点组缓存，nodegroup_name 为None时清除全部"""
+        with self._cache_lock:
+            if nodegroup_name is None:
+                self._nodegroup_cache.clear()
+            else:
+                self._nodegroup_cache.pop(nodegroup_name, None)
+
+    def _describe_nodegroup_cached(self, nodegroup_name, force=False):
+        """describe单个节点组，缓存未过期时直接返回缓存"""
+        now = time.time()
+        if not force and self.inventory_ttl > 0:
+            with self._cache_lock:
+                cached = self._nodegroup_cache.get(nodegroup_name)
+            if cached and now - cached[0] < self.inventory_ttl:
+                return cached[1]
+
+        response = self.client.describe_nodegroup(
+            clusterName=self.cluster_name,
+            nodegroupName=nodegroup_name
+        )
+        nodegroup = response.get('nodegroup')
+        if nodegroup is not None and self.inventory_ttl > 0:
+            with self._cache_lock:
+                self._nodegroup_cache[nodegroup_name] = (time.time(), nodegroup)
+        return nodegroup
+
+    def describe_nodegroups(self, nodegroup_names=None, force=False):
+        """
+        并发describe节点组，单个节点组失败不影响其他节点组
+
+        Args:
+            nodegroup_names (list): 节点组名称列表，为None时列出集群所有节点组
+            force (bool): 为True时忽略缓存
+
+        Returns:
+            dict: {节点组名称: describe_nodegroup 返回的 nodegroup}
+        """
+        if nodegroup_names is None:
+            nodegroup_names = self.list_nodegroups()
+        if not nodegroup_names:
+            return {}
+
+        def describe(nodegroup_name):
+            try:
+                return nodegroup_name, self._describe_nodegroup_cached(nodegroup_name, force=force)
+            except ClientError as e:
+                logger.error(f"aws eks -- 获取节点组 {nodegroup_name} 详细信息失败: {str(e)}")
+                return nodegroup_name, None
+
+        workers = min(self.describe_concurrency, len(nodegroup_names))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eks-describe") as executor:
+            results = executor.map(describe, nodegroup_names)
+        return {name: nodegroup for name, nodegroup in results if nodegroup is not None}
+
+    def get_nodegroup_inventory(self, force=False):
+        """
+        获取所有节点组的伸缩配置、状态和标签
+
+        Args:
+            force (bool): 为True时忽略缓存
+
+        Returns:
+            dict: {节点组名称: {"desired_size", "min_size", "max_size", "status", "labels"}}
+        """
+        inventory = {}
+        for name, nodegroup in self.describe_nodegroups(force=force).items():
+            scaling_config = nodegroup.get('scalingConfig', {})
+            inventory[name] = {
+                "desired_size": scaling_config.get('desiredSize'),
+                "min_size": scaling_config.get('minSize'),
+                "max_size": scaling_config.get('maxSize'),
+                "status": nodegroup.get('status'),
+                "labels": nodegroup.get('labels', {})
+            }
+        logger.info(f"aws eks -- 已获取 {len(inventory)} 个节点组的清单")
+        return inventory
+
+    def get_nodegroup_desired_sizes(self, force=False):
+        """
+        获取所有节点组的期望节点数量
+
+        Returns:
+            dict: {节点组名称: 期望节点数量}
+        """
+        return {name: info["desired_size"] for name, info in self.get_nodegroup_inventory(force=force).items()}
+
     def get_nodegroup_status(self, nodegroup_name):
         """
         获取节点组的状态
@@ -179,36 +286,15 @@ class EKSManager:
             dict: 节点组信息字典，键为节点组名称
         """
         logger.info(f"aws eks -- 获取集群 {self.cluster_name} 所有节点组的详细信息")
-        result = {}
-        nodegroups = self.list_nodegroups()
-
-        for nodegroup in nodegroups:
-            try:
-                response = self.client.describe_nodegroup(
-                    clusterName=self.cluster_name,
-                    nodegroupName=nodegroup
-                )
-                if 'nodegroup' in response:
-                    result[nodegroup] = response['nodegroup']
-                    logger.debug(f"aws eks -- 已获取节点组 {nodegroup} 的详细信息")
-            except ClientError as e:
-                logger.error(f"aws eks -- 获取节点组 {nodegroup} 详细信息失败: {str(e)}")
-
+        result = self.describe_nodegroups()
         logger.info(f"aws eks -- 成功获取 {len(result)} 个节点组的详细信息")
         return result
 
-
 if __name__ == '__main__':
     from conf import settings
     eks_manager = EKSManager(settings.AWS_REGION, settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY, settings.EKS_CLUSTER_NAME)
 
-    nodegroups = eks_manager.list_nodegroups()
-
-    node_info = {}
-
-    for nodegroup_name in nodegroups:
-        desired_size = eks_manager.get_nodegroup_desired_size(nodegroup_name)
-        node_info[nodegroup_name] = desired_size
+    node_info = eks_manager.get_nodegroup_desired_sizes()
 
     print(node_info)
 
@@ -0,0 +1,297 @@
+# 容量级别配置的进程内只读快照
+import sys
+import os
+import time
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from types import MappingProxyType
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+# 级别条目，提供与 CapacityLevel 模型相同的 id / user_capacity 属性
+LevelEntry = namedtuple("LevelEntry", ["id", "user_capacity"])
+ServiceEntry = namedtuple("ServiceEntry", ["namespace", "service_name", "replicas", "hpa_name", "pool_name"])
+RedisEntry = namedtuple("RedisEntry", ["instance_type", "memory_gb", "bandwidth_gb"])
+PostgresEntry = namedtuple("PostgresEntry", ["instance_type", "cpu", "memory_gb"])
+
+
+class CapacityMatrix:
+    """
+    容量级别矩阵的不可变快照
+
+    一次性加载 CapacityLevel / ServiceConfig / RedisConfig / PostgresConfig，
+    按容量排序后用二分查找定位级别，并建立实例类型到级别的反向索引，
+    热路径上的查询不再访问数据库
+    """
+
+    def __init__(self, levels):
+        """
+        根据级别数据构建快照
+
+        Args:
+            levels (list): 级别字典列表，每项格式为
+                {"id", "user_capacity", "services": [{namespace, service_name, replicas, hpa_name, pool_name}],
+                 "redis": {instance_type, memory_gb, bandwidth_gb} | None,
+                 "postgres": {instance_type, cpu, memory_gb} | None}
+        """
+        levels = sorted(levels, key=lambda item: item["user_capacity"])
+
+        self.loaded_at = time.time()
+        self.levels = tuple(LevelEntry(item["id"], item["user_capacity"]) for item in levels)
+        self.capacities = tuple(level.user_capacity for level in self.levels)
+
+        services = {}
+        redis = {}
+        postgres = {}
+        # (namespace, service_name) -> {replicas: (级别容量, ...)}
+        replicas_index = {}
+        for item in levels:
+            capacity = item["user_capacity"]
+            entries = tuple(
+                ServiceEntry(svc["namespace"], svc["service_name"], svc["replicas"], svc["hpa_name"], svc["pool_name"])
+                for svc in item.get("services") or []
+            )
+            services[capacity] = entries
+            for entry in entries:
+                by_replicas = replicas_index.setdefault((entry.namespace, entry.service_name), {})
+                by_replicas.setdefault(entry.replicas, []).append(capacity)
+            if item.get("redis"):
+                redis[capacity] = RedisEntry(**item["redis"])
+            if item.get("postgres"):
+                postgres[capacity] = PostgresEntry(**item["postgres"])
+
+        self.services = MappingProxyType(services)
+        self.redis = MappingProxyType(redis)
+        self.postgres = MappingProxyType(postgres)
+        self._replicas_index = MappingProxyType({
+            key: MappingProxyType({replicas: tuple(caps) for replicas, caps in value.items()})
+            for key, value in replicas_index.items()
+        })
+
+        # 实例类型 -> 该类型能支撑的最高容量级别
+        self.redis_type_levels = MappingProxyType(self._type_levels(redis))
+        self.postgres_type_levels = MappingProxyType(self._type_levels(postgres))
+
+    @staticmethod
+    def _type_levels(configs):
+        type_levels = {}
+        for capacity, entry in configs.items():
+            if entry.instance_type:
+                type_levels[entry.instance_type] = max(capacity, type_levels.get(entry.instance_type, capacity))
+        return type_levels
+
+    @classmethod
+    def load(cls, database=None):
+        """
+        从MySQL加载完整的容量矩阵，每张表只查询一次
+
+        Args:
+            database (MySQLDatabase): 集群单独使用的数据库，为None时使用 lib.models.db
+        """
+        from lib.models import CapacityLevel, ServiceConfig, RedisConfig, PostgresConfig
+
+        levels = {}
+        for level in CapacityLevel.select().bind(database):
+            levels[level.id] = {
+                "id": level.id,
+                "user_capacity": level.user_capacity,
+                "services": [],
+                "redis": None,
+                "postgres": None
+            }
+        for service in ServiceConfig.select().bind(database):
+            level = levels.get(service.capacity_level_id)
+            if level is not None:
+                level["services"].append({
+                    "namespace": service.namespace,
+                    "service_name": service.service_name,
+                    "replicas": service.replicas,
+                    "hpa_name": service.hpa_name,
+                    "pool_name": service.pool_name
+                })
+        for redis in RedisConfig.select().bind(database):
+            level = levels.get(redis.capacity_level_id)
+            if level is not None:
+                level["redis"] = {
+                    "instance_type": redis.instance_type,
+                    "memory_gb": redis.memory_gb,
+                    "bandwidth_gb": redis.bandwidth_gb
+                }
+        for postgres in PostgresConfig.select().bind(database):
+            level = levels.get(postgres.capacity_level_id)
+            if level is not None:
+                level["postgres"] = {
+                    "instance_type": postgres.instance_type,
+                    "cpu": postgres.cpu,
+                    "memory_gb": postgres.memory_gb
+                }
+
+        matrix = cls(list(levels.values()))
+        logger.info(f"capacity matrix -- 已加载 {len(matrix.levels)} 个容量级别")
+        return matrix
+
+    def to_levels(self):
+        """导出为构造函数接受的级别字典列表"""
+        return [
+            {
+                "id": level.id,
+                "user_capacity": level.user_capacity,
+                "services": [entry._asdict() for entry in self.services.get(level.user_capacity, ())],
+                "redis": self.redis[level.user_capacity]._asdict() if level.user_capacity in self.redis else None,
+                "postgres": self.postgres[level.user_capacity]._asdict() if level.user_capacity in self.postgres else None
+            }
+            for level in self.levels
+        ]
+
+    def get_target_level(self, user_count):
+        """
+        查找最接近但不小于指定用户数的级别
+
+        Returns:
+            LevelEntry|None: 级别条目，超过最高级别返回None
+        """
+        index = bisect_left(self.capacities, user_count)
+        if index >= len(self.levels):
+            return None
+        return self.levels[index]
+
+    def get_next_level(self, user_capacity):
+        """返回比指定容量级别高一级的级别，没有则返回None"""
+        index = bisect_left(self.capacities, user_capacity + 1)
+        if index >= len(self.levels):
+            return None
+        return self.levels[index]
+
+    def get_complete_config(self, user_count):
+        """
+        获取指定用户数对应级别的完整配置
+
+        Returns:
+            dict|None: {"capacity_level", "services": {namespace: {service_name: {...}}}, "redis", "postgres"}
+        """
+        level = self.get_target_level(user_count)
+        if not level:
+            logger.error(f"capacity matrix -- 未找到满足用户容量 {user_count} 的配置级别")
+            return None
+
+        services = {}
+        for entry in self.services.get(level.user_capacity, ()):
+            services.setdefault(entry.namespace, {})[entry.service_name] = {
+                "replicas": entry.replicas,
+                "hpa_name": entry.hpa_name,
+                "pool_name": entry.pool_name
+            }
+
+        redis = self.redis.get(level.user_capacity)
+        postgres = self.postgres.get(level.user_capacity)
+        return {
+            "capacity_level": level._asdict(),
+            "services": services,
+            "redis": dict(redis._asdict(), level=self.redis_type_levels.get(redis.instance_type)) if redis else None,
+            "postgres": dict(postgres._asdict(), level=self.postgres_type_levels.get(postgres.instance_type)) if postgres else None
+        }
+
+    def get_user_capacity_by_redis_instance_type(self, instance_type):
+        """Redis实例类型能支撑的最高容量级别，未配置返回None"""
+        return self.redis_type_levels.get(instance_type)
+
+    def get_user_capacity_by_postgres_instance_type(self, instance_type):
+        """Postgres实例类型能支撑的最高容量级别，未配置返回None"""
+        return self.postgres_type_levels.get(instance_type)
+
+    def determine_capacity_level(self, namespace, service_name, replicas,
+                                 redis_instance_type=None, postgres_instance_type=None):
+        """
+        根据参考服务的副本数以及DB类型判断当前所处的级别
+
+        副本数相同的级别有多个时，优先选择Redis/Postgres类型也一致的级别；
+        没有副本数完全相同的级别时，返回副本数不超过当前值的最高级别
+
+        Returns:
+            LevelEntry|None: 级别条目
+        """
+        by_replicas = self._replicas_index.get((namespace, service_name), {})
+        candidates = by_replicas.get(replicas)
+        if candidates:
+            for capacity in candidates:
+                redis = self.redis.get(capacity)
+                postgres = self.postgres.get(capacity)
+                if ((redis and redis.instance_type == redis_instance_type) and
+                        (postgres and postgres.instance_type == postgres_instance_type)):
+                    return self.get_target_level(capacity)
+            return self.get_target_level(candidates[0])
+
+        lower = [caps[-1] for value, caps in by_replicas.items() if replicas is not None and value <= replicas]
+        if lower:
+            return self.get_target_level(max(lower))
+        return None
+
+    def namespaces(self):
+        """容量配置中涉及的所有命名空间"""
+        return sorted({entry.namespace for entries in self.services.values() for entry in entries})
+
+
+# 矩阵键 -> 快照，默认配置的键为None，多集群模式下每个集群使用集群名称
+_matrices = {}
+# 矩阵键 -> 加载使用的数据库，None表示 lib.models.db
+_databases = {}
+_matrix_lock = threading.Lock()
+
+
+def get_capacity_matrix(key=None, database=None):
+    """
+    获取当前的容量矩阵快照，首次使用时从数据库加载
+
+    Args:
+        key (str): 矩阵键，每个集群的快照相互独立
+        database (MySQLDatabase): 首次加载时使用的数据库，为None时使用 lib.models.db
+    """
+    matrix = _matrices.get(key)
+    if matrix is None:
+        with _matrix_lock:
+            if key not in _matrices:
+                _databases[key] = database
+                _matrices[key] = CapacityMatrix.load(database)
+            matrix = _matrices[key]
+    return matrix
+
+
+def reload_capacity_matrix(key=None):
+    """
+    重新加载容量矩阵，加载完成后整体替换旧快照
+
+    Args:
+        key (str): 只重新加载该矩阵；为None时重新加载默认矩阵以及所有使用默认数据库的集群矩阵
+
+    Returns:
+        CapacityMatrix: 重新加载的矩阵(key为None时为默认矩阵)
+    """
+    if key is not None:
+        keys = [key]
+    else:
+        keys = [None] + [name for name, database in list(_databases.items()) if name is not None and database is None]
+
+    reloaded = {name: CapacityMatrix.load(_databases.get(name)) for name in keys}
+    with _matrix_lock:
+        for name, matrix in reloaded.items():
+            _matrices[name] = matrix
+            _databases.setdefault(name, None)
+    return reloaded[keys[0]]
+
+
+def reload_loaded_capacity_matrices():
+    """
+    重新加载所有已经加载过的容量矩阵(每个使用各自的数据库)
+
+    Returns:
+        list: 重新加载的矩阵键
+    """
+    with _matrix_lock:
+        keys = list(_matrices)
+    for key in keys:
+        reload_capacity_matrix(key)
+    if keys:
+        logger.info(f"capacity matrix -- 已重新加载容量矩阵 {keys}")
+    return keys
@@ -0,0 +1,487 @@
+# GA、AWS、Kubernetes 外部调用的录制与回放(JSONL)
+import sys
+import os
+import json
+import time
+import threading
+from collections import Counter, deque
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# 回放时的延迟: original 按录制时的耗时等待，none 立即返回
+LATENCY_ORIGINAL = "original"
+LATENCY_NONE = "none"
+
+CASSETTE_VERSION = 1
+
+
+def _encode_default(value):
+    """JSON不支持的类型: datetime、kubernetes 模型对象"""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _decode_hook(value):
+    if len(value) == 1 and "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+def _dumps(value):
+    return json.dumps(value, default=_encode_default, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def _normalize(value):
+    """转换为与JSONL中相同的表示，录制和回放用同样的方式计算请求键"""
+    return json.loads(_dumps(value))
+
+
+def request_key(source, operation, args, kwargs):
+    return _dumps([source, operation, _normalize(list(args)), _normalize(kwargs)])
+
+
+_api_client = None
+
+
+def _k8s_api_client():
+    """只用于模型对象的序列化和反序列化，不发起请求"""
+    global _api_client
+    if _api_client is None:
+        from kubernetes import client
+        _api_client = client.ApiClient()
+    return _api_client
+
+
+def _serialize_response(value):
+    """返回 (JSON值, kubernetes 模型类型名或None)"""
+    if hasattr(value, "openapi_types"):
+        return _k8s_api_client().sanitize_for_serialization(value), type(value).__name__
+    return _normalize(value), None
+
+
+def _deserialize_response(value, model_type):
+    if model_type is None:
+        return value
+    # ApiClient.deserialize 的参数在不同版本的 kubernetes 客户端中不一致，直接使用内部的按类型名转换
+    return _k8s_api_client()._ApiClient__deserialize(value, model_type)
+
+
+def _serialize_error(error):
+    from botocore.exceptions import ClientError
+    from kubernetes.client.rest import ApiException
+
+    if isinstance(error, ClientError):
+        return {"kind": "boto", "response": _normalize(error.response), "operation": error.operation_name}
+    if isinstance(error, ApiException):
+        return {"kind": "k8s", "status": error.status, "reason": error.reason, "body": error.body}
+    return {"kind": "other", "type": type(error).__name__, "message": str(error)}
+
+
+def _deserialize_error(error):
+    if error["kind"] == "boto":
+        from botocore.exceptions import ClientError
+        return ClientError(error["response"], error["operation"])
+    if error["kind"] == "k8s":
+        from kubernetes.client.rest import ApiException
+        exception = ApiException(status=error["status"], reason=error["reason"])
+        exception.body = error["body"]
+        return exception
+    return CassetteReplayError(f"{error['type']}: {error['message']}")
+
+
+class CassetteReplayError(Exception):
+    """回放录制时失败的非AWS/Kubernetes调用(例如GA)"""
+
+
+class CassetteMiss(LookupError):
+    """回放时录像中没有对应的请求"""
+
+    def __init__(self, source, operation, args, kwargs):
+        self.source = source
+        self.operation = operation
+        super().__init__(f"录像中没有 {source}.{operation} 请求: args={_normalize(list(args))} kwargs={_normalize(kwargs)}")
+
+
+class CassetteRecorder:
+    """
+    录制外部调用
+
+    每次调用追加一行JSON: 来源、操作、参数、耗时和响应(或错误)；kubernetes 模型对象按API格式序列化，
+    回放时还原为同样的模型类型。文件以追加方式打开，每次启动先写入一行 header
+    """
+
+    def __init__(self, path, cluster=None):
+        self.path = path
+        self.cluster = cluster
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._write({"type": "header", "version": CASSETTE_VERSION, "cluster": cluster, "created_at": time.time()})
+        logger.info(f"cassette -- 开始录制外部调用到 {path}")
+
+    def _write(self, record):
+        line = _dumps(record)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record_matrix(self, matrix):
+        """录制容量矩阵，回放时不需要访问MySQL"""
+        self._write({"type": "matrix", "levels": matrix.to_levels()})
+
+    def call(self, source, operation, func, args, kwargs):
+        """执行一次调用并录制"""
+        started_at = time.time()
+        start = time.perf_counter()
+        record = {
+            "type": "call",
+            "ts": started_at,
+            "source": source,
+            "op": operation,
+            "args": _normalize(list(args)),
+            "kwargs": _normalize(kwargs)
+        }
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            record["error"] = _serialize_error(e)
+            self._save(record)
+            raise
+        record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        record["response"], model_type = _serialize_response(result)
+        if model_type:
+            record["model"] = model_type
+        self._save(record)
+        return result
+
+    def record_pages(self, source, operation, pages_iter, kwargs):
+        """录制分页调用，每一页单独计时，整个 paginate 作为一条记录"""
+        record = {"type": "call", "ts": time.time(), "source": source, "op": f"paginate:{operation}",
+                  "args": [], "kwargs": _normalize(kwargs), "pages": [], "page_ms": []}
+        start = time.perf_counter()
+        try:
+            for page in pages_iter:
+                record["pages"].append(_normalize(page))
+                record["page_ms"].append(round((time.perf_counter() - start) * 1000, 3))
+                yield page
+                start = time.perf_counter()
+        except Exception as e:
+            record["error"] = _serialize_error(e)
+            raise
+        finally:
+            record["ms"] = round(sum(record["page_ms"]), 3)
+            self._save(record)
+
+    def _save(self, record):
+        with self._lock:
+            self.calls[(record["source"], record["op"])] += 1
+        self._write(record)
+
+    def stats(self):
+        with self._lock:
+            calls = dict(self.calls)
+        return {
+            "mode": MODE_RECORD,
+            "path": self.path,
+            "calls": {f"{source}.{operation}": count for (source, operation), count in sorted(calls.items())}
+        }
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class CassettePlayer:
+    """
+    回放录制的外部调用
+
+    请求按 (来源, 操作, 参数) 匹配，同一个请求录制了多次时按录制顺序依次返回，用完后重复最后一次的响应；
+    录像中没有的请求抛出 CassetteMiss。latency 为 original 时按录制的耗时等待后返回
+    """
+
+    def __init__(self, path, latency=LATENCY_ORIGINAL):
+        if latency not in (LATENCY_ORIGINAL, LATENCY_NONE):
+            raise ValueError(f"不支持的 cassette_replay_latency: {latency}")
+        self.path = path
+        self.latency = latency
+        self.matrix_levels = None
+        self._queues = {}
+        self._last = {}
+        self.calls = Counter()
+        self.repeats = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line, object_hook=_decode_hook)
+                if record["type"] == "matrix":
+                    self.matrix_levels = record["levels"]
+                elif record["type"] == "call":
+                    key = request_key(record["source"], record["op"], record["args"], record["kwargs"])
+                    self._queues.setdefault(key, deque()).append(record)
+                    count += 1
+        logger.info(f"cassette -- 已加载录像 {path}，{count} 次调用，{len(self._queues)} 种请求")
+
+    def _next(self, source, operation, args, kwargs):
+        key = request_key(source, operation, args, kwargs)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                record = queue.popleft()
+                self._last[key] = record
+            elif key in self._last:
+                record = self._last[key]
+                self.repeats += 1
+            else:
+                self.misses += 1
+                raise CassetteMiss(source, operation, args, kwargs)
+            self.calls[(source, operation)] += 1
+        return record
+
+    def _wait(self, ms):
+        if self.latency == LATENCY_ORIGINAL and ms:
+            time.sleep(ms / 1000)
+
+    def call(self, source, operation, args, kwargs):
+        """返回录制的响应或抛出录制的错误"""
+        record = self._next(source, operation, args, kwargs)
+        self._wait(record.get("ms"))
+        if "error" in record:
+            raise _deserialize_error(record["error"])
+        return _deserialize_response(record["response"], record.get("model"))
+
+    def pages(self, source, operation, kwargs):
+        record = self._next(source, f"paginate:{operation}", (), kwargs)
+        for page, ms in zip(record["pages"], record["page_ms"]):
+            self._wait(ms)
+            yield page
+        if "error" in record:
+            raise _deserialize_error(record["error"])
+
+    def matrix(self):
+        """录制的容量矩阵，录像中没有时返回None"""
+        if self.matrix_levels is None:
+            return None
+        from lib.capacity_matrix import CapacityMatrix
+        return CapacityMatrix(self.matrix_levels)
+
+    def stats(self):
+        with self._lock:
+            calls = dict(self.calls)
+            remaining = sum(len(queue) for queue in self._queues.values())
+            return {
+                "mode": MODE_REPLAY,
+                "path": self.path,
+                "latency": self.latency,
+                "calls": {f"{source}.{operation}": count for (source, operation), count in sorted(calls.items())},
+                "repeats": self.repeats,
+                "misses": self.misses,
+                "remaining": remaining
+            }
+
+    def close(self):
+        pass
+
+
+class _RecordingPaginator:
+    def __init__(self, paginator, source, operation, recorder):
+        self._paginator = paginator
+        self._source = source
+        self._operation = operation
+        self._recorder = recorder
+
+    def paginate(self, **kwargs):
+        return self._recorder.record_pages(self._source, self._operation, self._paginator.paginate(**kwargs), kwargs)
+
+
+class RecordingProxy:
+    """
+    包装 boto3 客户端或 kubernetes API 对象，录制所有API调用
+
+    boto3 客户端只录制 meta.method_to_api_mapping 中的操作，分页器按整个 paginate 录制
+    """
+
+    def __init__(self, target, source, recorder):
+        self._target = target
+        self._source = source
+        self._recorder = recorder
+        meta = getattr(target, "meta", None)
+        self._operations = set(meta.method_to_api_mapping) if hasattr(meta, "method_to_api_mapping") else None
+
+    def get_paginator(self, operation):
+        return _RecordingPaginator(self._target.get_paginator(operation), self._source, operation, self._recorder)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+        if self._operations is not None and name not in self._operations:
+            return attribute
+
+        def call(*args, **kwargs):
+            return self._recorder.call(self._source, name, attribute, args, kwargs)
+        return call
+
+
+class _ReplayPaginator:
+    def __init__(self, player, source, operation):
+        self._player = player
+        self._source = source
+        self._operation = operation
+
+    def paginate(self, **kwargs):
+        return self._player.pages(self._source, self._operation, kwargs)
+
+
+class ReplayProxy:
+    """与 RecordingProxy 对应的回放对象，任意方法调用都从录像返回"""
+
+    def __init__(self, source, player):
+        self._source = source
+        self._player = player
+
+    def get_paginator(self, operation):
+        return _ReplayPaginator(self._player, self._source, operation)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self._player.call(self._source, name, args, kwargs)
+        return call
+
+
+class RecordingSession:
+    """包装 boto3.Session，创建的客户端都录制调用"""
+
+    def __init__(self, session, recorder):
+        self._session = session
+        self._recorder = recorder
+
+    def client(self, service_name, *args, **kwargs):
+        return RecordingProxy(self._session.client(service_name, *args, **kwargs), service_name, self._recorder)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class ReplaySession:
+    """替代 boto3.Session，创建回放客户端"""
+
+    def __init__(self, player):
+        self._player = player
+
+    def client(self, service_name, *args, **kwargs):
+        return ReplayProxy(service_name, self._player)
+
+
+# K8sClient 使用的API对象
+K8S_API_ATTRIBUTES = ("apps_api", "core_api", "autoscaling_api")
+
+
+def record_k8s_client(k8s_client, recorder):
+    """K8sClient 的API对象替换为录制代理"""
+    for attribute in K8S_API_ATTRIBUTES:
+        setattr(k8s_client, attribute, RecordingProxy(getattr(k8s_client, attribute), "k8s", recorder))
+    return k8s_client
+
+
+def create_replay_k8s_client(player):
+    """不连接apiserver的 K8sClient，API调用都从录像返回"""
+    from lib.k8s_client import K8sClient
+
+    k8s_client = K8sClient.__new__(K8sClient)
+    k8s_client.kube_config_path = player.path
+    k8s_client.context_name = None
+    k8s_client.api_client = _k8s_api_client()
+    for attribute in K8S_API_ATTRIBUTES:
+        setattr(k8s_client, attribute, ReplayProxy("k8s", player))
+    k8s_client.informer = None
+    return k8s_client
+
+
+class RecordingUserSource:
+    """包装 ActiveUserSource，录制在线人数和配额"""
+
+    def __init__(self, source, recorder):
+        self._source = source
+        self._recorder = recorder
+
+    def get_active_users(self):
+        def fetch():
+            return {"value": self._source.get_active_users(), "quota": self._source.last_quota}
+        return self._recorder.call("ga", "run_realtime_report", fetch, (), {})["value"]
+
+    def __getattr__(self, name):
+        return getattr(self._source, name)
+
+
+class ReplayUserSource:
+    """替代 ActiveUserSource，从录像返回在线人数"""
+
+    def __init__(self, player):
+        self._player = player
+        self.last_quota = {}
+        self.fetch_count = 0
+        self.error_count = 0
+
+    def get_active_users(self):
+        self.fetch_count += 1
+        try:
+            response = self._player.call("ga", "run_realtime_report", (), {})
+        except Exception:
+            self.error_count += 1
+            raise
+        self.last_quota = response["quota"]
+        return response["value"]
+
+    def stats(self):
+        return {"fetch_count": self.fetch_count, "error_count": self.error_count, "quota": self.last_quota}
+
+    def close(self):
+        pass
+
+
+class ReplayFeishuBot:
+    """回放时不发送飞书通知，只记录日志"""
+
+    def send_rich_text(self, title, content):
+        logger.info(f"cassette -- 回放模式不发送通知: {title}")
+        return {"code": 0}
+
+
+def create_cassette(conf):
+    """
+    根据 cassette_mode 创建录制或回放
+
+    Returns:
+        CassetteRecorder|CassettePlayer|None: off 时为None
+    """
+    mode = conf.CASSETTE_MODE
+    if mode == MODE_OFF:
+        return None
+    if mode == MODE_RECORD:
+        return CassetteRecorder(conf.CASSETTE_FILE, cluster=getattr(conf, "CLUSTER_NAME", None))
+    if mode == MODE_REPLAY:
+        return CassettePlayer(conf.CASSETTE_FILE, latency=conf.CASSETTE_REPLAY_LATENCY)
+    raise ValueError(f"不支持的 cassette_mode: {mode}")
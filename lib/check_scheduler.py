@@ -0,0 +1,307 @@
+# 伸缩检查调度：固定间隔或按距离级别边界自适应调整间隔
+import sys
+import os
+import time
+import threading
+from datetime import datetime, timezone
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+from apscheduler.jobstores.base import JobLookupError
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.leader_election import is_leader
+from lib.profiler import get_cycle_profiler
+from lib.metrics import SCHEDULER_LAG_SECONDS, SCHEDULER_SKIPPED, cluster_label
+
+
+MODE_FIXED = "fixed"
+MODE_ADAPTIVE = "adaptive"
+JOB_ID = "autoscaling_job"
+
+
+class AdaptiveInterval:
+    """
+    自适应检查间隔
+
+    在线人数接近当前级别的上限(下一个级别边界)或增长较快时缩短间隔，
+    远离边界且没有增长时拉长间隔，结果限制在 [floor, ceiling] 之间
+    """
+
+    def __init__(self, base, floor=60, ceiling=900, near_ratio=0.15, quiet_ratio=0.5):
+        """
+        初始化
+
+        Args:
+            base (int): 默认间隔(秒)
+            floor (int): 最短间隔(秒)
+            ceiling (int): 最长间隔(秒)
+            near_ratio (float): 剩余空间低于级别容量的该比例时开始缩短间隔
+            quiet_ratio (float): 剩余空间高于该比例且没有增长时使用最长间隔
+        """
+        self.base = base
+        self.floor = floor
+        self.ceiling = ceiling
+        self.near_ratio = near_ratio
+        self.quiet_ratio = quiet_ratio
+
+    def compute(self, user_count, trend_per_minute, boundary):
+        """
+        计算下一次检查间隔
+
+        Args:
+            user_count (int): 平滑后的在线人数
+            trend_per_minute (float): 每分钟增长人数
+            boundary (int): 当前所处级别的容量上限，超过即需要升级，为None表示已是最高级别
+
+        Returns:
+            tuple: (间隔秒数, 原因)
+        """
+        if user_count is None or not boundary:
+            return self._clamp(self.base), "没有有效读数或已是最高级别，使用默认间隔"
+
+        headroom = max(0, boundary - user_count)
+        ratio = headroom / boundary
+        trend = trend_per_minute or 0
+        interval = self.base
+        reason = f"距离级别边界 {boundary} 还有 {headroom} 人({ratio:.0%})，使用默认间隔"
+
+        if ratio <= self.near_ratio:
+            interval = self.floor + (self.base - self.floor) * ratio / self.near_ratio
+            reason = f"接近级别边界 {boundary}，剩余 {headroom} 人({ratio:.0%})"
+        elif ratio >= self.quiet_ratio and trend <= 0:
+            interval = self.ceiling
+            reason = f"远离级别边界 {boundary}(剩余 {ratio:.0%})且没有增长"
+
+        if trend > 0:
+            # 按当前增速越过边界之前至少再检查一次
+            seconds_to_cross = headroom / trend * 60
+            if seconds_to_cross / 2 < interval:
+                interval = seconds_to_cross / 2
+                reason = f"增速 {trend:.1f} 人/分钟，约 {seconds_to_cross / 60:.1f} 分钟后越过级别边界 {boundary}"
+
+        return self._clamp(interval), reason
+
+    def _clamp(self, interval):
+        return int(min(self.ceiling, max(self.floor, interval)))
+
+
+class CheckScheduler:
+    """
+    伸缩检查的后台调度器
+
+    记录每次执行相对计划时间的延迟、因上一次未结束被跳过或错过的次数，以及各阶段超出预算的次数；
+    检查间隔按服务的时钟计算，跟随模拟服务的虚拟时间时真实间隔按倍速缩短，倍速变化后在下一次检查时调整
+    """
+
+    def __init__(self, service, conf=None, scheduler=None):
+        """
+        初始化调度器
+
+        Args:
+            service (AutoScalingService): 自动伸缩服务
+            conf: 配置对象，默认使用服务的配置
+            scheduler (BackgroundScheduler): 多集群共用的调度器(已启动)，为None时单独创建
+        """
+        if conf is None:
+            conf = service.conf
+        self.service = service
+        self.clock = service.clock
+        self.name = service.cluster_name
+        # 共用调度器中每个集群的任务ID不同
+        self.job_id = f"{JOB_ID}:{self.name}" if self.name else JOB_ID
+        self._log_prefix = f"调度 [{self.name}]" if self.name else "调度"
+        self.mode = conf.CHECK_MODE
+        self.base_interval = conf.CHECK_TIME * 60
+        self.policy = AdaptiveInterval(
+            self.base_interval,
+            floor=conf.CHECK_INTERVAL_FLOOR,
+            ceiling=conf.CHECK_INTERVAL_CEILING,
+            near_ratio=conf.CHECK_NEAR_RATIO,
+            quiet_ratio=conf.CHECK_QUIET_RATIO
+        )
+        self.current_interval = self.base_interval
+        # 实际调度使用的真实间隔(秒)
+        self.wall_interval = self.clock.wall_seconds(self.current_interval)
+        self.reason = "固定间隔" if self.mode == MODE_FIXED else "尚未执行检查，使用默认间隔"
+        self.last_run_at = None
+        self._lock = threading.Lock()
+        self.metrics = {
+            "runs": 0,
+            "standby": 0,
+            "skipped": 0,
+            "missed": 0,
+            "deadline_exceeded": 0,
+            "last_lag_seconds": None,
+            "max_lag_seconds": 0.0,
+            "last_duration_seconds": None,
+            "max_duration_seconds": 0.0,
+            "stage_overruns": {},
+            "stage_deferred": {},
+            "last_cycle": None
+        }
+
+        self._owns_scheduler = scheduler is None
+        self.scheduler = create_background_scheduler() if scheduler is None else scheduler
+        self.scheduler.add_listener(self._on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+    def start(self):
+        """添加定时任务并启动，启动后立即执行一次"""
+        self.scheduler.add_job(self.run_check, 'interval', seconds=self.wall_interval, id=self.job_id)
+        self.scheduler.add_job(self.run_check, id=f"initial_check:{self.name}" if self.name else 'initial_check')
+        if self._owns_scheduler:
+            self.scheduler.start()
+        logger.info(f"{self._log_prefix} -- 自动伸缩服务已启动，调度模式 {self.mode}，检查间隔 {self.current_interval} 秒")
+
+    def shutdown(self):
+        """停止调度，共用调度器时只移除本集群的任务"""
+        if self._owns_scheduler:
+            self.scheduler.shutdown(wait=False)
+            return
+        self.scheduler.remove_listener(self._on_job_event)
+        try:
+            self.scheduler.remove_job(self.job_id)
+        except JobLookupError:
+            pass
+
+    def _on_job_event(self, event):
+        """记录调度延迟、跳过和错过的执行"""
+        if event.job_id != self.job_id:
+            return
+        with self._lock:
+            if event.code == EVENT_JOB_SUBMITTED:
+                scheduled = event.scheduled_run_times[-1]
+                lag = max(0.0, (datetime.now(timezone.utc) - scheduled).total_seconds())
+                self.metrics["last_lag_seconds"] = round(lag, 3)
+                self.metrics["max_lag_seconds"] = max(self.metrics["max_lag_seconds"], round(lag, 3))
+                SCHEDULER_LAG_SECONDS.set(round(lag, 3), cluster=cluster_label(self.name))
+            elif event.code == EVENT_JOB_MAX_INSTANCES:
+                self.metrics["skipped"] += 1
+                SCHEDULER_SKIPPED.inc(cluster=cluster_label(self.name), reason="max_instances")
+                logger.warning(f"{self._log_prefix} -- 上一次检查尚未结束，本次检查被跳过")
+            elif event.code == EVENT_JOB_MISSED:
+                self.metrics["missed"] += 1
+                SCHEDULER_SKIPPED.inc(cluster=cluster_label(self.name), reason="missed")
+                logger.warning(f"{self._log_prefix} -- 错过计划时间 {event.scheduled_run_time} 的检查")
+
+    def run_check(self):
+        """执行一次检查，自适应模式下根据本次结果调整下一次间隔；开启选举时只有主节点执行"""
+        if not is_leader():
+            with self._lock:
+                self.metrics["standby"] += 1
+            logger.debug(f"{self._log_prefix} -- 非主节点，跳过本次检查")
+            return
+        self.last_run_at = time.time()
+        start = time.monotonic()
+        try:
+            # 通过 /api/debug/profile/cycles 开启后在 cProfile 下执行
+            with get_cycle_profiler().profile():
+                self.service.check_and_scale()
+        finally:
+            self._record_cycle(time.monotonic() - start)
+        if self.mode == MODE_ADAPTIVE:
+            self._adjust_interval()
+        self._reschedule()
+
+    def _record_cycle(self, duration):
+        """记录本次检查的耗时和各阶段超出预算情况"""
+        report = self.service.last_cycle_report or {}
+        with self._lock:
+            metrics = self.metrics
+            metrics["runs"] += 1
+            metrics["last_duration_seconds"] = round(duration, 3)
+            metrics["max_duration_seconds"] = max(metrics["max_duration_seconds"], round(duration, 3))
+            if report.get("deadline_exceeded"):
+                metrics["deadline_exceeded"] += 1
+            for stage, info in report.get("stages", {}).items():
+                if info["overrun"]:
+                    metrics["stage_overruns"][stage] = metrics["stage_overruns"].get(stage, 0) + 1
+                if info["deferred"]:
+                    metrics["stage_deferred"][stage] = metrics["stage_deferred"].get(stage, 0) + 1
+            metrics["last_cycle"] = report
+
+    def _adjust_interval(self):
+        signal = self.service.last_signal
+        if not signal:
+            return
+        interval, reason = self.policy.compute(
+            signal["filtered_count"], signal["trend_per_minute"], signal["boundary"]
+        )
+        with self._lock:
+            self.reason = reason
+            if interval == self.current_interval:
+                return
+            logger.info(f"{self._log_prefix} -- 检查间隔 {self.current_interval} 秒 -> {interval} 秒: {reason}")
+            self.current_interval = interval
+
+    def _reschedule(self):
+        """检查间隔或时钟倍速变化后按新的真实间隔重新调度"""
+        with self._lock:
+            wall_interval = self.clock.wall_seconds(self.current_interval)
+            if wall_interval == self.wall_interval:
+                return
+            self.wall_interval = wall_interval
+        self.scheduler.reschedule_job(self.job_id, trigger='interval', seconds=wall_interval)
+
+    def status(self):
+        """当前调度状态"""
+        job = self.scheduler.get_job(self.job_id)
+        next_run = job.next_run_time if job else None
+        return {
+            "cluster": self.name,
+            "mode": self.mode,
+            "interval_seconds": self.current_interval,
+            "wall_interval_seconds": round(self.wall_interval, 3),
+            "clock": self.clock.status(),
+            "base_interval_seconds": self.base_interval,
+            "floor_seconds": self.policy.floor,
+            "ceiling_seconds": self.policy.ceiling,
+            "reason": self.reason,
+            "last_run_at": self.last_run_at,
+            "next_run_at": next_run.timestamp() if next_run else None,
+            "signal": self.service.last_signal,
+            "metrics": self.metrics_snapshot()
+        }
+
+    def metrics_snapshot(self):
+        """调度指标的副本"""
+        with self._lock:
+            return dict(
+                self.metrics,
+                stage_overruns=dict(self.metrics["stage_overruns"]),
+                stage_deferred=dict(self.metrics["stage_deferred"])
+            )
+
+
+def create_background_scheduler(max_workers=1):
+    """
+    创建检查任务使用的后台调度器
+
+    Args:
+        max_workers (int): 同时执行的检查数，多集群共用时为集群数；每个集群的任务 max_instances 为1，同一集群的检查不会重叠
+    """
+    executors = {
+        'default': {'type': 'threadpool', 'max_workers': max_workers},
+        'processpool': {'type': 'processpool', 'max_workers': 1}
+    }
+    # 积压的多次执行合并为一次，避免周期变慢后集中补跑
+    job_defaults = {
+        'coalesce': True,
+        'max_instances': 1
+    }
+    return BackgroundScheduler(executors=executors, job_defaults=job_defaults)
+
+
+_check_scheduler = None
+
+
+def start_check_scheduler(service):
+    """创建并启动进程内的检查调度器"""
+    global _check_scheduler
+    _check_scheduler = CheckScheduler(service)
+    _check_scheduler.start()
+    return _check_scheduler
+
+
+def get_check_scheduler():
+    """获取已启动的检查调度器，未启动时返回None"""
+    return _check_scheduler
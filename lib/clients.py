@@ -0,0 +1,221 @@
+# 进程内共享的外部服务客户端注册表
+import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.metrics import instrument_boto3_session
+from lib.cassette import (create_cassette, CassetteRecorder, CassettePlayer, RecordingSession, ReplaySession,
+                          RecordingUserSource, ReplayUserSource, ReplayFeishuBot, record_k8s_client,
+                          create_replay_k8s_client)
+
+
+class ClientRegistry:
+    """
+    AWS / Kubernetes / GA / 飞书客户端注册表
+
+    每种客户端在第一次使用时创建一次，之后在调度任务和所有接口之间复用；
+    AWS客户端来自同一个boto3会话，并统一配置连接池大小和自适应重试；
+    cassette_mode 为 record 时录制GA、AWS、Kubernetes的所有调用，为 replay 时从录像返回，不访问外部服务
+    """
+
+    def __init__(self, conf=None):
+        """
+        初始化注册表
+
+        Args:
+            conf: 配置对象，属性名与 conf.settings 相同(AWS_REGION、EKS_CLUSTER_NAME等)，默认使用 conf.settings；
+                多集群模式下为 ClusterConfig，客户端、容量矩阵和读取线程池都按集群隔离
+        """
+        if conf is None:
+            from conf import settings as conf
+        self.conf = conf
+        # 多集群模式下的集群名称，默认配置为None
+        self.name = getattr(conf, "CLUSTER_NAME", None)
+        self._clients = {}
+        self._lock = threading.RLock()
+        # 外部调用的录制或回放，cassette_mode 为 off 时为None
+        self.cassette = create_cassette(conf)
+
+        self.client_config = Config(
+            max_pool_connections=conf.AWS_MAX_POOL_CONNECTIONS,
+            retries={"mode": "adaptive", "max_attempts": conf.AWS_MAX_ATTEMPTS}
+        )
+
+    def _get_or_create(self, name, factory):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = factory()
+                logger.info(f"clients -- 已创建客户端: {name}")
+            return self._clients[name]
+
+    def boto3_session(self):
+        """共享的boto3会话，会话创建的客户端的调用耗时和失败次数计入 /api/metrics"""
+        return self._get_or_create("boto3_session", self._create_boto3_session)
+
+    def _create_boto3_session(self):
+        if isinstance(self.cassette, CassettePlayer):
+            return ReplaySession(self.cassette)
+        session = instrument_boto3_session(boto3.Session(
+            region_name=self.conf.AWS_REGION,
+            aws_access_key_id=self.conf.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=self.conf.AWS_SECRET_ACCESS_KEY
+        ))
+        if isinstance(self.cassette, CassetteRecorder):
+            return RecordingSession(session, self.cassette)
+        return session
+
+    def aws_db_manager(self):
+        """RDS / ElastiCache 管理器"""
+        from lib.aws_db import AWSDBManager
+        return self._get_or_create("aws_db_manager", lambda: AWSDBManager(
+            region_name=self.conf.AWS_REGION,
+            access_key_id=self.conf.AWS_ACCESS_KEY_ID,
+            secret_access_key=self.conf.AWS_SECRET_ACCESS_KEY,
+            session=self.boto3_session(),
+            client_config=self.client_config
+        ))
+
+    def eks_manager(self):
+        """EKS节点组管理器"""
+        from lib.aws_eks import EKSManager
+        return self._get_or_create("eks_manager", lambda: EKSManager(
+            self.conf.AWS_REGION,
+            self.conf.AWS_ACCESS_KEY_ID,
+            self.conf.AWS_SECRET_ACCESS_KEY,
+            self.conf.EKS_CLUSTER_NAME,
+            session=self.boto3_session(),
+            client_config=self.client_config,
+            describe_concurrency=self.conf.EKS_DESCRIBE_CONCURRENCY,
+            inventory_ttl=self.conf.EKS_INVENTORY_TTL
+        ))
+
+    def k8s_client(self):
+        """Kubernetes客户端，开启 k8s_informer_enabled 时挂载本地缓存"""
+        return self._get_or_create("k8s_client", self._create_k8s_client)
+
+    def _create_k8s_client(self):
+        from lib.k8s_client import K8sClient
+        if isinstance(self.cassette, CassettePlayer):
+            return create_replay_k8s_client(self.cassette)
+        k8s_client = K8sClient(
+            kube_config_path=self.conf.KUBE_FILE_PATH,
+            context_name=self.conf.CLUSTER_CONTEXT,
+            pool_maxsize=self.conf.K8S_POOL_MAXSIZE
+        )
+        if isinstance(self.cassette, CassetteRecorder):
+            # 录制时所有读取都需要经过API，不挂载本地缓存
+            if self.conf.K8S_INFORMER_ENABLED:
+                logger.warning("clients -- 录制外部调用时不启用 k8s_informer_enabled")
+            return record_k8s_client(k8s_client, self.cassette)
+        if self.conf.K8S_INFORMER_ENABLED:
+            from lib.k8s_informer import K8sInformer
+            # 只缓存容量配置(ServiceConfig)中涉及的命名空间
+            namespaces = set(self.scaling_manager().matrix.namespaces())
+            namespaces.add(self.conf.HPA_NAMESPACE)
+            informer = K8sInformer(k8s_client, sorted(namespaces))
+            informer.start()
+            informer.wait_for_sync()
+            k8s_client.attach_informer(informer)
+        return k8s_client
+
+    def active_user_source(self):
+        """GA实时在线人数数据源，配置了 mock_users_url 时改为模拟服务"""
+        return self._get_or_create("active_user_source", self._create_active_user_source)
+
+    def _create_active_user_source(self):
+        if isinstance(self.cassette, CassettePlayer):
+            return ReplayUserSource(self.cassette)
+        if self.conf.MOCK_USERS_URL:
+            from lib.get_analytics_user import MockUserSource
+            source = MockUserSource(self.conf.MOCK_USERS_URL, timeout=self.conf.GA_TIMEOUT)
+        else:
+            from lib.get_analytics_user import ActiveUserSource
+            source = ActiveUserSource(
+                self.conf.KEY_FILE_LOCATION,
+                self.conf.PROPERTY_ID,
+                timeout=self.conf.GA_TIMEOUT
+            )
+        if isinstance(self.cassette, CassetteRecorder):
+            return RecordingUserSource(source, self.cassette)
+        return source
+
+    def clock(self):
+        """伸缩检查使用的时钟，配置了 mock_users_url 时跟随模拟服务的虚拟时间"""
+        from lib.clock import create_clock
+        return self._get_or_create("clock", lambda: create_clock(self.active_user_source(), self.conf))
+
+    def scaling_manager(self):
+        """容量配置查询"""
+        return self._get_or_create("scaling_manager", self._create_scaling_manager)
+
+    def _create_scaling_manager(self):
+        from lib.query_data import ScalingConfigManager
+        if isinstance(self.cassette, CassettePlayer):
+            # 录像中有容量矩阵时回放不需要访问MySQL
+            matrix = self.cassette.matrix()
+            if matrix is not None:
+                return ScalingConfigManager(matrix=matrix)
+        if self.name is None:
+            manager = ScalingConfigManager()
+        else:
+            from lib.models import create_database
+            manager = ScalingConfigManager(matrix_key=self.name, database=create_database(self.conf))
+        if isinstance(self.cassette, CassetteRecorder):
+            self.cassette.record_matrix(manager.matrix)
+        return manager
+
+    def read_executor(self):
+        """伸缩周期并发读取使用的线程池，每个注册表单独一个，慢集群不会占满其他集群的读取线程"""
+        return self._get_or_create("read_executor", lambda: ThreadPoolExecutor(
+            max_workers=self.conf.CYCLE_READ_WORKERS,
+            thread_name_prefix=f"cycle-read-{self.name}" if self.name else "cycle-read"
+        ))
+
+    def feishu_bot(self):
+        """飞书通知机器人，回放时不发送"""
+        if isinstance(self.cassette, CassettePlayer):
+            return self._get_or_create("feishu_bot", ReplayFeishuBot)
+        from lib.feishu_bot import FeishuRichTextBot
+        return self._get_or_create("feishu_bot", lambda: FeishuRichTextBot(
+            webhook_url=self.conf.FEISHU_WEBHOOK_URL,
+            max_retries=5,
+            retry_delay=1
+        ))
+
+    def close(self):
+        """关闭所有已创建的客户端"""
+        with self._lock:
+            executor = self._clients.pop("read_executor", None)
+            if executor is not None:
+                executor.shutdown(wait=False)
+            for name in ("active_user_source", "k8s_client", "scaling_manager"):
+                client = self._clients.pop(name, None)
+                if client is None:
+                    continue
+                try:
+                    client.close()
+                except Exception as e:
+                    logger.error(f"clients -- 关闭客户端 {name} 失败: {str(e)}")
+            if self.cassette is not None:
+                self.cassette.close()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry():
+    """获取进程内默认的客户端注册表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry()
+    return _registry
@@ -0,0 +1,77 @@
+# 伸缩检查使用的时钟: 默认为系统时间，从模拟服务读取在线人数时跟随模拟场景的虚拟时间
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WallClock:
+    """系统时间"""
+
+    speed = 1.0
+
+    def time(self):
+        return time.time()
+
+    def wall_seconds(self, seconds):
+        """时钟上的秒数对应的真实秒数"""
+        return seconds
+
+    def status(self):
+        return {"kind": "wall", "time": self.time(), "speed": self.speed}
+
+
+class SourceClock:
+    """
+    跟随模拟服务(mock/mock.py)虚拟时间的时钟
+
+    每次读取在线人数时模拟服务返回虚拟时间、倍速和是否暂停，两次读取之间按倍速推算；
+    采样时间戳、sample_max_age、冷却时间、预测和检查间隔都按虚拟秒数计算，
+    倍速为3600时真实1秒的检查间隔对应虚拟1小时。还没有读数时与系统时间相同
+    """
+
+    def __init__(self, source):
+        """
+        初始化
+
+        Args:
+            source (MockUserSource): 模拟在线人数数据源，virtual_anchor 为最近一次读数的 (虚拟时间, 本地monotonic时间, 倍速, 是否暂停)
+        """
+        self.source = source
+
+    def _anchor(self):
+        # 回放录像时数据源没有虚拟时间，与系统时间相同
+        return getattr(self.source, "virtual_anchor", None)
+
+    def time(self):
+        anchor = self._anchor()
+        if anchor is None:
+            return time.time()
+        virtual_time, observed_at, speed, paused = anchor
+        return virtual_time if paused else virtual_time + (time.monotonic() - observed_at) * speed
+
+    @property
+    def speed(self):
+        anchor = self._anchor()
+        return anchor[2] if anchor is not None else 1.0
+
+    def wall_seconds(self, seconds):
+        return seconds / self.speed
+
+    def status(self):
+        anchor = self._anchor()
+        return {
+            "kind": "virtual",
+            "time": self.time(),
+            "speed": self.speed,
+            "paused": anchor[3] if anchor is not None else None
+        }
+
+
+def create_clock(source, conf=None):
+    """配置了 mock_users_url 时跟随模拟服务的虚拟时间，否则为系统时间"""
+    if conf is None:
+        from conf import settings as conf
+    if conf.MOCK_USERS_URL:
+        return SourceClock(source)
+    return WallClock()
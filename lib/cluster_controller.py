@@ -0,0 +1,225 @@
+# 多集群模式：每个集群单独的客户端、容量矩阵和检查调度
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+class ClusterConfig:
+    """
+    单个集群的配置
+
+    clusters 列表中每一项的键与 config.yaml 相同(小写)，未配置的项使用全局配置；
+    在线人数历史目录、扩容状态文件和录像文件默认按集群名称分开存放
+    """
+
+    def __init__(self, definition, base=None):
+        """
+        初始化
+
+        Args:
+            definition (dict): 集群定义，必须包含 name
+            base: 全局配置，默认使用 conf.settings
+        """
+        if base is None:
+            from conf import settings as base
+        if not definition.get("name"):
+            raise ValueError(f"集群配置缺少 name: {definition}")
+        self._base = base
+        self.CLUSTER_NAME = definition["name"]
+        self.HISTORY_DIR = os.path.join(base.HISTORY_DIR, self.CLUSTER_NAME)
+        self.SCALING_STATE_FILE = os.path.join(
+            os.path.dirname(base.SCALING_STATE_FILE), self.CLUSTER_NAME, os.path.basename(base.SCALING_STATE_FILE)
+        )
+        self.CASSETTE_FILE = os.path.join(
+            os.path.dirname(base.CASSETTE_FILE), self.CLUSTER_NAME, os.path.basename(base.CASSETTE_FILE)
+        )
+        for key, value in definition.items():
+            if key != "name":
+                setattr(self, key.upper(), value)
+
+        from conf.settings import get_project_root
+        for key in ("HISTORY_DIR", "SCALING_STATE_FILE", "CASSETTE_FILE"):
+            path = getattr(self, key)
+            if not os.path.isabs(path):
+                setattr(self, key, os.path.join(get_project_root(), path))
+
+    def __getattr__(self, name):
+        return getattr(self._base, name)
+
+
+def load_cluster_configs(base=None):
+    """
+    读取 clusters 配置
+
+    Returns:
+        list: ClusterConfig 列表，未配置 clusters 时为空列表
+    """
+    if base is None:
+        from conf import settings as base
+    configs = [ClusterConfig(definition, base) for definition in base.CLUSTERS]
+    names = [conf.CLUSTER_NAME for conf in configs]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"集群名称重复: {duplicated}")
+    return configs
+
+
+class ClusterWorker:
+    """
+    单个集群的伸缩检查
+
+    拥有独立的客户端注册表、容量矩阵、采样缓冲、时序存储和读取线程池；采样调度、执行线程池和检查调度器由
+    ClusterController 提供、各集群共用，一个集群变慢或初始化失败不影响其他集群
+    """
+
+    def __init__(self, conf, sampling_loop=None, actuation_engine=None, scheduler=None):
+        """
+        初始化
+
+        Args:
+            conf (ClusterConfig): 集群配置
+            sampling_loop (SamplingLoop): 共用的采样调度，为None时单独启动采样线程
+            actuation_engine (ActuationEngine): 共用的执行器，为None时单独创建
+            scheduler (BackgroundScheduler): 共用的检查调度器，为None时单独创建
+        """
+        self.conf = conf
+        self.name = conf.CLUSTER_NAME
+        self.sampling_loop = sampling_loop
+        self.actuation_engine = actuation_engine
+        self.shared_scheduler = scheduler
+        self.registry = None
+        self.service = None
+        self.scheduler = None
+        self.error = None
+
+    def start(self):
+        """创建该集群的服务并启动采样和检查调度"""
+        from lib.clients import ClientRegistry
+        from core.core import AutoScalingService
+        from lib.check_scheduler import CheckScheduler
+
+        # 读取线程池由注册表按集群单独创建，慢集群的读取不会占满其他集群的线程
+        self.registry = ClientRegistry(self.conf)
+        try:
+            self.service = AutoScalingService(self.registry, actuation_engine=self.actuation_engine)
+            self.service.sampler.start(loop=self.sampling_loop)
+            self.scheduler = CheckScheduler(self.service, scheduler=self.shared_scheduler)
+            self.scheduler.start()
+            self.error = None
+            logger.info(f"cluster [{self.name}] -- 已启动，EKS集群 {self.conf.EKS_CLUSTER_NAME}，上下文 {self.conf.CLUSTER_CONTEXT}")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {str(e)}"
+            logger.error(f"cluster [{self.name}] -- 启动失败: {self.error}")
+            self.shutdown()
+            raise
+
+    def is_ready(self):
+        """服务是否已创建，启动中或启动失败时为False"""
+        return self.service is not None and self.error is None
+
+    def shutdown(self):
+        """停止调度和采样并关闭该集群的客户端，共用的线程池由 ClusterController 关闭"""
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+        if self.service is not None:
+            self.service.sampler.stop()
+            if self.actuation_engine is None:
+                self.service.actuation_engine.shutdown()
+            self.service.history.close()
+        if self.registry is not None:
+            self.registry.close()
+
+    def status(self):
+        if self.scheduler is None:
+            return {"cluster": self.name, "running": False, "error": self.error}
+        return dict(self.scheduler.status(), running=True, error=None, sampler=self.service.sampler.stats())
+
+
+class ClusterController:
+    """
+    多集群伸缩控制器
+
+    为 clusters 中的每个集群创建一个 ClusterWorker，各集群在单独的线程中初始化(不等待全部完成)，
+    之后按各自的调度间隔独立执行检查；采样共用一个调度线程和按集群数分配的采样线程池(每个集群同时只有一次采样)，
+    patch 共用一个执行器，检查共用一个调度器(每个集群一个任务)；伸缩周期的读取线程池仍按集群隔离
+    """
+
+    def __init__(self, configs):
+        """
+        初始化
+
+        Args:
+            configs (list): ClusterConfig 列表
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from lib.sampler import SamplingLoop
+        from lib.actuator import get_actuation_engine
+        from lib.check_scheduler import create_background_scheduler
+
+        # 采样不使用伸缩周期的读取线程池，读取变慢不会拖延采样；
+        # 每个集群同时最多占用一个采样线程，一个集群的GA查询卡住不影响其他集群
+        self.sample_executor = ThreadPoolExecutor(max_workers=max(1, len(configs)), thread_name_prefix="user-sampler")
+        self.sampling_loop = SamplingLoop(self.sample_executor)
+        self.actuation_engine = get_actuation_engine()
+        self.scheduler = create_background_scheduler(max_workers=max(1, len(configs)))
+        self.workers = {
+            conf.CLUSTER_NAME: ClusterWorker(
+                conf,
+                sampling_loop=self.sampling_loop,
+                actuation_engine=self.actuation_engine,
+                scheduler=self.scheduler
+            )
+            for conf in configs
+        }
+
+    def start(self):
+        """并行启动所有集群，单个集群启动失败或缓慢不影响其他集群"""
+        self.scheduler.start()
+        for name, worker in self.workers.items():
+            threading.Thread(target=self._start_worker, args=(worker,), name=f"cluster-start-{name}", daemon=True).start()
+        logger.info(f"cluster -- 多集群模式，正在启动 {len(self.workers)} 个集群: {list(self.workers)}")
+
+    @staticmethod
+    def _start_worker(worker):
+        try:
+            worker.start()
+        except Exception:
+            # 错误已记录在 worker.error 中
+            pass
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            try:
+                worker.shutdown()
+            except Exception as e:
+                logger.error(f"cluster [{worker.name}] -- 关闭失败: {str(e)}")
+        self.scheduler.shutdown(wait=False)
+        self.sampling_loop.stop()
+        self.sample_executor.shutdown(wait=False)
+        self.actuation_engine.shutdown()
+
+    def get(self, name):
+        """按名称获取集群，不存在时返回None"""
+        return self.workers.get(name)
+
+    def status(self):
+        """所有集群的调度状态"""
+        return {name: worker.status() for name, worker in self.workers.items()}
+
+
+_controller = None
+
+
+def start_cluster_controller(configs):
+    """创建并启动多集群控制器"""
+    global _controller
+    _controller = ClusterController(configs)
+    _controller.start()
+    return _controller
+
+
+def get_cluster_controller():
+    """获取已启动的多集群控制器，单集群模式下返回None"""
+    return _controller
@@ -0,0 +1,111 @@
+# 单次伸缩检查的时间预算
+import sys
+import os
+import time
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.errors import DeadlineExceeded
+
+
+STAGE_SIGNAL = "signal"
+STAGE_INVENTORY = "inventory"
+STAGE_ACTUATION = "actuation"
+STAGE_NOTIFY = "notify"
+
+DEFAULT_STAGE_SHARES = {STAGE_SIGNAL: 0.25, STAGE_INVENTORY: 0.25, STAGE_ACTUATION: 0.4, STAGE_NOTIFY: 0.1}
+
+
+class CycleBudget:
+    """
+    伸缩检查周期的总时间预算，按比例分配到各阶段
+
+    阶段内的外部读取和执行超时不超过该阶段剩余预算；进入阶段前总预算已用完，
+    或阶段预算用完后还需要等待外部读取时抛出 DeadlineExceeded，该阶段推迟到下一个周期。每个阶段的耗时和是否超出预算记录在 report 中
+    """
+
+    def __init__(self, total_seconds, shares=None):
+        """
+        初始化预算
+
+        Args:
+            total_seconds (float): 总预算(秒)
+            shares (dict): {阶段: 占总预算的比例}
+        """
+        self.total_seconds = total_seconds
+        self.shares = dict(DEFAULT_STAGE_SHARES, **(shares or {}))
+        self.started = time.monotonic()
+        self.deadline = self.started + total_seconds
+        self.current_stage = None
+        self._stage_deadline = None
+        self._stage_budget = None
+        self.stages = {}
+
+    def remaining(self):
+        """当前阶段剩余的秒数(不超过总预算剩余)"""
+        now = time.monotonic()
+        deadline = self.deadline if self._stage_deadline is None else min(self.deadline, self._stage_deadline)
+        return max(0.0, deadline - now)
+
+    def require_remaining(self):
+        """
+        当前阶段剩余的秒数，已经用完时不再发起新的等待
+
+        Raises:
+            DeadlineExceeded: 当前阶段或总预算已用完
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            budget = self.total_seconds if self._stage_budget is None else round(self._stage_budget, 2)
+            raise DeadlineExceeded(self.current_stage, budget)
+        return remaining
+
+    def expired(self):
+        return time.monotonic() >= self.deadline
+
+    @contextmanager
+    def stage(self, name):
+        """
+        进入一个阶段
+
+        Raises:
+            DeadlineExceeded: 总预算已用完
+        """
+        if self.expired():
+            self.stages[name] = {"elapsed_ms": 0, "budget_ms": 0, "overrun": False, "deferred": True}
+            raise DeadlineExceeded(name, self.total_seconds)
+
+        budget = self.total_seconds * self.shares.get(name, 0)
+        start = time.monotonic()
+        self.current_stage = name
+        self._stage_deadline = start + budget
+        self._stage_budget = budget
+        deferred = False
+        try:
+            yield self
+        except DeadlineExceeded:
+            deferred = True
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            overrun = elapsed > budget
+            self.stages[name] = {
+                "elapsed_ms": round(elapsed * 1000, 2),
+                "budget_ms": round(budget * 1000, 2),
+                "overrun": overrun,
+                "deferred": deferred
+            }
+            if overrun:
+                logger.warning(f"cycle budget -- 阶段 {name} 耗时 {elapsed:.2f}s 超出预算 {budget:.2f}s")
+            self.current_stage = None
+            self._stage_deadline = None
+            self._stage_budget = None
+
+    def report(self):
+        """各阶段耗时、超出预算和推迟情况"""
+        return {
+            "total_budget_ms": round(self.total_seconds * 1000, 2),
+            "elapsed_ms": round((time.monotonic() - self.started) * 1000, 2),
+            "deadline_exceeded": self.expired(),
+            "stages": self.stages
+        }
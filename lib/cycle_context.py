@@ -0,0 +1,262 @@
+# 单次伸缩检查周期内的外部读取缓存
+import sys
+import os
+import time
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.sampler import read_active_users
+from lib.errors import DependencyError, DependencyTimeout, DeadlineExceeded
+
+
+class CycleContext:
+    """
+    一次 check_and_scale 内共享的读取上下文
+
+    GA、RDS、ElastiCache、EKS、HPA/Deployment 的读取结果在本周期内只获取一次，
+    同时按服务统计实际发起的调用次数和缓存命中次数，周期结束时输出到日志；
+    相互独立的读取可以通过 gather 并发执行，每个读取有各自的超时，失败时抛出 DependencyError
+    """
+
+    def __init__(self, registry, sampler, conf=None, budget=None):
+        """
+        初始化上下文
+
+        Args:
+            registry (ClientRegistry): 客户端注册表
+            sampler (UserSampler): 在线人数采样器
+            conf: 配置对象，默认使用注册表的配置
+            budget (CycleBudget): 周期时间预算，读取超时不超过当前阶段的剩余预算
+        """
+        if conf is None:
+            conf = registry.conf
+        self.registry = registry
+        self.sampler = sampler
+        self.conf = conf
+        self.budget = budget
+
+        self.started_at = time.perf_counter()
+        self.calls = {"ga": 0, "rds": 0, "elasticache": 0, "eks": 0, "k8s": 0}
+        self.hits = 0
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def _memo(self, key, service, loader):
+        """
+        读取并缓存，service 为 None 表示本地查询不计入外部调用
+
+        同一个key并发读取时只有第一个调用方执行loader，其余调用方最多等待该依赖的超时时间；
+        读取失败时缓存 DependencyError，本周期内不再重试
+        """
+        with self._lock:
+            future = self._values.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._values[key] = future
+                if service is not None:
+                    self.calls[service] += 1
+            else:
+                self.hits += 1
+
+        if not is_owner:
+            if future.done():
+                # 已完成的读取直接返回，不受剩余预算影响
+                return future.result()
+            source = service or key[0]
+            try:
+                return future.result(timeout=self._timeout(source))
+            except FutureTimeoutError:
+                raise DependencyTimeout(source, self._timeout(source))
+
+        try:
+            self._resolve(future, value=loader())
+        except DeadlineExceeded as e:
+            # 预算用完不是依赖失败，不缓存，下一次调用重新读取
+            self._resolve(future, error=e)
+            with self._lock:
+                if self._values.get(key) is future:
+                    del self._values[key]
+            raise
+        except Exception as e:
+            self._resolve(future, error=e if isinstance(e, DependencyError) else DependencyError(service or key[0], e))
+        return future.result()
+
+    @staticmethod
+    def _resolve(future, value=None, error=None):
+        """设置读取结果，已经被 gather 按超时结束的读取忽略迟到的结果"""
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+        except InvalidStateError:
+            pass
+
+    def _abandon(self, key, error):
+        """gather 放弃等待的读取直接以 error 结束，本周期内后续调用立即失败，不再等待一次超时"""
+        with self._lock:
+            future = self._values.get(key)
+        if future is not None:
+            self._resolve(future, error=error)
+
+    def _timeout(self, source):
+        """
+        依赖的读取超时(秒)，cycle_read_timeouts 中未配置时使用 cycle_read_timeout
+
+        Raises:
+            DeadlineExceeded: 当前阶段的预算已用完
+        """
+        timeout = self.conf.CYCLE_READ_TIMEOUTS.get(source, self.conf.CYCLE_READ_TIMEOUT)
+        if self.budget is not None:
+            timeout = min(timeout, self.budget.require_remaining())
+        return timeout
+
+    def _cached(self, key):
+        """本周期缓存中已完成的读取，没有或未完成时返回None"""
+        with self._lock:
+            future = self._values.get(key)
+        return future if future is not None and future.done() else None
+
+    def gather(self, reads, keys=None, sources=None):
+        """
+        并发执行多个相互独立的读取
+
+        Args:
+            reads (dict): {依赖名称: 无参读取函数}，依赖名称同时用于查找超时配置
+            keys (dict): {依赖名称: 本周期缓存的key}，超时的读取按key结束缓存中的读取
+            sources (dict): {依赖名称: 依赖}，同一依赖的多个读取(例如多个Deployment)按该依赖查找超时配置
+
+        Returns:
+            tuple: (结果 {名称: 值}, 错误 {名称: DependencyError})
+
+        Raises:
+            DeadlineExceeded: 还有需要等待的读取，但当前阶段的预算已用完
+        """
+        start = time.perf_counter()
+        sources = sources or {}
+        results = {}
+        errors = {}
+        # 已经缓存的读取在当前线程直接取值，不提交线程池，也不需要剩余预算
+        pending = {}
+        for name, read in reads.items():
+            if keys and name in keys and self._cached(keys[name]) is not None:
+                try:
+                    results[name] = read()
+                except DependencyError as e:
+                    errors[name] = e
+                except Exception as e:
+                    errors[name] = DependencyError(name, e)
+            else:
+                pending[name] = read
+        # 预算已用完时不提交新的读取
+        for name in pending:
+            self._timeout(sources.get(name, name))
+
+        executor = self.registry.read_executor()
+        futures = {name: executor.submit(read) for name, read in pending.items()}
+        started = time.monotonic()
+
+        # 先等待超时较短的依赖，保证每个依赖都按自己的超时判定
+        for name, future in sorted(futures.items(), key=lambda item: self._timeout(sources.get(item[0], item[0]))):
+            timeout = self._timeout(sources.get(name, name))
+            remaining = max(0, started + timeout - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                errors[name] = DependencyTimeout(name, timeout)
+                if keys and name in keys:
+                    self._abandon(keys[name], errors[name])
+            except DeadlineExceeded:
+                raise
+            except DependencyError as e:
+                errors[name] = e
+            except Exception as e:
+                errors[name] = DependencyError(name, e)
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        if errors:
+            logger.error(f"cycle -- 并发读取 {list(reads)} 耗时 {elapsed_ms}ms，失败: {[str(e) for e in errors.values()]}")
+        else:
+            logger.info(f"cycle -- 并发读取 {list(reads)} 耗时 {elapsed_ms}ms")
+        return results, errors
+
+    def active_users(self):
+        """最新在线人数样本 (ts, value)，缓冲过旧时才查询GA"""
+        def load():
+            before = self.sampler.buffer.latest()
+            sample = read_active_users(self.sampler, self.conf.SAMPLE_MAX_AGE)
+            if sample is not before:
+                with self._lock:
+                    self.calls["ga"] += 1
+            return sample
+        return self._memo(("ga",), None, load)
+
+    def rds_members(self):
+        """RDS集群成员 {实例ID: {"instance_class", "role", "status"}}"""
+        return self._memo(("rds",), "rds", lambda: self.registry.aws_db_manager().describe_rds_cluster_members(
+            self.conf.RDS_CLUSTER_NAME
+        ))
+
+    def rds_instance_types(self):
+        """RDS集群成员实例类型 {实例ID: 实例类型}"""
+        return {instance_id: member["instance_class"] for instance_id, member in self.rds_members().items()}
+
+    def redis_node_type(self):
+        """Redis节点类型"""
+        return self._memo(("elasticache",), "elasticache", lambda: self.registry.aws_db_manager().get_elasticache_redis_node_type(
+            self.conf.REDIS_OSS_NAME
+        ))
+
+    def nodegroup_desired_sizes(self):
+        """EKS节点组期望节点数 {节点组: 数量}"""
+        return self._memo(("eks",), "eks", lambda: self.registry.eks_manager().get_nodegroup_desired_sizes())
+
+    def hpa_configs(self, namespace):
+        """命名空间下所有HPA的伸缩配置"""
+        return self._memo(("hpa", namespace), "k8s", lambda: self.registry.k8s_client().list_hpa_scaling_configs(namespace))
+
+    def deployment(self, name, namespace):
+        """Deployment对象"""
+        return self._memo(("deployment", namespace, name), "k8s", lambda: self.registry.k8s_client().get_deployment(name, namespace))
+
+    def target_level(self, user_count):
+        """用户数对应的目标级别"""
+        return self._memo(("target_level", user_count), None, lambda: self.registry.scaling_manager().get_target_level(user_count))
+
+    def complete_config(self, user_count):
+        """用户数对应的完整配置"""
+        return self._memo(("complete_config", user_count), None, lambda: self.registry.scaling_manager().get_complete_config(user_count))
+
+    def gather_inputs(self):
+        """
+        并发读取本周期需要的独立输入: GA在线人数、RDS成员、Redis节点类型、入口HPA
+
+        Returns:
+            tuple: (结果, 错误) 与 gather 相同，结果同时写入本周期缓存
+        """
+        return self.gather({
+            "ga": self.active_users,
+            "rds": self.rds_members,
+            "elasticache": self.redis_node_type,
+            "k8s": lambda: self.hpa_configs(self.conf.HPA_NAMESPACE)
+        }, keys=self.input_keys())
+
+    def input_keys(self):
+        """gather_inputs 中各个读取在本周期缓存中的key"""
+        return {"ga": ("ga",), "rds": ("rds",), "elasticache": ("elasticache",), "k8s": ("hpa", self.conf.HPA_NAMESPACE)}
+
+    def invalidate(self, *key):
+        """写操作之后清除对应的缓存，例如 invalidate("eks")"""
+        with self._lock:
+            self._values.pop(key, None)
+
+    def summary(self):
+        """本周期的外部调用统计"""
+        calls = " ".join(f"{service}={count}" for service, count in self.calls.items())
+        elapsed_ms = round((time.perf_counter() - self.started_at) * 1000, 2)
+        return f"外部调用 {sum(self.calls.values())} 次({calls})，缓存命中 {self.hits} 次，耗时 {elapsed_ms}ms"
+
+    def stats(self):
+        return {"calls": dict(self.calls), "hits": self.hits}
@@ -0,0 +1,35 @@
+# 伸缩周期中使用的异常类型
+
+
+class DependencyError(Exception):
+    """外部依赖(GA、RDS、ElastiCache、EKS、K8s)读取失败"""
+
+    def __init__(self, source, cause):
+        self.source = source
+        self.cause = cause
+        super().__init__(f"{source} 读取失败: {cause}")
+
+
+class DependencyTimeout(DependencyError):
+    """外部依赖读取超时"""
+
+    def __init__(self, source, timeout):
+        self.timeout = timeout
+        super().__init__(source, f"超过 {timeout} 秒未返回")
+
+
+class CapacityLevelError(Exception):
+    """无法确定当前配置级别"""
+
+    def __init__(self, message, errors=None):
+        self.errors = errors or {}
+        super().__init__(message)
+
+
+class DeadlineExceeded(Exception):
+    """伸缩检查周期的时间预算已用完，剩余阶段推迟到下一个周期"""
+
+    def __init__(self, stage, budget_seconds):
+        self.stage = stage
+        self.budget_seconds = budget_seconds
+        super().__init__(f"周期时间预算 {budget_seconds} 秒已用完，阶段 {stage} 推迟到下一个周期")
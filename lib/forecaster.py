@@ -0,0 +1,96 @@
+# 在线人数短期预测(Holt 双指数平滑)
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+class HoltForecaster:
+    """
+    带趋势项的指数平滑预测器
+
+    每次采样更新水平值和趋势(人/秒)，采样间隔不固定时按实际间隔折算趋势，
+    预测值 = 水平值 + 趋势 × 提前量，用于在扩容生效前(Pod+节点预热时间)提前选定级别
+    """
+
+    def __init__(self, alpha=0.5, beta=0.3):
+        """
+        初始化预测器
+
+        Args:
+            alpha (float): 水平平滑系数 0~1，越大越贴近最新值
+            beta (float): 趋势平滑系数 0~1，越大趋势变化越快
+        """
+        if not 0 < alpha <= 1 or not 0 < beta <= 1:
+            raise ValueError("alpha 和 beta 必须在 (0, 1] 之间")
+        self.alpha = alpha
+        self.beta = beta
+        # 参与平滑的样本数，状态只由水平值和趋势决定，不保留样本
+        self.sample_count = 0
+
+        self.level = None
+        self.trend = 0.0
+        self.last_timestamp = None
+        self._lock = threading.Lock()
+
+    def observe(self, value, timestamp=None):
+        """
+        加入一个样本
+
+        Args:
+            value (int|float): 在线人数
+            timestamp (float): 采样时间戳(秒)，默认当前时间
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+                # 乱序或重复的样本不参与平滑
+                return
+            self.sample_count += 1
+
+            if self.level is None:
+                self.level = float(value)
+            else:
+                dt = timestamp - self.last_timestamp
+                previous_level = self.level
+                self.level = self.alpha * value + (1 - self.alpha) * (previous_level + self.trend * dt)
+                self.trend = self.beta * (self.level - previous_level) / dt + (1 - self.beta) * self.trend
+            self.last_timestamp = timestamp
+
+    def forecast(self, lead_seconds):
+        """
+        预测 lead_seconds 秒后的在线人数
+
+        Returns:
+            int|None: 预测人数(不小于0)，没有样本时返回None
+        """
+        with self._lock:
+            if self.level is None:
+                return None
+            # 只有一个样本时没有趋势，预测值即为当前值
+            return max(0, int(round(self.level + self.trend * lead_seconds)))
+
+    def stats(self):
+        """当前平滑状态"""
+        with self._lock:
+            return {
+                "level": round(self.level, 2) if self.level is not None else None,
+                "trend_per_minute": round(self.trend * 60, 2),
+                "samples": self.sample_count,
+                "last_timestamp": self.last_timestamp
+            }
+
+
+def create_forecaster(conf=None):
+    """根据配置创建预测器，未开启预测时返回None"""
+    if conf is None:
+        from conf import settings as conf
+    if not conf.FORECAST_ENABLED:
+        return None
+    logger.info(f"forecaster -- 已开启在线人数预测，提前量 {conf.FORECAST_LEAD_SECONDS} 秒")
+    return HoltForecaster(
+        alpha=conf.FORECAST_ALPHA,
+        beta=conf.FORECAST_BETA
+    )
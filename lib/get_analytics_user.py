@@ -1,19 +1,259 @@
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import RunRealtimeReportRequest
+from google.auth.transport.requests import Request as AuthRequest
 from google.oauth2 import service_account
 import sys
 import os
+import time
+import threading
 import requests
 import json
+from datetime import datetime, timezone
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from lib.logger import app_logger as logger
+from lib.metrics import observe_call
+
+
+GA_SCOPES = ['https://www.googleapis.com/auth/analytics.readonly']
+# 实时报告返回的配额项
+GA_QUOTA_FIELDS = ('tokens_per_day', 'tokens_per_hour', 'tokens_per_project_per_hour', 'concurrent_requests')
+
+
+class ActiveUserSource:
+    """
+    长连接的Google Analytics实时在线人数数据源
+
+    只加载一次凭证并保持一个gRPC通道，后台线程在token过期前主动刷新，
+    每次查询带超时限制，并记录查询耗时
+    """
+
+    def __init__(self, key_file_location, property_id, timeout=10, refresh_margin=300):
+        """
+        初始化数据源
+
+        Args:
+            key_file_location (str): service account 的json文件路径
+            property_id (str): google analytics中的id，例如 properties/xxx
+            timeout (float): 单次查询的超时时间(秒)
+            refresh_margin (int): token过期前多少秒刷新
+        """
+        self.key_file_location = key_file_location
+        self.property_id = property_id
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+        self._credentials = None
+        self._client = None
+
+        # 查询耗时统计
+        self.last_latency_ms = None
+        self.last_fetch_time = None
+        self.last_error = None
+        self.fetch_count = 0
+        self.error_count = 0
+        # 最近一次查询返回的配额: {配额项: {"consumed": 本次消耗, "remaining": 剩余}}
+        self.last_quota = {}
+
+    def _ensure_client(self):
+        """首次使用时创建凭证和gRPC客户端，之后复用"""
+        with self._lock:
+            if self._client is not None:
+                return self._client
+
+            self._credentials = service_account.Credentials.from_service_account_file(
+                self.key_file_location,
+                scopes=GA_SCOPES
+            )
+            self._refresh_credentials()
+            self._client = BetaAnalyticsDataClient(credentials=self._credentials)
+            logger.info("analytics -- 已创建长连接客户端")
+
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop,
+                name="ga-token-refresh",
+                daemon=True
+            )
+            self._refresh_thread.start()
+            return self._client
+
+    def _refresh_credentials(self):
+        """刷新OAuth token"""
+        self._credentials.refresh(AuthRequest())
+        logger.debug(f"analytics -- token已刷新，过期时间: {self._credentials.expiry}")
+
+    def _seconds_until_refresh(self):
+        """计算距离下一次需要刷新token的秒数"""
+        expiry = self._credentials.expiry
+        if not expiry:
+            return self.refresh_margin
+        # google-auth 的 expiry 为无时区的UTC时间
+        remaining = (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() - self.refresh_margin
+        return max(remaining, 30)
+
+    def _refresh_loop(self):
+        """后台刷新token，避免查询时才同步刷新"""
+        while not self._stop_event.wait(self._seconds_until_refresh()):
+            try:
+                self._refresh_credentials()
+            except Exception as e:
+                logger.error(f"analytics -- 后台刷新token失败: {str(e)}")
+
+    def get_active_users(self):
+        """
+        获取当前实时在线人数
+
+        Returns:
+            int: 在线人数
+        """
+        client = self._ensure_client()
+
+        request = RunRealtimeReportRequest(
+            property=self.property_id,
+            metrics=[{"name": "activeUsers"}],
+            return_property_quota=True
+        )
+
+        start = time.perf_counter()
+        try:
+            with observe_call("ga", "run_realtime_report"):
+                response = client.run_realtime_report(request, timeout=self.timeout)
+        except Exception as e:
+            self.error_count += 1
+            self.last_error = str(e)
+            logger.error(f"analytics -- 查询在线人数失败: {str(e)}")
+            raise
+        finally:
+            self.last_latency_ms = round((time.perf_counter() - start) * 1000, 2)
+            self.last_fetch_time = time.time()
+            self.fetch_count += 1
+
+        self.last_quota = self._parse_quota(response)
+
+        active_users = 0
+        if response.row_count > 0:
+            active_users = int(response.rows[0].metric_values[0].value)
+        logger.info(f"analytics -- 当前在线人数:{active_users} 耗时:{self.last_latency_ms}ms")
+        return active_users
+
+    @staticmethod
+    def _parse_quota(response):
+        """解析响应中的 propertyQuota"""
+        quota = {}
+        if not response.property_quota:
+            return quota
+        for field in GA_QUOTA_FIELDS:
+            status = getattr(response.property_quota, field, None)
+            if status:
+                quota[field] = {"consumed": status.consumed, "remaining": status.remaining}
+        return quota
+
+    def stats(self):
+        """返回查询统计信息"""
+        return {
+            "last_latency_ms": self.last_latency_ms,
+            "last_fetch_time": self.last_fetch_time,
+            "last_error": self.last_error,
+            "fetch_count": self.fetch_count,
+            "error_count": self.error_count,
+            "quota": self.last_quota
+        }
+
+    def close(self):
+        """停止后台刷新并关闭gRPC通道"""
+        self._stop_event.set()
+        with self._lock:
+            if self._client is not None:
+                self._client.transport.close()
+                self._client = None
+
+
+class MockUserSource:
+    """
+    从模拟服务(mock/mock.py)读取在线人数，接口与 ActiveUserSource 相同
+
+    url 形如 http://IP:5000/api/online-users?scenario=weekly-wave，
+    响应中的虚拟时间记录在 last_virtual_time，便于把伸缩日志和模拟曲线对应起来；
+    virtual_anchor 供 SourceClock 推算当前虚拟时间
+    """
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+        self.last_latency_ms = None
+        self.last_fetch_time = None
+        self.last_virtual_time = None
+        self.virtual_anchor = None
+        self.last_error = None
+        self.fetch_count = 0
+        self.error_count = 0
+        # 模拟服务没有配额，采样间隔不会因配额调整
+        self.last_quota = {}
+
+    def get_active_users(self):
+        """
+        获取模拟的在线人数
+
+        Returns:
+            int: 在线人数
+        """
+        start = time.perf_counter()
+        try:
+            with observe_call("mock", "online_users"):
+                response = self._session.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+        except Exception as e:
+            self.error_count += 1
+            self.last_error = str(e)
+            logger.error(f"analytics -- 查询模拟在线人数失败: {str(e)}")
+            raise
+        finally:
+            self.last_latency_ms = round((time.perf_counter() - start) * 1000, 2)
+            self.last_fetch_time = time.time()
+            self.fetch_count += 1
+
+        self.last_virtual_time = data.get("virtual_time")
+        if data.get("virtual_timestamp") is not None:
+            self.virtual_anchor = (
+                float(data["virtual_timestamp"]), time.monotonic(), float(data.get("speed") or 1.0), bool(data.get("paused"))
+            )
+        active_users = int(data["online_users"])
+        logger.info(f"analytics -- 模拟在线人数:{active_users} 虚拟时间:{self.last_virtual_time} 场景:{data.get('scenario')}")
+        return active_users
+
+    def stats(self):
+        """返回查询统计信息"""
+        return {
+            "mock_url": self.url,
+            "last_virtual_time": self.last_virtual_time,
+            "last_latency_ms": self.last_latency_ms,
+            "last_fetch_time": self.last_fetch_time,
+            "last_error": self.last_error,
+            "fetch_count": self.fetch_count,
+            "error_count": self.error_count,
+            "quota": self.last_quota
+        }
+
+    def close(self):
+        self._session.close()
+
+
+def get_active_user_source():
+    """获取进程内共享的在线人数数据源"""
+    from lib.clients import get_client_registry
+    return get_client_registry().active_user_source()
 
 
 def get_active_users(KEY_FILE_LOCATION, PROPERTY_ID):
     # 初始化凭证
     credentials = service_account.Credentials.from_service_account_file(
         KEY_FILE_LOCATION,
-        scopes=['https://www.googleapis.com/auth/analytics.readonly']
+        scopes=GA_SCOPES
     )
 
     # 创建客户端
@@ -6,6 +6,7 @@ from typing import Dict, List, Optional, Union, Any
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from lib.logger import app_logger as logger
+from lib.metrics import observe_call
 
 
 class K8sClient:
@@ -14,27 +15,37 @@ class K8sClient:
     特别是Deployment的节点调度和HPA配置
     """
 
-    def __init__(self, kube_config_path: Optional[str] = None, context_name: Optional[str] = None):
+    def __init__(self, kube_config_path: Optional[str] = None, context_name: Optional[str] = None,
+                 pool_maxsize: Optional[int] = None):
         """
         初始化K8s客户端
 
         Args:
             kube_config_path: kubeconfig文件的路径，默认为None，会使用~/.kube/config
             context_name: 要使用的context名称，默认为None，会使用当前context
+            pool_maxsize: 到apiserver的连接池大小，默认为None，使用kubernetes客户端默认值
         """
-        self.kube_config_path = kube_config_path or os.path.expanduser("~/.kube/config")
+        self.kube_config_path = os.path.expanduser(kube_config_path or "~/.kube/config")
         self.context_name = context_name
 
         try:
-            if self.context_name:
-                config.load_kube_config(config_file=self.kube_config_path, context=self.context_name)
-            else:
-                config.load_kube_config(config_file=self.kube_config_path)
+            # 使用独立的Configuration，不修改kubernetes客户端的全局默认配置
+            configuration = client.Configuration()
+            config.load_kube_config(
+                config_file=self.kube_config_path,
+                context=self.context_name,
+                client_configuration=configuration
+            )
+            if pool_maxsize:
+                configuration.connection_pool_maxsize = pool_maxsize
+            self.api_client = client.ApiClient(configuration)
 
             # 初始化各种API客户端
-            self.apps_api = client.AppsV1Api()
-            self.core_api = client.CoreV1Api()
-            self.autoscaling_api = client.AutoscalingV2Api()  # 使用V2版本以支持更多配置
+            self.apps_api = client.AppsV1Api(self.api_client)
+            self.core_api = client.CoreV1Api(self.api_client)
+            self.autoscaling_api = client.AutoscalingV2Api(self.api_client)  # 使用V2版本以支持更多配置
+            # 可选的本地缓存，挂载后读操作优先从缓存获取
+            self.informer = None
 
             logger.info(f"k8s -- 成功初始化K8s客户端，使用配置文件: {self.kube_config_path}")
             if self.context_name:
@@ -43,6 +54,27 @@ class K8sClient:
             logger.error(f"k8s -- 初始化K8s客户端失败: {str(e)}")
             raise
     
+    def close(self):
+        """关闭到apiserver的连接池"""
+        if self.informer:
+            self.informer.stop()
+        self.api_client.close()
+
+    def attach_informer(self, informer):
+        """
+        挂载本地缓存，之后的读操作从内存返回，写操作仍然直接调用API
+
+        Args:
+            informer: K8sInformer 实例
+        """
+        self.informer = informer
+
+    def _from_cache(self, kind: str, name: str, namespace: str):
+        """缓存已同步时从缓存读取对象，否则返回None"""
+        if self.informer and self.informer.has_synced(kind, namespace):
+            return self.informer.get(kind, namespace, name)
+        return None
+
     # 获取deployment信息
     def get_deployment(self, name: str, namespace: str = "default"):
         """
@@ -55,8 +87,12 @@ class K8sClient:
         Returns:
             V1Deployment: Deployment对象
         """
+        cached = self._from_cache("deployment", name, namespace)
+        if cached is not None:
+            return cached
         try:
-            return self.apps_api.read_namespaced_deployment(name=name, namespace=namespace)
+            with observe_call("k8s", "read_deployment"):
+                return self.apps_api.read_namespaced_deployment(name=name, namespace=namespace)
         except ApiException as e:
             logger.error(f"k8s -- 获取Deployment '{name}'失败: {str(e)}")
             raise
@@ -75,6 +111,20 @@ class K8sClient:
         try:
             deployment = self.get_deployment(deployment_name, namespace)
 
+            # 缓存中维护了就绪Pod数，不需要LIST全部Pod
+            counts = None
+            if self.informer and self.informer.has_synced("pod", namespace):
+                counts = self.informer.get_pod_counts(namespace, deployment_name)
+            if counts is not None:
+                return {
+                    "desired_replicas": deployment.spec.replicas,
+                    "current_replicas": deployment.status.replicas or 0,
+                    "available_replicas": deployment.status.available_replicas or 0,
+                    "ready_replicas": deployment.status.ready_replicas or 0,
+                    "total_pods": counts["total_pods"],
+                    "ready_pods": counts["ready_pods"]
+                }
+
             # 获取deployment的标签选择器
             label_selector = ""
             for key, value in deployment.spec.selector.match_labels.items():
@@ -158,7 +208,50 @@ class K8sClient:
             logger.error(f"k8s -- 获取Deployment '{deployment_name}'的节点亲和性配置失败: {str(e)}")
             raise
 
-    def set_nodegroup_affinity(self, deployment_name: str, nodegroup_key: str, nodegroup_values: str, namespace: str = "default"):
+    @staticmethod
+    def get_nodegroup_values(deployment, nodegroup_key: str) -> Optional[List[str]]:
+        """
+        从Deployment中提取节点组亲和性的取值
+
+        Args:
+            deployment: V1Deployment对象
+            nodegroup_key: 节点组标签键
+
+        Returns:
+            List[str]: 节点组取值，没有该亲和性返回None
+        """
+        affinity = deployment.spec.template.spec.affinity
+        if not affinity or not affinity.node_affinity:
+            return None
+        required = affinity.node_affinity.required_during_scheduling_ignored_during_execution
+        if not required or not required.node_selector_terms:
+            return None
+        for term in required.node_selector_terms:
+            for expr in term.match_expressions or []:
+                if expr.key == nodegroup_key and expr.operator == "In":
+                    return list(expr.values or [])
+        return None
+
+    @staticmethod
+    def has_only_nodegroup_affinity(deployment, nodegroup_key: str, nodegroup_values: str) -> bool:
+        """判断Deployment的亲和性是否已经与 set_nodegroup_affinity 设置的内容完全一致"""
+        affinity = deployment.spec.template.spec.affinity
+        if not affinity or not affinity.node_affinity or affinity.pod_affinity or affinity.pod_anti_affinity:
+            return False
+        node_affinity = affinity.node_affinity
+        if node_affinity.preferred_during_scheduling_ignored_during_execution:
+            return False
+        required = node_affinity.required_during_scheduling_ignored_during_execution
+        if not required or len(required.node_selector_terms or []) != 1:
+            return False
+        term = required.node_selector_terms[0]
+        if term.match_fields or len(term.match_expressions or []) != 1:
+            return False
+        expr = term.match_expressions[0]
+        return expr.key == nodegroup_key and expr.operator == "In" and list(expr.values or []) == [nodegroup_values]
+
+    def set_nodegroup_affinity(self, deployment_name: str, nodegroup_key: str, nodegroup_values: str, namespace: str = "default",
+                               deployment=None):
         """
         设置Deployment的节点组亲和性
 
@@ -166,11 +259,19 @@ class K8sClient:
             deployment_name: Deployment名称
             nodegroup_name: 节点组名称
             namespace: 命名空间，默认为'default'
+            deployment: 已读取的Deployment对象，传入时不再重新读取
 
         Returns:
             V1Deployment: 更新后的Deployment对象
         """
         try:
+            # 亲和性没有变化时不patch，避免触发Deployment滚动重启
+            if deployment is None:
+                deployment = self.get_deployment(deployment_name, namespace)
+            if self.has_only_nodegroup_affinity(deployment, nodegroup_key, nodegroup_values):
+                logger.info(f"k8s -- Deployment '{deployment_name}'节点组亲和性已是 {nodegroup_key}={nodegroup_values}，跳过更新")
+                return deployment
+
             # 创建nodeAffinity配置
             patch = {
                 "spec": {
@@ -211,18 +312,26 @@ class K8sClient:
             logger.error(f"k8s -- 为Deployment '{deployment_name}'设置节点组亲和性失败: {str(e)}")
             raise
             
-    def remove_node_affinity(self, deployment_name: str, namespace: str = "default"):
+    def remove_node_affinity(self, deployment_name: str, namespace: str = "default", deployment=None):
         """
         完全移除Deployment的节点亲和性配置
 
         Args:
             deployment_name: Deployment名称
             namespace: 命名空间，默认为'default'
+            deployment: 已读取的Deployment对象，传入时不再重新读取
 
         Returns:
             V1Deployment: 更新后的Deployment对象
         """
         try:
+            # 没有亲和性时不patch，避免触发Deployment滚动重启
+            if deployment is None:
+                deployment = self.get_deployment(deployment_name, namespace)
+            if not deployment.spec.template.spec.affinity:
+                logger.info(f"k8s -- Deployment '{deployment_name}'没有亲和性配置，跳过移除")
+                return deployment
+
             # 移除整个affinity
             patch = {
                 "spec": {
@@ -259,6 +368,9 @@ class K8sClient:
         Returns:
             V2HorizontalPodAutoscaler: HPA对象
         """
+        cached = self._from_cache("hpa", name, namespace)
+        if cached is not None:
+            return cached
         try:
             return self.autoscaling_api.read_namespaced_horizontal_pod_autoscaler(
                 name=name,
@@ -269,7 +381,8 @@ class K8sClient:
             raise
 
     def update_hpa_scaling(self, hpa_name: str, min_replicas: Optional[int] = None,
-                           max_replicas: Optional[int] = None, namespace: str = "default"):
+                           max_replicas: Optional[int] = None, namespace: str = "default",
+                           current: Optional[Dict[str, Any]] = None):
         """
         更新HPA的最小和最大副本数
 
@@ -278,21 +391,25 @@ class K8sClient:
             min_replicas: 最小副本数，None表示不更改
             max_replicas: 最大副本数，None表示不更改
             namespace: 命名空间，默认为'default'
+            current: 已读取的扩缩容配置(list_hpa_scaling_configs 的值)，传入时不再重新读取HPA
 
         Returns:
-            V2HorizontalPodAutoscaler: 更新后的HPA对象
+            V2HorizontalPodAutoscaler: 更新后的HPA对象，无需更改且传入了 current 时返回None
         """
         try:
             # 获取当前HPA
-            hpa = self.get_hpa(hpa_name, namespace)
+            hpa = None
+            if current is None:
+                hpa = self.get_hpa(hpa_name, namespace)
+                current = {"min_replicas": hpa.spec.min_replicas, "max_replicas": hpa.spec.max_replicas}
 
-            # 准备patch
+            # 准备patch，只包含与当前值不同的字段
             patch = {"spec": {}}
 
-            if min_replicas is not None:
+            if min_replicas is not None and current["min_replicas"] != min_replicas:
                 patch["spec"]["minReplicas"] = min_replicas
 
-            if max_replicas is not None:
+            if max_replicas is not None and current["max_replicas"] != max_replicas:
                 patch["spec"]["maxReplicas"] = max_replicas
 
             # 只有当有更改时才应用patch
@@ -304,15 +421,15 @@ class K8sClient:
                 )
 
                 changes = []
-                if min_replicas is not None:
+                if "minReplicas" in patch["spec"]:
                     changes.append(f"min_replicas={min_replicas}")
-                if max_replicas is not None:
+                if "maxReplicas" in patch["spec"]:
                     changes.append(f"max_replicas={max_replicas}")
 
                 logger.success(f"k8s -- 成功更新HPA '{hpa_name}': {', '.join(changes)}")
                 return updated_hpa
             else:
-                logger.warning(f"k8s -- 没有为HPA '{hpa_name}'提供任何更改")
+                logger.info(f"k8s -- HPA '{hpa_name}'配置已是目标值，跳过更新")
                 return hpa
         except ApiException as e:
             logger.error(f"k8s -- 更新HPA '{hpa_name}'失败: {str(e)}")
@@ -343,6 +460,48 @@ class K8sClient:
             raise
 
 
+    def list_hpa_scaling_configs(self, namespace: str = "default") -> Dict[str, Dict[str, Any]]:
+        """
+        一次性获取命名空间下所有HPA的扩缩容配置
+
+        Args:
+            namespace: 命名空间，默认为'default'
+
+        Returns:
+            Dict: 以HPA名称为键，值为包含min_replicas、max_replicas、current_replicas和metrics的字典
+        """
+        try:
+            if self.informer and self.informer.has_synced("hpa", namespace):
+                hpas = self.informer.list("hpa", namespace)
+            else:
+                with observe_call("k8s", "list_hpa"):
+                    hpas = self.autoscaling_api.list_namespaced_horizontal_pod_autoscaler(namespace=namespace).items
+
+            return {
+                hpa.metadata.name: {
+                    "min_replicas": hpa.spec.min_replicas,
+                    "max_replicas": hpa.spec.max_replicas,
+                    "current_replicas": hpa.status.current_replicas if hpa.status else None,
+                    "metrics": hpa.spec.metrics
+                }
+                for hpa in hpas
+            }
+        except ApiException as e:
+            logger.error(f"k8s -- 获取命名空间 '{namespace}' 的HPA列表失败: {str(e)}")
+            raise
+
+    def get_hpa_scaling_configs(self, namespaces: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        批量获取多个命名空间的HPA扩缩容配置，每个命名空间只调用一次API
+
+        Args:
+            namespaces: 命名空间列表
+
+        Returns:
+            Dict: {namespace: {hpa_name: {...}}}
+        """
+        return {namespace: self.list_hpa_scaling_configs(namespace) for namespace in set(namespaces)}
+
 if __name__ == '__main__':
     # 创建K8s客户端实例
     k8s_client = K8sClient(
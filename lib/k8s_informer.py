@@ -0,0 +1,223 @@
+# 基于 list + watch 的 HPA / Deployment / Pod 本地缓存
+import sys
+import os
+import time
+import threading
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+KIND_HPA = "hpa"
+KIND_DEPLOYMENT = "deployment"
+KIND_POD = "pod"
+
+
+def _is_pod_ready(pod):
+    """判断Pod是否就绪，与 K8sClient._is_pod_ready 保持一致"""
+    if pod.status is None or pod.status.phase != "Running":
+        return False
+    if not pod.status.container_statuses:
+        return False
+    return all(container.ready for container in pod.status.container_statuses)
+
+
+class K8sInformer:
+    """
+    K8s资源本地缓存
+
+    对每个命名空间的HPA、Deployment、Pod先LIST一次，再持续WATCH增量事件，
+    在内存中按 (命名空间, 名称) 建立索引，并随Pod变化维护每个Deployment的Pod数和就绪Pod数
+    """
+
+    def __init__(self, k8s_client, namespaces, watch_timeout=300):
+        """
+        初始化缓存
+
+        Args:
+            k8s_client (K8sClient): K8s客户端，用于LIST/WATCH
+            namespaces (list): 需要缓存的命名空间
+            watch_timeout (int): 单次WATCH的超时时间(秒)，超时后从上次的resourceVersion继续
+        """
+        self.k8s_client = k8s_client
+        self.namespaces = list(namespaces)
+        self.watch_timeout = watch_timeout
+
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        # kind -> {(namespace, name): object}
+        self._stores = {KIND_HPA: {}, KIND_DEPLOYMENT: {}, KIND_POD: {}}
+        # (namespace, deployment) -> {"total_pods": n, "ready_pods": m}
+        self._pod_counts = {}
+        # (kind, namespace) 已完成首次LIST
+        self._synced = set()
+
+    def _list_func(self, kind):
+        if kind == KIND_HPA:
+            return self.k8s_client.autoscaling_api.list_namespaced_horizontal_pod_autoscaler
+        if kind == KIND_DEPLOYMENT:
+            return self.k8s_client.apps_api.list_namespaced_deployment
+        return self.k8s_client.core_api.list_namespaced_pod
+
+    def start(self):
+        """为每个命名空间、每种资源启动一个WATCH线程"""
+        for namespace in self.namespaces:
+            for kind in (KIND_DEPLOYMENT, KIND_HPA, KIND_POD):
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(kind, namespace),
+                    name=f"informer-{kind}-{namespace}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"k8s informer -- 已启动，命名空间: {self.namespaces}")
+
+    def stop(self):
+        """停止所有WATCH线程"""
+        self._stop_event.set()
+
+    def has_synced(self, kind, namespace):
+        """指定命名空间的资源是否已完成首次LIST"""
+        return (kind, namespace) in self._synced
+
+    def wait_for_sync(self, timeout=30):
+        """等待所有资源完成首次LIST"""
+        deadline = time.time() + timeout
+        expected = len(self.namespaces) * 3
+        while len(self._synced) < expected and time.time() < deadline:
+            time.sleep(0.1)
+        return len(self._synced) >= expected
+
+    def _run(self, kind, namespace):
+        list_func = self._list_func(kind)
+        resource_version = None
+        while not self._stop_event.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._relist(kind, namespace, list_func)
+
+                stream = watch.Watch().stream(
+                    list_func,
+                    namespace=namespace,
+                    resource_version=resource_version,
+                    timeout_seconds=self.watch_timeout
+                )
+                for event in stream:
+                    if self._stop_event.is_set():
+                        break
+                    obj = event["object"]
+                    resource_version = obj.metadata.resource_version
+                    if event["type"] == "DELETED":
+                        self._delete(kind, namespace, obj)
+                    else:
+                        self._upsert(kind, namespace, obj)
+            except ApiException as e:
+                if e.status == 410:
+                    # resourceVersion过期，重新LIST
+                    logger.info(f"k8s informer -- {kind} {namespace} resourceVersion 已过期，重新LIST")
+                else:
+                    logger.error(f"k8s informer -- WATCH {kind} {namespace} 失败: {str(e)}")
+                    self._stop_event.wait(5)
+                resource_version = None
+            except Exception as e:
+                logger.error(f"k8s informer -- WATCH {kind} {namespace} 异常: {str(e)}")
+                resource_version = None
+                self._stop_event.wait(5)
+
+    def _relist(self, kind, namespace, list_func):
+        """全量LIST并替换该命名空间的缓存，返回列表的resourceVersion"""
+        result = list_func(namespace=namespace)
+        with self._lock:
+            store = self._stores[kind]
+            for key in [key for key in store if key[0] == namespace]:
+                del store[key]
+            for obj in result.items:
+                store[(namespace, obj.metadata.name)] = obj
+            if kind in (KIND_POD, KIND_DEPLOYMENT):
+                for key in [key for key in self._stores[KIND_DEPLOYMENT] if key[0] == namespace]:
+                    self._recount(*key)
+            self._synced.add((kind, namespace))
+        logger.info(f"k8s informer -- 已LIST {namespace} 中 {len(result.items)} 个 {kind}")
+        return result.metadata.resource_version
+
+    def _upsert(self, kind, namespace, obj):
+        key = (namespace, obj.metadata.name)
+        with self._lock:
+            old = self._stores[kind].get(key)
+            self._stores[kind][key] = obj
+            if kind == KIND_DEPLOYMENT:
+                self._recount(*key)
+            elif kind == KIND_POD:
+                self._recount_for_pod(namespace, old, obj)
+
+    def _delete(self, kind, namespace, obj):
+        key = (namespace, obj.metadata.name)
+        with self._lock:
+            old = self._stores[kind].pop(key, None)
+            if kind == KIND_DEPLOYMENT:
+                self._pod_counts.pop(key, None)
+            elif kind == KIND_POD:
+                self._recount_for_pod(namespace, old, None)
+
+    @staticmethod
+    def _selector(deployment):
+        selector = deployment.spec.selector
+        return (selector.match_labels or {}) if selector else {}
+
+    @staticmethod
+    def _matches(selector, pod):
+        if not selector or pod is None:
+            return False
+        labels = pod.metadata.labels or {}
+        return all(labels.get(key) == value for key, value in selector.items())
+
+    def _recount(self, namespace, deployment_name):
+        """根据缓存中的Pod重新计算某个Deployment的Pod数"""
+        deployment = self._stores[KIND_DEPLOYMENT].get((namespace, deployment_name))
+        if deployment is None:
+            return
+        selector = self._selector(deployment)
+        total = ready = 0
+        for (pod_namespace, _), pod in self._stores[KIND_POD].items():
+            if pod_namespace == namespace and self._matches(selector, pod):
+                total += 1
+                if _is_pod_ready(pod):
+                    ready += 1
+        self._pod_counts[(namespace, deployment_name)] = {"total_pods": total, "ready_pods": ready}
+
+    def _recount_for_pod(self, namespace, old_pod, new_pod):
+        """Pod变化时增量更新所属Deployment的计数"""
+        for (deploy_namespace, name), deployment in self._stores[KIND_DEPLOYMENT].items():
+            if deploy_namespace != namespace:
+                continue
+            selector = self._selector(deployment)
+            was_member = self._matches(selector, old_pod)
+            is_member = self._matches(selector, new_pod)
+            if not was_member and not is_member:
+                continue
+            counts = self._pod_counts.setdefault((namespace, name), {"total_pods": 0, "ready_pods": 0})
+            if was_member:
+                counts["total_pods"] -= 1
+                counts["ready_pods"] -= 1 if _is_pod_ready(old_pod) else 0
+            if is_member:
+                counts["total_pods"] += 1
+                counts["ready_pods"] += 1 if _is_pod_ready(new_pod) else 0
+
+    def get(self, kind, namespace, name):
+        """从缓存读取对象，未同步或不存在返回None"""
+        with self._lock:
+            return self._stores[kind].get((namespace, name))
+
+    def list(self, kind, namespace):
+        """从缓存读取命名空间下的所有对象"""
+        with self._lock:
+            return [obj for (obj_namespace, _), obj in self._stores[kind].items() if obj_namespace == namespace]
+
+    def get_pod_counts(self, namespace, deployment_name):
+        """获取Deployment的Pod数和就绪Pod数"""
+        with self._lock:
+            counts = self._pod_counts.get((namespace, deployment_name))
+            return dict(counts) if counts else None
@@ -0,0 +1,350 @@
+# 多副本部署时的主节点选举：只有持有租约的副本执行伸缩检查
+import sys
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+BACKEND_NONE = "none"
+BACKEND_KUBERNETES = "kubernetes"
+BACKEND_FILE = "file"
+
+
+class KubernetesLeaseLock:
+    """
+    基于 coordination.k8s.io/v1 Lease 的租约
+
+    通过 resourceVersion 乐观并发更新，多个副本同时抢占时只有一个能写入成功；
+    每次请求都带超时，apiserver 无响应时不会一直阻塞选举线程
+    """
+
+    def __init__(self, k8s_client, name, namespace, request_timeout=2):
+        from kubernetes import client
+        self.name = name
+        self.namespace = namespace
+        self.request_timeout = request_timeout
+        self.coordination_api = client.CoordinationV1Api(k8s_client.api_client)
+
+    def describe(self):
+        return f"Lease {self.namespace}/{self.name}"
+
+    def compare_and_swap(self, update):
+        """
+        读取租约并按 update 的结果写回
+
+        Args:
+            update (callable): 接收当前记录(不存在时为None)，返回新记录；返回None表示不写入
+
+        Returns:
+            bool: 是否写入成功(被其他副本抢先修改时为False)
+        """
+        from kubernetes import client
+        from kubernetes.client.rest import ApiException
+
+        try:
+            lease = self.coordination_api.read_namespaced_lease(
+                self.name, self.namespace, _request_timeout=self.request_timeout
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            lease = None
+
+        record = None
+        if lease is not None and lease.spec is not None:
+            spec = lease.spec
+            record = {
+                "holder": spec.holder_identity or "",
+                "lease_seconds": spec.lease_duration_seconds,
+                "acquire_time": spec.acquire_time.timestamp() if spec.acquire_time else None,
+                "renew_time": spec.renew_time.timestamp() if spec.renew_time else None,
+                "transitions": spec.lease_transitions or 0
+            }
+
+        new_record = update(record)
+        if new_record is None:
+            return False
+
+        spec = client.V1LeaseSpec(
+            holder_identity=new_record["holder"],
+            lease_duration_seconds=new_record["lease_seconds"],
+            acquire_time=_to_datetime(new_record["acquire_time"]),
+            renew_time=_to_datetime(new_record["renew_time"]),
+            lease_transitions=new_record["transitions"]
+        )
+        try:
+            if lease is None:
+                self.coordination_api.create_namespaced_lease(self.namespace, client.V1Lease(
+                    metadata=client.V1ObjectMeta(name=self.name, namespace=self.namespace),
+                    spec=spec
+                ), _request_timeout=self.request_timeout)
+            else:
+                lease.spec = spec
+                self.coordination_api.replace_namespaced_lease(
+                    self.name, self.namespace, lease, _request_timeout=self.request_timeout
+                )
+        except ApiException as e:
+            # 409: 读取之后被其他副本修改或创建
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+
+class FileLeaseLock:
+    """
+    基于本地文件的租约，供单机多进程测试使用
+
+    读改写在 flock 排他锁内完成，记录格式与 Lease 相同
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def describe(self):
+        return f"文件 {self.path}"
+
+    def compare_and_swap(self, update):
+        """与 KubernetesLeaseLock.compare_and_swap 相同"""
+        import fcntl
+
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read().strip()
+                new_record = update(json.loads(content) if content else None)
+                if new_record is None:
+                    return False
+                f.seek(0)
+                f.truncate()
+                json.dump(new_record, f)
+                f.flush()
+                return True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp is not None else None
+
+
+class LeaderElector:
+    """
+    租约选举
+
+    后台线程每 retry_seconds 尝试获取或续约；租约是否过期按本地观察到记录最后一次变化的时间判断，
+    不依赖各副本之间的时钟一致。主节点连续 renew_deadline 秒续约失败时主动退出，
+    正常关闭时释放租约，其他副本在下一次重试时即可接管
+    """
+
+    def __init__(self, lock, identity, lease_seconds=15, retry_seconds=5, on_started_leading=None):
+        """
+        初始化
+
+        Args:
+            lock: KubernetesLeaseLock 或 FileLeaseLock
+            identity (str): 本副本的标识
+            lease_seconds (int): 租约时长(秒)，主节点异常退出后最长约 lease_seconds + retry_seconds 完成切换
+            retry_seconds (int): 获取或续约的间隔(秒)
+            on_started_leading (callable): 获取租约后、开始执行伸缩检查前在选举线程中调用
+        """
+        self.lock = lock
+        self.identity = identity
+        self.lease_seconds = lease_seconds
+        self.retry_seconds = retry_seconds
+        self.renew_deadline = max(retry_seconds, lease_seconds - retry_seconds)
+        self.on_started_leading = on_started_leading
+
+        self._leading = False
+        self._renewed_at = None
+        self._observed = None
+        self._observed_at = None
+        self.holder = None
+        self.leader_since = None
+        self.transitions = 0
+        self.last_failover_seconds = None
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台选举线程"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+        logger.info(f"leader -- 开始选举，标识 {self.identity}，租约 {self.lock.describe()}，时长 {self.lease_seconds} 秒")
+
+    def stop(self):
+        """停止选举，主节点释放租约"""
+        self._stop_event.set()
+        if self._leading:
+            try:
+                self.lock.compare_and_swap(self._release)
+                logger.info("leader -- 已释放租约")
+            except Exception as e:
+                logger.error(f"leader -- 释放租约失败: {str(e)}")
+            self._set_leading(False)
+
+    def is_leader(self):
+        """
+        是否为主节点
+
+        除了选举线程的状态，还要求最近一次续约在 renew_deadline 之内：
+        续约请求卡住时选举线程来不及退出主节点，这里按时间判断，避免与接管的副本同时执行伸缩
+        """
+        renewed_at = self._renewed_at
+        return self._leading and renewed_at is not None and time.monotonic() - renewed_at < self.renew_deadline
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.try_acquire_or_renew()
+            self._stop_event.wait(self.retry_seconds)
+
+    def try_acquire_or_renew(self):
+        """尝试获取或续约一次"""
+        # 按发起请求前的时间计算续约时刻，请求本身的耗时不延长主节点的有效期
+        attempt_at = time.monotonic()
+        try:
+            acquired = self.lock.compare_and_swap(self._update)
+            self.last_error = None
+        except Exception as e:
+            acquired = False
+            self.last_error = str(e)
+            logger.error(f"leader -- 读取或更新租约失败: {str(e)}")
+
+        if acquired:
+            self._renewed_at = attempt_at
+            if not self._leading and self.on_started_leading is not None:
+                # 在开始执行伸缩检查之前完成
+                try:
+                    self.on_started_leading()
+                except Exception as e:
+                    logger.error(f"leader -- 成为主节点前的初始化失败: {str(e)}")
+            self._set_leading(True)
+        elif self._leading and time.monotonic() - self._renewed_at >= self.renew_deadline:
+            logger.warning(f"leader -- {self.renew_deadline} 秒内未能续约，退出主节点")
+            self._set_leading(False)
+        return acquired
+
+    def _update(self, record):
+        """根据当前记录决定是否写入，返回None表示租约仍被其他副本持有"""
+        now = time.time()
+        monotonic = time.monotonic()
+        observed = (record["holder"], record["renew_time"]) if record else None
+        if observed != self._observed:
+            self._observed = observed
+            self._observed_at = monotonic
+
+        holder = record["holder"] if record else ""
+        self.holder = holder or None
+        if holder and holder != self.identity:
+            lease_seconds = record["lease_seconds"] or self.lease_seconds
+            if monotonic - self._observed_at < lease_seconds:
+                return None
+            logger.warning(f"leader -- {holder} 的租约已 {monotonic - self._observed_at:.1f} 秒未续约，尝试接管")
+
+        if holder == self.identity:
+            return dict(record, renew_time=now, lease_seconds=self.lease_seconds)
+
+        # 从其他副本接管或租约为空: 记录从上一任最后一次续约到本次接管的时间
+        if holder:
+            self.last_failover_seconds = round(monotonic - self._observed_at, 2)
+        return {
+            "holder": self.identity,
+            "lease_seconds": self.lease_seconds,
+            "acquire_time": now,
+            "renew_time": now,
+            "transitions": (record["transitions"] if record else 0) + 1
+        }
+
+    def _release(self, record):
+        if not record or record["holder"] != self.identity:
+            return None
+        return dict(record, holder="", renew_time=time.time())
+
+    def _set_leading(self, leading):
+        with self._lock:
+            if leading == self._leading:
+                return
+            self._leading = leading
+            self.transitions += 1
+            if leading:
+                self.holder = self.identity
+                self.leader_since = time.time()
+                logger.info(f"leader -- {self.identity} 成为主节点，开始执行伸缩检查")
+            else:
+                self.leader_since = None
+                logger.warning(f"leader -- {self.identity} 不再是主节点，停止执行伸缩检查")
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "identity": self.identity,
+            "lock": self.lock.describe(),
+            "is_leader": self.is_leader(),
+            "holder": self.holder,
+            "leader_since": self.leader_since,
+            "lease_seconds": self.lease_seconds,
+            "retry_seconds": self.retry_seconds,
+            "renew_deadline_seconds": self.renew_deadline,
+            # 主节点异常退出时的最长切换时间
+            "max_failover_seconds": self.lease_seconds + self.retry_seconds,
+            "last_failover_seconds": self.last_failover_seconds,
+            "transitions": self.transitions,
+            "last_error": self.last_error
+        }
+
+
+_elector = None
+
+
+def start_leader_elector(conf=None):
+    """
+    根据 leader_election 配置创建并启动选举，为 none 时不启动
+
+    Returns:
+        LeaderElector|None
+    """
+    global _elector
+    if conf is None:
+        from conf import settings as conf
+    if conf.LEADER_ELECTION == BACKEND_NONE:
+        return None
+    if conf.LEADER_ELECTION == BACKEND_KUBERNETES:
+        from lib.clients import get_client_registry
+        # 单次请求的超时短于重试间隔，卡住的请求不会拖过下一次续约
+        lock = KubernetesLeaseLock(
+            get_client_registry().k8s_client(), conf.LEADER_LEASE_NAME, conf.LEADER_LEASE_NAMESPACE,
+            request_timeout=max(1, conf.LEADER_RETRY_SECONDS / 2)
+        )
+    elif conf.LEADER_ELECTION == BACKEND_FILE:
+        lock = FileLeaseLock(conf.LEADER_LOCK_FILE)
+    else:
+        raise ValueError(f"不支持的 leader_election: {conf.LEADER_ELECTION}")
+
+    from lib.capacity_matrix import reload_loaded_capacity_matrices
+    # 作为备节点期间容量配置可能已在主节点上修改，接管时重新加载已使用的容量矩阵
+    _elector = LeaderElector(
+        lock, conf.LEADER_IDENTITY, conf.LEADER_LEASE_SECONDS, conf.LEADER_RETRY_SECONDS,
+        on_started_leading=reload_loaded_capacity_matrices
+    )
+    _elector.start()
+    return _elector
+
+
+def get_leader_elector():
+    """获取已启动的选举，未开启时返回None"""
+    return _elector
+
+
+def is_leader():
+    """本副本是否应执行伸缩检查，未开启选举时总是True"""
+    return _elector is None or _elector.is_leader()
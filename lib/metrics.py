@@ -0,0 +1,229 @@
+# Prometheus 文本格式的进程内指标
+import sys
+import os
+import time
+import threading
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 外部调用和检查阶段耗时的默认分桶(秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类，按标签值保存各序列"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def _render_series(self, key, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, value["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(round(value['sum'], 6))}")
+        lines.append(f"{self.name}_count{labels} {value['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标集合，按注册顺序输出"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+EXTERNAL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "autoscaler_external_call_seconds", "外部调用耗时(GA、RDS、ElastiCache、EKS、Kubernetes)", ["source", "operation"]
+))
+EXTERNAL_CALL_ERRORS = REGISTRY.register(Counter(
+    "autoscaler_external_call_errors_total", "外部调用失败次数", ["source", "operation"]
+))
+CYCLE_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "autoscaler_cycle_stage_seconds", "check_and_scale 各阶段耗时", ["cluster", "stage"]
+))
+CYCLE_SECONDS = REGISTRY.register(Histogram(
+    "autoscaler_cycle_seconds", "check_and_scale 总耗时", ["cluster"]
+))
+CYCLE_STAGE_OVERRUNS = REGISTRY.register(Counter(
+    "autoscaler_cycle_stage_overruns_total", "阶段耗时超出预算的次数", ["cluster", "stage"]
+))
+CYCLE_STAGE_DEFERRED = REGISTRY.register(Counter(
+    "autoscaler_cycle_stage_deferred_total", "总预算用完后推迟到下一个周期的阶段次数", ["cluster", "stage"]
+))
+SCALING_DECISIONS = REGISTRY.register(Counter(
+    "autoscaler_scaling_decisions_total", "伸缩判断结果次数(upgrade、downgrade-notify、noop、cooldown)", ["cluster", "outcome"]
+))
+CURRENT_USERS = REGISTRY.register(Gauge(
+    "autoscaler_current_users", "最近一次检查的在线人数(过滤前)", ["cluster"]
+))
+CURRENT_LEVEL = REGISTRY.register(Gauge(
+    "autoscaler_current_level", "线上配置对应的容量级别(人数)", ["cluster"]
+))
+TARGET_LEVEL = REGISTRY.register(Gauge(
+    "autoscaler_target_level", "用于决策的人数对应的目标容量级别(人数)", ["cluster"]
+))
+SCHEDULER_LAG_SECONDS = REGISTRY.register(Gauge(
+    "autoscaler_scheduler_lag_seconds", "最近一次检查相对计划时间的延迟", ["cluster"]
+))
+SCHEDULER_SKIPPED = REGISTRY.register(Counter(
+    "autoscaler_scheduler_skipped_total", "上一次检查未结束而跳过或错过的检查次数", ["cluster", "reason"]
+))
+
+OUTCOME_UPGRADE = "upgrade"
+OUTCOME_DOWNGRADE_NOTIFY = "downgrade-notify"
+OUTCOME_NOOP = "noop"
+OUTCOME_COOLDOWN = "cooldown"
+
+
+def cluster_label(name):
+    """单集群模式下 cluster 标签为 default"""
+    return name or "default"
+
+
+@contextmanager
+def observe_call(source, operation):
+    """记录一次外部调用的耗时，抛出异常时同时计入失败次数"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_CALL_ERRORS.inc(source=source, operation=operation)
+        raise
+    finally:
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start, source=source, operation=operation)
+
+
+def instrument_boto3_session(session):
+    """
+    通过botocore事件记录该会话创建的所有AWS客户端的调用耗时和失败
+
+    必须在会话创建客户端之前调用
+    """
+    def before_call(model, context, **kwargs):
+        context["metrics_operation"] = (model.service_model.service_name, model.name)
+        context["metrics_start"] = time.perf_counter()
+
+    def finish(context, failed):
+        if "metrics_start" not in context:
+            return
+        source, operation = context.pop("metrics_operation")
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - context.pop("metrics_start"), source=source, operation=operation)
+        if failed:
+            EXTERNAL_CALL_ERRORS.inc(source=source, operation=operation)
+
+    def after_call(http_response, context, **kwargs):
+        finish(context, http_response.status_code >= 300)
+
+    def after_call_error(context, **kwargs):
+        finish(context, True)
+
+    session.events.register("before-call", before_call)
+    session.events.register("after-call", after_call)
+    session.events.register("after-call-error", after_call_error)
+    return session
+
+
+def render():
+    return REGISTRY.render()
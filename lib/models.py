@@ -59,3 +59,17 @@ class PostgresConfig(BaseModel):
     
     def __str__(self):
         return f"PostgresConfig(instance_type={self.instance_type}, cpu={self.cpu}, memory={self.memory_gb}GB)"
+
+
+def create_database(conf):
+    """
+    集群配置对应的MySQL连接
+
+    Returns:
+        MySQLDatabase|None: 与全局配置使用同一个库时返回None(即使用 db)
+    """
+    params = (conf.MYSQL_HOST, conf.MYSQL_PORT, conf.MYSQL_DB, conf.MYSQL_USER, conf.MYSQL_PWD)
+    if params == (settings.MYSQL_HOST, settings.MYSQL_PORT, settings.MYSQL_DB, settings.MYSQL_USER, settings.MYSQL_PWD):
+        return None
+    return pw.MySQLDatabase(conf.MYSQL_DB, user=conf.MYSQL_USER, password=conf.MYSQL_PWD,
+                            host=conf.MYSQL_HOST, port=conf.MYSQL_PORT)
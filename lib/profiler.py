@@ -0,0 +1,245 @@
+# 按需开启的CPU剖析(cProfile)和内存分配快照(tracemalloc)
+import sys
+import os
+import io
+import time
+import uuid
+import marshal
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+# 内存中最多保留的剖析报告数
+MAX_REPORTS = 10
+
+
+class ProfileReport:
+    """一次剖析的结果，可以导出为文本或 pstats 二进制文件"""
+
+    def __init__(self, kind, runs):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.runs = runs
+        self.completed_runs = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.stats = None
+
+    def add(self, profile):
+        """合并一次运行的剖析数据"""
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+        self.completed_runs += 1
+        if self.completed_runs >= self.runs:
+            self.finished_at = time.time()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def text(self, sort="cumulative", limit=50):
+        """按 sort 排序的前 limit 个函数"""
+        if self.stats is None:
+            return "尚未采集到数据\n"
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.add(self.stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def pstats_bytes(self):
+        """与 pstats.Stats.dump_stats 相同格式的二进制内容，可以用 python -m pstats 或 snakeviz 打开"""
+        return marshal.dumps(self.stats.stats) if self.stats is not None else b""
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "runs": self.runs,
+            "completed_runs": self.completed_runs,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+class CycleProfiler:
+    """
+    伸缩检查剖析器
+
+    arm(N) 之后接下来的 N 次 check_and_scale 在 cProfile 下执行并合并为一份报告；
+    未开启时 profile() 只做一次属性判断。cProfile 只记录调度线程，线程池中的读取和执行
+    在报告中表现为等待 Future 的时间
+    """
+
+    def __init__(self, max_reports=MAX_REPORTS):
+        self.max_reports = max_reports
+        self.reports = OrderedDict()
+        self._active = None
+        self._lock = threading.Lock()
+        # 同一时刻只能有一个 cProfile 在运行
+        self._profile_lock = threading.Lock()
+
+    def arm(self, runs):
+        """剖析接下来的 runs 次检查，返回报告"""
+        with self._lock:
+            report = ProfileReport("cycle", runs)
+            self._active = report
+            self._store(report)
+        logger.info(f"profiler -- 将剖析接下来的 {runs} 次检查，报告 {report.id}")
+        return report
+
+    def _store(self, report):
+        self.reports[report.id] = report
+        while len(self.reports) > self.max_reports:
+            self.reports.popitem(last=False)
+
+    @contextmanager
+    def profile(self):
+        """包裹一次检查，已开启剖析时在 cProfile 下执行"""
+        report = self._active
+        if report is None or not self._profile_lock.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                with self._lock:
+                    report.add(profile)
+                    if report.finished and self._active is report:
+                        self._active = None
+                        logger.info(f"profiler -- 报告 {report.id} 已完成")
+        finally:
+            self._profile_lock.release()
+
+    def profile_call(self, kind, func, *args, **kwargs):
+        """
+        在 cProfile 下执行一次 func
+
+        Returns:
+            tuple: (报告, func 的返回值)
+        """
+        report = ProfileReport(kind, 1)
+        profile = cProfile.Profile()
+        with self._profile_lock:
+            profile.enable()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profile.disable()
+        with self._lock:
+            report.add(profile)
+            self._store(report)
+        return report, result
+
+    def get(self, report_id):
+        return self.reports.get(report_id)
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": self._active.summary() if self._active else None,
+                "reports": [report.summary() for report in reversed(self.reports.values())]
+            }
+
+
+class MemoryTracker:
+    """
+    tracemalloc 内存分配快照
+
+    start 之后才开始记录分配(有额外的内存和CPU开销)，snapshot 与上一次快照比较，
+    返回增长最多的分配位置
+    """
+
+    def __init__(self):
+        self.baseline = None
+        self.baseline_at = None
+        self._lock = threading.Lock()
+
+    def start(self, frames=10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info(f"profiler -- 已开启 tracemalloc，记录 {frames} 层调用栈")
+        with self._lock:
+            self.baseline = self._take_snapshot()
+            self.baseline_at = time.time()
+
+    def stop(self):
+        with self._lock:
+            self.baseline = None
+            self.baseline_at = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("profiler -- 已关闭 tracemalloc")
+
+    def is_tracing(self):
+        return tracemalloc.is_tracing()
+
+    @staticmethod
+    def _take_snapshot():
+        """排除 tracemalloc 自身和导入机制的分配"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def snapshot(self, limit=30, key_type="lineno"):
+        """
+        与上一次快照比较，并把本次快照作为下一次比较的基准
+
+        Returns:
+            str: 文本报告
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc 未开启")
+        snapshot = self._take_snapshot()
+        now = time.time()
+        with self._lock:
+            baseline, baseline_at = self.baseline, self.baseline_at
+            self.baseline, self.baseline_at = snapshot, now
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"tracemalloc 当前 {current / 1024 / 1024:.2f} MiB，峰值 {peak / 1024 / 1024:.2f} MiB",
+            f"与 {now - baseline_at:.0f} 秒前的快照相比，增长最多的 {limit} 处分配:",
+            ""
+        ]
+        for stat in snapshot.compare_to(baseline, key_type)[:limit]:
+            lines.append(str(stat))
+            if key_type == "traceback":
+                lines.extend(f"    {line}" for line in stat.traceback.format())
+        return "\n".join(lines) + "\n"
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "baseline_at": self.baseline_at,
+            "traced_bytes": current,
+            "peak_bytes": peak
+        }
+
+
+_cycle_profiler = CycleProfiler()
+_memory_tracker = MemoryTracker()
+
+
+def get_cycle_profiler():
+    """进程内共享的剖析器"""
+    return _cycle_profiler
+
+
+def get_memory_tracker():
+    """进程内共享的内存快照"""
+    return _memory_tracker
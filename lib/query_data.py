@@ -1,61 +1,81 @@
-import peewee as pw
-from playhouse.shortcuts import model_to_dict
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from lib.logger import app_logger as logger
-from conf import settings
-import pymysql
-pymysql.install_as_MySQLdb()
-# 数据库连接
-db = pw.MySQLDatabase(settings.MYSQL_DB, user=settings.MYSQL_USER, password=settings.MYSQL_PWD, 
-                       host=settings.MYSQL_HOST, port=settings.MYSQL_PORT)
-
-# 基础模型类
-class BaseModel(pw.Model):
-    class Meta:
-        database = db
-
-# 容量级别模型
-class CapacityLevel(BaseModel):
-    user_capacity = pw.IntegerField(unique=True, null=False)
-    
-    def __str__(self):
-        return f"CapacityLevel(user_capacity={self.user_capacity})"
-
-# 服务配置模型 - 增加了namespace, hpa_name和pool_name字段
-class ServiceConfig(BaseModel):
-    capacity_level = pw.ForeignKeyField(CapacityLevel, backref='services', on_delete='CASCADE')
-    service_name = pw.CharField(max_length=50, null=False)
-    namespace = pw.CharField(max_length=50, default='default')
-    replicas = pw.IntegerField(null=False)
-    hpa_name = pw.CharField(max_length=100, null=True)  # 新增HPA名称字段
-    pool_name = pw.CharField(max_length=50, null=True)  # 新增节点亲和性pool_name字段
-    
-    class Meta:
-        indexes = (
-            (('capacity_level', 'service_name', 'namespace'), True),
+from lib.models import db
+from lib.capacity_matrix import get_capacity_matrix
+
+
+class ScalingConfigManager:
+    """伸缩配置查询接口，所有查询都基于内存中的容量矩阵快照，不访问数据库"""
+
+    def __init__(self, matrix_key=None, database=None, matrix=None):
+        """
+        初始化
+
+        Args:
+            matrix_key (str): 容量矩阵键，多集群模式下为集群名称
+            database (MySQLDatabase): 集群单独使用的数据库，为None时使用 lib.models.db
+            matrix (CapacityMatrix): 固定使用的容量矩阵(回放录像、基准测试)，不访问数据库
+        """
+        self.matrix_key = matrix_key
+        self.database = database
+        self._matrix = matrix
+
+    @property
+    def matrix(self):
+        """当前的容量矩阵快照，配置被修改后会自动替换"""
+        if self._matrix is not None:
+            return self._matrix
+        return get_capacity_matrix(self.matrix_key, self.database)
+
+    def get_target_level(self, user_count):
+        """获取满足用户数的最小容量级别"""
+        return self.matrix.get_target_level(user_count)
+
+    def get_complete_config(self, user_count):
+        """获取满足用户数的级别的完整配置"""
+        return self.matrix.get_complete_config(user_count)
+
+    def determine_capacity_level(self, hpa_name, namespace, service_name, redis_instance_type,
+                                 postgres_instance_type, replicas):
+        """
+        根据参考服务HPA最小副本数以及DB配置判断当前级别
+
+        Args:
+            hpa_name (str): 参考服务的HPA名称
+            namespace (str): 命名空间
+            service_name (str): 参考服务名称
+            redis_instance_type (str): 当前Redis节点类型
+            postgres_instance_type (str): 当前Postgres最高实例类型
+            replicas (int): 参考服务HPA当前最小副本数
+
+        Returns:
+            LevelEntry|None: 当前级别
+        """
+        level = self.matrix.determine_capacity_level(
+            namespace=namespace,
+            service_name=service_name,
+            replicas=replicas,
+            redis_instance_type=redis_instance_type,
+            postgres_instance_type=postgres_instance_type
         )
-    
-    def __str__(self):
-        return f"ServiceConfig(namespace={self.namespace}, service={self.service_name}, replicas={self.replicas})"
-
-# Redis配置模型
-class RedisConfig(BaseModel):
-    capacity_level = pw.ForeignKeyField(CapacityLevel, backref='redis_config', on_delete='CASCADE')
-    instance_type = pw.CharField(max_length=50, null=True)
-    memory_gb = pw.FloatField(null=True)
-    bandwidth_gb = pw.FloatField(null=True)
-    
-    def __str__(self):
-        return f"RedisConfig(instance_type={self.instance_type}, memory={self.memory_gb}GB)"
-
-# Postgres配置模型
-class PostgresConfig(BaseModel):
-    capacity_level = pw.ForeignKeyField(CapacityLevel, backref='postgres_config', on_delete='CASCADE')
-    instance_type = pw.CharField(max_length=50, null=True)
-    cpu = pw.IntegerField(null=True)
-    memory_gb = pw.IntegerField(null=True)
-    
-    def __str__(self):
-        return f"PostgresConfig(instance_type={self.instance_type}, cpu={self.cpu}, memory={self.memory_gb}GB)"
+        if not level:
+            logger.error(f"无法根据 {namespace}/{hpa_name} 副本数 {replicas} 判断当前级别")
+        return level
+
+    def get_user_capacity_by_postgres_instance_type(self, instance_type):
+        """获取Postgres实例类型对应的容量人数"""
+        return self.matrix.get_user_capacity_by_postgres_instance_type(instance_type)
+
+    def get_user_capacity_by_redis_instance_type(self, instance_type):
+        """获取Redis实例类型对应的容量人数"""
+        return self.matrix.get_user_capacity_by_redis_instance_type(instance_type)
+
+    def close(self):
+        """关闭数据库连接"""
+        if self._matrix is not None:
+            return
+        database = self.database if self.database is not None else db
+        if not database.is_closed():
+            database.close()
@@ -0,0 +1,158 @@
+# 对比目标配置与线上状态，只执行有差异的变更
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.actuator import build_actions, observed_key, ACTION_HPA_MIN, ACTION_SET_AFFINITY, NODEGROUP_KEY
+
+
+class Reconciler:
+    """
+    差异化协调器
+
+    根据容量配置生成目标状态，与线上HPA/Deployment对比后只保留需要变更的项，
+    已经是目标值的HPA和亲和性不会被patch，避免无意义的Deployment滚动重启
+    """
+
+    def __init__(self, k8s_client, actuation_engine, read_executor=None):
+        """
+        初始化协调器
+
+        Args:
+            k8s_client (K8sClient): K8s客户端
+            actuation_engine (ActuationEngine): 并发执行器
+            read_executor (ThreadPoolExecutor): 没有周期上下文时并发读取Deployment的线程池，为None时逐个读取
+        """
+        self.k8s_client = k8s_client
+        self.actuation_engine = actuation_engine
+        self.read_executor = read_executor
+
+    def _read_deployments(self, targets, ctx=None):
+        """
+        并发读取多个Deployment
+
+        Args:
+            targets (list): [(命名空间, 名称)]
+            ctx (CycleContext): 伸缩周期上下文，传入时通过 ctx.gather 在注册表的读取线程池中读取并写入本周期缓存
+
+        Returns:
+            tuple: ({(命名空间, 名称): Deployment}, {(命名空间, 名称): 错误信息})
+        """
+        targets = list(dict.fromkeys(targets))
+        if ctx is not None:
+            names = {f"k8s:{namespace}/{name}": (namespace, name) for namespace, name in targets}
+            results, errors = ctx.gather(
+                {key: (lambda namespace=namespace, name=name: ctx.deployment(name, namespace)) for key, (namespace, name) in names.items()},
+                keys={key: ("deployment", namespace, name) for key, (namespace, name) in names.items()},
+                sources={key: "k8s" for key in names}
+            )
+            return ({names[key]: value for key, value in results.items()},
+                    {names[key]: str(error) for key, error in errors.items()})
+
+        deployments = {}
+        errors = {}
+        futures = None
+        if self.read_executor is not None and len(targets) > 1:
+            futures = {(namespace, name): self.read_executor.submit(self.k8s_client.get_deployment, name, namespace)
+                       for namespace, name in targets}
+        for namespace, name in targets:
+            try:
+                if futures is not None:
+                    deployments[(namespace, name)] = futures[(namespace, name)].result()
+                else:
+                    deployments[(namespace, name)] = self.k8s_client.get_deployment(name, namespace)
+            except Exception as e:
+                errors[(namespace, name)] = str(e)
+        return deployments, errors
+
+    def plan(self, complete_config, remove_affinity=False, ctx=None):
+        """
+        生成变更计划(不执行)
+
+        Args:
+            complete_config (dict): 目标级别的完整配置
+            remove_affinity (bool): 为True时目标状态为移除节点亲和性
+            ctx (CycleContext): 伸缩周期上下文，传入时复用本周期内已读取的HPA/Deployment
+
+        Returns:
+            dict: {"changes": 需要执行的动作列表(含 current 当前值，读取失败时含 read_error), "unchanged": 已是目标值的动作列表,
+                   "observed": {observed_key(动作): 读取到的HPA配置或Deployment}}
+        """
+        desired = build_actions(complete_config, remove_affinity=remove_affinity)
+
+        read_hpa_configs = ctx.hpa_configs if ctx else self.k8s_client.list_hpa_scaling_configs
+
+        # 按命名空间读取HPA列表，某个命名空间读取失败只影响该命名空间的HPA动作
+        hpa_configs = {}
+        hpa_errors = {}
+        for namespace in dict.fromkeys(action["namespace"] for action in desired if action["kind"] == ACTION_HPA_MIN):
+            try:
+                hpa_configs[namespace] = read_hpa_configs(namespace)
+            except Exception as e:
+                logger.error(f"reconciler -- 读取命名空间 {namespace} 的HPA列表失败: {str(e)}")
+                hpa_errors[namespace] = str(e)
+
+        # 需要对比亲和性的Deployment并发读取，读取失败的按需要变更处理
+        deployments, deployment_errors = self._read_deployments(
+            [(action["namespace"], action["name"]) for action in desired if action["kind"] != ACTION_HPA_MIN], ctx=ctx
+        )
+
+        changes = []
+        unchanged = []
+        # 计划阶段读取到的HPA配置和Deployment，执行时直接使用，不再重复读取
+        observed = {}
+        for action in desired:
+            namespace = action["namespace"]
+            error = None
+            try:
+                if action["kind"] == ACTION_HPA_MIN:
+                    # 所在命名空间的HPA列表读取失败时当前值未知，按需要变更处理，执行时再单独读取
+                    error = hpa_errors.get(namespace)
+                    hpa = hpa_configs.get(namespace, {}).get(action["name"])
+                    current = hpa["min_replicas"] if hpa else None
+                    is_same = current == action["value"]
+                    if hpa:
+                        observed[observed_key(action)] = hpa
+                else:
+                    if (namespace, action["name"]) in deployment_errors:
+                        raise RuntimeError(deployment_errors[(namespace, action["name"])])
+                    deployment = deployments[(namespace, action["name"])]
+                    observed[observed_key(action)] = deployment
+                    current = self.k8s_client.get_nodegroup_values(deployment, NODEGROUP_KEY)
+                    if action["kind"] == ACTION_SET_AFFINITY:
+                        is_same = self.k8s_client.has_only_nodegroup_affinity(deployment, NODEGROUP_KEY, action["value"])
+                    else:
+                        is_same = not deployment.spec.template.spec.affinity
+            except Exception as e:
+                logger.error(f"reconciler -- 读取 {namespace}/{action['name']} 当前状态失败: {str(e)}")
+                current = None
+                is_same = False
+                error = str(e)
+
+            item = dict(action, current=current)
+            if error:
+                item["read_error"] = error
+            if is_same:
+                unchanged.append(item)
+            else:
+                changes.append(item)
+
+        logger.info(f"reconciler -- 变更计划: 需要变更 {len(changes)} 项，无需变更 {len(unchanged)} 项")
+        return {"changes": changes, "unchanged": unchanged, "observed": observed}
+
+    def apply(self, plan, timeout=None):
+        """
+        执行变更计划中的差异项
+
+        Args:
+            timeout (float): 执行超时(秒)，为None时等待全部完成
+
+        Returns:
+            dict: ActuationEngine.run 的执行报告
+        """
+        return self.actuation_engine.run(self.k8s_client, plan["changes"], timeout=timeout, observed=plan.get("observed"))
+
+    def reconcile(self, complete_config, remove_affinity=False, ctx=None, timeout=None):
+        """生成计划并执行，返回 (plan, report)"""
+        plan = self.plan(complete_config, remove_affinity=remove_affinity, ctx=ctx)
+        return plan, self.apply(plan, timeout=timeout)
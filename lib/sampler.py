@@ -0,0 +1,322 @@
+# 高频在线人数采样：与伸缩周期解耦，按GA配额自动退避
+import sys
+import os
+import time
+import threading
+from collections import deque
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.clock import WallClock
+
+
+# 配额项 -> 配额窗口(秒)
+QUOTA_WINDOWS = {"tokens_per_hour": 3600, "tokens_per_project_per_hour": 3600, "tokens_per_day": 86400}
+
+
+class SignalBuffer:
+    """
+    进程内共享的在线人数样本缓冲
+
+    采样线程写入，伸缩周期和 /api/status 读取，只保留最近 maxlen 个样本；
+    样本时间戳来自 clock(默认系统时间)
+    """
+
+    def __init__(self, maxlen=1000, clock=None):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.clock = clock or WallClock()
+
+    def append(self, value, timestamp=None):
+        timestamp = self.clock.time() if timestamp is None else timestamp
+        with self._lock:
+            self._samples.append((timestamp, value))
+        return timestamp, value
+
+    def latest(self):
+        """最新样本 (ts, value)，没有样本时返回None"""
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def since(self, timestamp):
+        """时间戳晚于 timestamp 的所有样本，按时间递增"""
+        with self._lock:
+            samples = list(self._samples)
+        return [sample for sample in samples if timestamp is None or sample[0] > timestamp]
+
+    def age(self):
+        """最新样本距今的秒数，没有样本时返回None"""
+        latest = self.latest()
+        return self.clock.time() - latest[0] if latest else None
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class UserSampler:
+    """
+    在线人数采样器
+
+    后台线程按 interval 查询GA实时在线人数写入 SignalBuffer 和时序存储；
+    根据响应中的配额剩余量计算可持续的最小间隔，配额紧张或查询失败时自动拉长间隔；
+    间隔按缓冲的时钟计算，跟随虚拟时间时真实等待时间按倍速缩短
+    """
+
+    def __init__(self, source, buffer, history=None, interval=20, max_interval=300, quota_reserve=0.2):
+        """
+        初始化采样器
+
+        Args:
+            source (ActiveUserSource): GA在线人数数据源
+            buffer (SignalBuffer): 样本缓冲
+            history (TimeSeriesStore): 时序存储，为None时不持久化
+            interval (int): 正常采样间隔(秒)
+            max_interval (int): 退避后的最大间隔(秒)
+            quota_reserve (float): 配额预留比例，剩余配额只按 (1 - quota_reserve) 规划
+        """
+        self.source = source
+        self.buffer = buffer
+        self.history = history
+        self.interval = interval
+        self.max_interval = max_interval
+        self.quota_reserve = quota_reserve
+
+        self.current_interval = interval
+        self.consecutive_errors = 0
+        self.backoff_reason = None
+
+        self._sample_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    def start(self, loop=None):
+        """
+        启动采样
+
+        Args:
+            loop (SamplingLoop): 多集群共用的采样调度，为None时单独启动一个后台线程
+        """
+        if loop is not None:
+            self._loop = loop
+            loop.add(self)
+            logger.info(f"sampler -- 在线人数采样已加入共用调度，间隔 {self.interval} 秒")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="user-sampler", daemon=True)
+        self._thread.start()
+        logger.info(f"sampler -- 在线人数采样已启动，间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止采样"""
+        self._stop_event.set()
+        if self._loop is not None:
+            self._loop.remove(self)
+            self._loop = None
+
+    def is_running(self):
+        if self._loop is not None:
+            return self._loop.is_running()
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait_seconds(self):
+        """距下一次采样的真实等待时间(秒)"""
+        return self.buffer.clock.wall_seconds(self.current_interval)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception:
+                # 错误已在 sample 中记录并计入退避
+                pass
+            self._stop_event.wait(self.wait_seconds())
+
+    def sample(self):
+        """
+        立即采样一次
+
+        Returns:
+            tuple: (ts, value)
+        """
+        with self._sample_lock:
+            try:
+                value = self.source.get_active_users()
+            except Exception:
+                self.consecutive_errors += 1
+                self.current_interval = min(self.max_interval, self.interval * 2 ** self.consecutive_errors)
+                self.backoff_reason = f"连续 {self.consecutive_errors} 次查询失败"
+                logger.warning(f"sampler -- {self.backoff_reason}，{self.current_interval} 秒后重试")
+                raise
+
+            self.consecutive_errors = 0
+            sample = self.buffer.append(value)
+            if self.history is not None:
+                self.history.append(value, sample[0])
+            self._plan_interval(self.source.last_quota)
+            return sample
+
+    def _plan_interval(self, quota):
+        """按剩余配额计算下一次采样间隔"""
+        interval = self.interval
+        reason = None
+        for field, window in QUOTA_WINDOWS.items():
+            status = quota.get(field)
+            if not status or not status["consumed"]:
+                continue
+            usable = status["remaining"] * (1 - self.quota_reserve)
+            # 剩余配额在整个窗口内还能支撑的请求数
+            requests_left = usable / status["consumed"]
+            required = window / requests_left if requests_left > 0 else self.max_interval
+            if required > interval:
+                interval = required
+                reason = f"{field} 剩余 {status['remaining']}，单次消耗 {status['consumed']}"
+
+        interval = min(self.max_interval, interval)
+        if reason and interval != self.current_interval:
+            logger.warning(f"sampler -- GA配额紧张({reason})，采样间隔调整为 {interval:.0f} 秒")
+        elif not reason and self.backoff_reason:
+            logger.info(f"sampler -- 采样间隔恢复为 {interval} 秒")
+        self.current_interval = interval
+        self.backoff_reason = reason
+
+    def stats(self):
+        latest = self.buffer.latest()
+        return {
+            "running": self.is_running(),
+            "interval": self.interval,
+            "current_interval": round(self.current_interval, 2),
+            "backoff_reason": self.backoff_reason,
+            "consecutive_errors": self.consecutive_errors,
+            "buffer_size": len(self.buffer),
+            "latest": latest,
+            "latest_age_seconds": round(self.buffer.age(), 2) if latest else None
+        }
+
+
+class SamplingLoop:
+    """
+    多集群共用的采样调度
+
+    一个调度线程记录每个采样器的下一次采样时间，到期的采样提交到共用线程池执行；
+    同一个采样器上一次还没有完成时不重复提交，一个集群的GA查询变慢不影响其他集群按时采样
+    """
+
+    def __init__(self, executor):
+        """
+        初始化
+
+        Args:
+            executor (ThreadPoolExecutor): 执行采样的线程池
+        """
+        self.executor = executor
+        self._next_at = {}
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add(self, sampler):
+        """加入采样器，立即采样一次"""
+        with self._lock:
+            self._next_at[sampler] = time.monotonic()
+        self._ensure_started()
+        self._wakeup.set()
+
+    def remove(self, sampler):
+        with self._lock:
+            self._next_at.pop(sampler, None)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="user-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = [sampler for sampler, next_at in self._next_at.items()
+                       if next_at <= now and sampler not in self._busy]
+                self._busy.update(due)
+                pending = [next_at for sampler, next_at in self._next_at.items() if sampler not in self._busy]
+            for sampler in due:
+                self.executor.submit(self._sample, sampler)
+            timeout = max(0.0, min(pending) - now) if pending else None
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _sample(self, sampler):
+        try:
+            sampler.sample()
+        except Exception:
+            # 错误已在 sample 中记录并计入退避
+            pass
+        finally:
+            with self._lock:
+                self._busy.discard(sampler)
+                if sampler in self._next_at:
+                    self._next_at[sampler] = time.monotonic() + sampler.wait_seconds()
+            self._wakeup.set()
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def create_user_sampler(registry, history=None, conf=None):
+    """
+    根据配置创建采样器(不自动启动)
+
+    Args:
+        registry (ClientRegistry): 提供GA数据源的客户端注册表
+        history (TimeSeriesStore): 时序存储，为None时不持久化
+        conf: 配置对象，默认使用 conf.settings
+    """
+    if conf is None:
+        from conf import settings as conf
+    return UserSampler(
+        registry.active_user_source(),
+        SignalBuffer(conf.SAMPLE_BUFFER_SIZE, clock=registry.clock()),
+        history=history,
+        interval=conf.SAMPLE_INTERVAL,
+        max_interval=conf.SAMPLE_MAX_INTERVAL,
+        quota_reserve=conf.GA_QUOTA_RESERVE
+    )
+
+
+def get_user_sampler():
+    """获取进程内共享的采样器(不自动启动)"""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                from lib.clients import get_client_registry
+                from lib.timeseries import get_timeseries_store
+                _sampler = create_user_sampler(get_client_registry(), history=get_timeseries_store())
+    return _sampler
+
+
+def read_active_users(sampler, max_age):
+    """
+    读取最新在线人数，缓冲中的样本超过 max_age 秒或采样未启动时直接采样一次
+
+    Returns:
+        tuple: (ts, value)
+    """
+    latest = sampler.buffer.latest()
+    if latest is not None and sampler.buffer.clock.time() - latest[0] <= max_age:
+        return latest
+    return sampler.sample()
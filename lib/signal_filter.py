@@ -0,0 +1,214 @@
+# 在线人数信号过滤：离群值剔除 + 升降级迟滞 + 持久化冷却
+import sys
+import os
+import json
+import threading
+from bisect import bisect_left
+from collections import deque
+from statistics import median
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+from lib.clock import WallClock
+
+
+# MAD 换算为正态分布标准差的系数
+MAD_SCALE = 1.4826
+
+DIRECTION_UP = "up"
+DIRECTION_DOWN = "down"
+DIRECTION_HOLD = "hold"
+
+
+class SignalFilter:
+    """
+    级别变更前的信号过滤
+
+    1. 在最近 window 个样本上用 中位数/MAD 判断离群值，离群样本用中位数代替
+    2. 升级需要连续 up_consecutive 次读数都高于当前级别
+    3. 降级需要读数低于下一档级别容量的 down_ratio 倍(比升级阈值更低的区间)
+    4. 同一级别扩容后 cooldown_seconds 内不重复扩容，冷却和连续计数保存在状态文件中，重启后不丢失
+    """
+
+    def __init__(self, state_file, window=10, min_samples=5, mad_threshold=3.5,
+                 up_consecutive=2, down_ratio=0.8, cooldown_seconds=600, clock=None):
+        """
+        初始化信号过滤
+
+        Args:
+            state_file (str): 状态文件路径
+            window (int): 离群判断的滑动窗口大小
+            min_samples (int): 窗口内样本数少于该值时不做离群判断
+            mad_threshold (float): 偏离中位数超过多少个(换算后的)MAD视为离群
+            up_consecutive (int): 升级需要的连续读数次数
+            down_ratio (float): 降级阈值比例 0~1
+            cooldown_seconds (int): 同一级别扩容的冷却时间(秒)
+            clock: 冷却计时使用的时钟，默认系统时间
+        """
+        self.state_file = state_file
+        self.min_samples = min_samples
+        self.mad_threshold = mad_threshold
+        self.up_consecutive = max(1, up_consecutive)
+        self.down_ratio = down_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock or WallClock()
+
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = {"up_streak": 0, "up_history": [], "last_scaling_time": None, "last_level": None}
+        self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as file:
+                self.state.update(json.load(file))
+            logger.info(f"signal filter -- 已恢复状态: {self.state}")
+        except Exception as e:
+            logger.error(f"signal filter -- 读取状态文件 {self.state_file} 失败: {str(e)}")
+
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as file:
+                json.dump(self.state, file)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.error(f"signal filter -- 写入状态文件 {self.state_file} 失败: {str(e)}")
+
+    def warm_up(self, values):
+        """用历史样本填充滑动窗口"""
+        with self._lock:
+            self.samples.extend(values)
+
+    def filter(self, value):
+        """
+        离群值过滤
+
+        Args:
+            value (int): 原始在线人数
+
+        Returns:
+            tuple: (过滤后的值, 是否离群)
+        """
+        with self._lock:
+            window = list(self.samples)
+            # 原始值进入窗口，持续的水平变化会在半个窗口后成为新的中位数
+            self.samples.append(value)
+
+        if len(window) < self.min_samples:
+            return value, False
+
+        center = median(window)
+        mad = median(abs(sample - center) for sample in window) * MAD_SCALE
+        if mad == 0:
+            # 窗口内读数完全一致时用1人作为最小尺度，避免任何变化都被判为离群
+            mad = 1
+        score = abs(value - center) / mad
+        if score > self.mad_threshold:
+            logger.info(f"signal filter -- 读数 {value} 偏离中位数 {center} {score:.1f} 个MAD，按离群值处理")
+            return int(center), True
+        return value, False
+
+    def evaluate(self, user_count, current_capacity, target_capacity, capacities, earlier_targets=(), latest_is_new=True):
+        """
+        根据迟滞规则判断是否允许变更级别，每个检查周期调用一次
+
+        连续次数按读数计算: 上次判断之后采样到的每个读数都计入，
+        连续 up_consecutive 个读数需要的时间是 up_consecutive × 采样间隔，而不是检查间隔
+
+        Args:
+            user_count (int): 过滤后的在线人数(最新读数)
+            current_capacity (int): 当前配置级别
+            target_capacity (int): 按在线人数计算的目标级别
+            capacities (tuple): 所有级别容量，升序
+            earlier_targets (list): 上次判断之后、最新读数之前的各个读数对应的目标级别，按时间递增
+            latest_is_new (bool): 最新读数是否是上次判断之后的新读数，没有新样本时不重复计数
+
+        Returns:
+            dict: {"direction", "allowed", "target_capacity", "reason"}
+        """
+        with self._lock:
+            for capacity in earlier_targets:
+                self._count_reading(capacity, current_capacity)
+            if latest_is_new:
+                self._count_reading(target_capacity, current_capacity)
+
+            if target_capacity > current_capacity:
+                direction = DIRECTION_UP
+                history = self.state["up_history"] or [target_capacity]
+                streak = self.state["up_streak"]
+                # 连续多次的目标级别取最小值，避免被最后一次读数放大
+                confirmed_capacity = min(history)
+                if streak < self.up_consecutive:
+                    allowed = False
+                    reason = f"读数 {user_count} 高于当前级别 {current_capacity}，连续 {streak}/{self.up_consecutive} 次，暂不升级"
+                elif self._in_cooldown(confirmed_capacity):
+                    allowed = False
+                    reason = f"最近已执行过级别 {confirmed_capacity} 的扩容，冷却中"
+                else:
+                    allowed = True
+                    reason = f"读数连续 {streak} 次高于当前级别 {current_capacity}，升级到 {confirmed_capacity}"
+                target_capacity = confirmed_capacity
+            else:
+                if target_capacity < current_capacity:
+                    direction = DIRECTION_DOWN
+                    index = bisect_left(capacities, current_capacity)
+                    lower_capacity = capacities[index - 1] if index > 0 else 0
+                    threshold = lower_capacity * self.down_ratio
+                    allowed = user_count <= threshold
+                    if allowed:
+                        reason = f"读数 {user_count} 低于降级阈值 {threshold:.0f}(下一档 {lower_capacity} × {self.down_ratio})"
+                    else:
+                        reason = f"读数 {user_count} 未低于降级阈值 {threshold:.0f}，保持当前级别 {current_capacity}"
+                else:
+                    direction = DIRECTION_HOLD
+                    allowed = False
+                    reason = f"目标级别与当前级别相同 ({current_capacity})"
+            self._save_state()
+
+        return {"direction": direction, "allowed": allowed, "target_capacity": target_capacity, "reason": reason}
+
+    def _count_reading(self, target_capacity, current_capacity):
+        """一个读数计入连续次数，未高于当前级别时清零"""
+        if target_capacity is not None and target_capacity > current_capacity:
+            self.state["up_streak"] += 1
+            self.state["up_history"] = (self.state["up_history"] + [target_capacity])[-self.up_consecutive:]
+        else:
+            self.state["up_streak"] = 0
+            self.state["up_history"] = []
+
+    def _in_cooldown(self, level):
+        last_time = self.state["last_scaling_time"]
+        return (last_time is not None and self.state["last_level"] == level and
+                self.clock.time() - last_time < self.cooldown_seconds)
+
+    def record_scaling(self, level):
+        """记录一次已执行的扩容，开始冷却"""
+        with self._lock:
+            self.state["last_scaling_time"] = self.clock.time()
+            self.state["last_level"] = level
+            self.state["up_streak"] = 0
+            self.state["up_history"] = []
+            self._save_state()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.state, window=list(self.samples))
+
+
+def create_signal_filter(conf=None, clock=None):
+    """根据配置创建信号过滤"""
+    if conf is None:
+        from conf import settings as conf
+    return SignalFilter(
+        conf.SCALING_STATE_FILE,
+        window=conf.SIGNAL_WINDOW,
+        min_samples=conf.SIGNAL_MIN_SAMPLES,
+        mad_threshold=conf.SIGNAL_MAD_THRESHOLD,
+        up_consecutive=conf.SCALE_UP_CONSECUTIVE,
+        down_ratio=conf.SCALE_DOWN_RATIO,
+        cooldown_seconds=conf.SCALE_COOLDOWN_SECONDS,
+        clock=clock
+    )
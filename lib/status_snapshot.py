@@ -0,0 +1,114 @@
+# 后台定时刷新的状态快照
+import sys
+import os
+import json
+import time
+import hashlib
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+class SnapshotRefresher:
+    """
+    后台线程定时调用构建函数生成状态数据，内存中只保留最新的一份快照
+
+    内容变化时版本号递增，ETag 为内容的哈希，接口可以直接返回快照而不访问外部服务；
+    指定 etag_keys 时只按这些字段计算 ETag，其余统计类字段每次刷新都会更新但不影响版本号
+    """
+
+    def __init__(self, builder, interval=60, name="status", etag_keys=None):
+        """
+        初始化刷新器
+
+        Args:
+            builder (callable): 无参构建函数，返回可JSON序列化的字典
+            interval (int): 刷新间隔(秒)
+            name (str): 快照名称，用于日志和线程名
+            etag_keys (list): 参与计算 ETag 的顶层字段，为空时使用整个快照
+        """
+        self.builder = builder
+        self.interval = interval
+        self.name = name
+        self.etag_keys = etag_keys
+
+        self.version = 0
+        self.etag = None
+        self.payload = None
+        self.generated_at = None
+        self.build_ms = None
+        self.last_error = None
+
+        self._build_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台刷新线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-refresher", daemon=True)
+        self._thread.start()
+        logger.info(f"snapshot -- {self.name} 后台刷新已启动，间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止后台刷新线程"""
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.interval)
+
+    def refresh(self):
+        """
+        立即重建快照，构建失败时保留上一份快照
+
+        Returns:
+            bool: 是否构建成功
+        """
+        with self._build_lock:
+            start = time.perf_counter()
+            try:
+                payload = self.builder()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"snapshot -- {self.name} 构建失败: {str(e)}")
+                return False
+            finally:
+                self.build_ms = round((time.perf_counter() - start) * 1000, 2)
+
+            body = json.dumps(payload, sort_keys=True, default=str)
+            if self.etag_keys:
+                hashed = json.dumps({key: payload.get(key) for key in self.etag_keys}, sort_keys=True, default=str)
+            else:
+                hashed = body
+            etag = hashlib.sha1(hashed.encode("utf-8")).hexdigest()
+            if etag != self.etag:
+                self.version += 1
+                self.etag = etag
+            self.payload = json.loads(body)
+            self.generated_at = time.time()
+            self.last_error = None
+            logger.debug(f"snapshot -- {self.name} 已刷新，版本 {self.version}，耗时 {self.build_ms}ms")
+            return True
+
+    def get(self):
+        """
+        获取当前快照，尚未生成时同步构建一次
+
+        Returns:
+            dict: {"version", "etag", "generated_at", "age_seconds", "build_ms", "last_error", "data"}
+        """
+        if self.payload is None:
+            self.refresh()
+        return {
+            "version": self.version,
+            "etag": self.etag,
+            "generated_at": self.generated_at,
+            "age_seconds": round(time.time() - self.generated_at, 2) if self.generated_at else None,
+            "build_ms": self.build_ms,
+            "last_error": self.last_error,
+            "data": self.payload
+        }
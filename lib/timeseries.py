@@ -0,0 +1,286 @@
+# 在线人数时序存储：内存映射文件上的定长环形数组 + 自动降采样
+import sys
+import os
+import mmap
+import time
+import struct
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.logger import app_logger as logger
+
+
+# 文件头: 魔数, 版本, 记录长度, 容量, 下一个写入位置, 已写入记录数
+HEADER = struct.Struct("<4sIIIQQ")
+# 记录: 桶起始时间戳, 样本数, 最小值, 最大值, 总和
+RECORD = struct.Struct("<dIddd")
+MAGIC = b"ASTS"
+VERSION = 1
+
+# 原始样本之外的降采样级别: (名称, 桶宽度秒)
+ROLLUPS = (("1m", 60), ("1h", 3600), ("1d", 86400))
+
+
+class RingSeries:
+    """
+    单个分辨率的环形时序数组
+
+    记录按时间递增写入，写满后覆盖最旧的记录；数据直接读写内存映射文件，
+    进程重启后从文件恢复，按时间范围查询时用二分查找定位起止位置
+    """
+
+    def __init__(self, path, capacity):
+        """
+        打开或创建时序文件
+
+        Args:
+            path (str): 文件路径
+            capacity (int): 最多保留的记录数
+        """
+        self.path = path
+        self.capacity = capacity
+        size = HEADER.size + RECORD.size * capacity
+
+        exists = os.path.exists(path) and os.path.getsize(path) == size
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+        magic, version, record_size, file_capacity, head, count = HEADER.unpack_from(self._mm, 0)
+        if (magic, version, record_size, file_capacity) != (MAGIC, VERSION, RECORD.size, capacity):
+            if exists:
+                logger.warning(f"timeseries -- {path} 格式或容量不匹配，重新初始化")
+            head, count = 0, 0
+            HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD.size, capacity, head, count)
+        self.head = head
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, index):
+        """逻辑下标(0为最旧)对应的文件偏移"""
+        physical = (self.head - self.count + index) % self.capacity
+        return HEADER.size + physical * RECORD.size
+
+    def _timestamp(self, index):
+        return struct.unpack_from("<d", self._mm, self._offset(index))[0]
+
+    def _write_header(self):
+        HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD.size, self.capacity, self.head, self.count)
+
+    def last(self):
+        """最新的一条记录，没有数据时返回None"""
+        if self.count == 0:
+            return None
+        return RECORD.unpack_from(self._mm, self._offset(self.count - 1))
+
+    def append(self, record):
+        """追加一条记录 (ts, count, min, max, sum)"""
+        RECORD.pack_into(self._mm, HEADER.size + self.head * RECORD.size, *record)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._write_header()
+
+    def replace_last(self, record):
+        """覆盖最新的一条记录，用于更新当前未结束的桶"""
+        RECORD.pack_into(self._mm, self._offset(self.count - 1), *record)
+
+    def _bisect(self, timestamp):
+        """第一个时间戳 >= timestamp 的逻辑下标"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start, end):
+        """
+        读取 [start, end) 时间范围内的记录
+
+        Returns:
+            list: [(ts, count, min, max, sum), ...]
+        """
+        first = self._bisect(start)
+        last = self._bisect(end)
+        return [RECORD.unpack_from(self._mm, self._offset(index)) for index in range(first, last)]
+
+    def oldest_timestamp(self):
+        return self._timestamp(0) if self.count else None
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+
+
+class TimeSeriesStore:
+    """
+    在线人数时序存储
+
+    原始样本写入 raw 环形数组，同时更新 1分钟/1小时/1天 三个降采样数组(最小/最大/平均)，
+    查询时自动选择不超过步长的最粗分辨率，再按步长合并
+    """
+
+    def __init__(self, directory, raw_capacity=200000, minute_capacity=131040,
+                 hour_capacity=43800, day_capacity=3650):
+        """
+        初始化时序存储
+
+        Args:
+            directory (str): 数据文件目录
+            raw_capacity (int): 原始样本保留条数
+            minute_capacity (int): 1分钟降采样保留条数(默认约91天)
+            hour_capacity (int): 1小时降采样保留条数(默认约5年)
+            day_capacity (int): 1天降采样保留条数(默认约10年)
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.RLock()
+        self.raw = RingSeries(os.path.join(directory, "raw.ts"), raw_capacity)
+        capacities = {"1m": minute_capacity, "1h": hour_capacity, "1d": day_capacity}
+        # (桶宽度, 数组)，按分辨率从细到粗
+        self.tiers = [(0, self.raw)] + [
+            (width, RingSeries(os.path.join(directory, f"{name}.ts"), capacities[name]))
+            for name, width in ROLLUPS
+        ]
+        logger.info(f"timeseries -- 已打开时序存储 {directory}，原始样本 {len(self.raw)} 条")
+
+    def append(self, value, timestamp=None):
+        """
+        写入一个样本
+
+        Args:
+            value (int|float): 在线人数
+            timestamp (float): 采样时间戳(秒)，默认当前时间
+
+        Returns:
+            bool: 是否写入(早于最新样本的时间戳会被丢弃)
+        """
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        value = float(value)
+        with self._lock:
+            last = self.raw.last()
+            if last is not None and timestamp <= last[0]:
+                logger.warning(f"timeseries -- 丢弃乱序样本 {timestamp} <= {last[0]}")
+                return False
+            self.raw.append((timestamp, 1, value, value, value))
+
+            for width, series in self.tiers[1:]:
+                bucket = timestamp - timestamp % width
+                last = series.last()
+                if last is not None and last[0] == bucket:
+                    _, count, low, high, total = last
+                    series.replace_last((bucket, count + 1, min(low, value), max(high, value), total + value))
+                else:
+                    series.append((bucket, 1, value, value, value))
+            return True
+
+    def latest(self, limit=1):
+        """
+        最近的原始样本
+
+        Returns:
+            list: [(ts, value), ...] 按时间递增
+        """
+        with self._lock:
+            count = len(self.raw)
+            if count == 0:
+                return []
+            start = self.raw._timestamp(max(0, count - limit))
+            return [(record[0], record[2]) for record in self.raw.range(start, float("inf"))]
+
+    def _choose_tier(self, step):
+        """选择分辨率不超过步长的最粗数组，越粗的数组保留的时间越长"""
+        chosen = self.tiers[0]
+        for width, series in self.tiers[1:]:
+            if width > step:
+                break
+            if len(series):
+                chosen = (width, series)
+        return chosen
+
+    def query(self, start, end, step=None, max_points=1000):
+        """
+        按时间范围查询
+
+        Args:
+            start (float): 起始时间戳(包含)
+            end (float): 结束时间戳(不包含)
+            step (int): 步长(秒)，为None时按 max_points 自动计算
+            max_points (int): 未指定步长时返回的最大点数
+
+        Returns:
+            dict: {"step", "resolution", "points": [{"ts", "min", "max", "avg", "count"}]}
+        """
+        if end <= start:
+            return {"step": step, "resolution": None, "points": []}
+        if not step:
+            step = max(1, int((end - start) / max_points) + 1)
+
+        with self._lock:
+            width, series = self._choose_tier(step)
+            # 降采样桶按起始时间存储，向前对齐以包含跨越起点的桶
+            records = series.range(start - start % width if width else start, end)
+
+        points = []
+        current = None
+        for ts, count, low, high, total in records:
+            bucket = ts - ts % step
+            if current is None or current[0] != bucket:
+                current = [bucket, count, low, high, total]
+                points.append(current)
+            else:
+                current[1] += count
+                current[2] = min(current[2], low)
+                current[3] = max(current[3], high)
+                current[4] += total
+
+        return {
+            "step": step,
+            "resolution": width or "raw",
+            "points": [
+                {"ts": ts, "min": low, "max": high, "avg": round(total / count, 2), "count": count}
+                for ts, count, low, high, total in points
+            ]
+        }
+
+    def flush(self):
+        with self._lock:
+            for _, series in self.tiers:
+                series.flush()
+
+    def close(self):
+        with self._lock:
+            for _, series in self.tiers:
+                series.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_timeseries_store(conf=None):
+    """根据配置创建时序存储"""
+    if conf is None:
+        from conf import settings as conf
+    return TimeSeriesStore(
+        conf.HISTORY_DIR,
+        raw_capacity=conf.HISTORY_RAW_CAPACITY
+    )
+
+
+def get_timeseries_store():
+    """获取进程内共享的时序存储"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_timeseries_store()
+    return _store
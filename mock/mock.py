@@ -1,7 +1,9 @@
 from flask import Flask, jsonify, request
-import time
+import os
 import logging
+import argparse
 import datetime
+from simulator import Simulator, LinearScenario, VirtualClock, create_scenario
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,149 +13,212 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# 基础配置
+# 基础配置(默认的线性增长场景)
 INITIAL_USERS = 6
 GROWTH_RATE = 3
 PAUSE_THRESHOLDS = [500,600,1000, 2000, 3000, 4000]  # 需要暂停的人数节点
 
+DEFAULT_SCENARIO = "default"
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios.yaml")
+
 # 状态变量
-start_time = time.time()
 start_datetime = datetime.datetime.now()
-paused = False
-pause_time = None
-accumulated_time = 0  # 累计已经暂停的时间
-current_threshold_index = 0  # 当前处理的阈值索引
-
-def calculate_online_users():
-    global paused, pause_time, accumulated_time, current_threshold_index
-    
-    # 计算实际流逝的时间（减去暂停的时间）
-    if paused:
-        effective_elapsed_seconds = pause_time - start_time - accumulated_time
-    else:
-        effective_elapsed_seconds = time.time() - start_time - accumulated_time
-    
-    # 计算当前理论上的用户数
-    additional_users = int(effective_elapsed_seconds * GROWTH_RATE)
-    current_users = INITIAL_USERS + additional_users
-    
-    # 检查是否需要暂停
-    if (not paused and 
-        current_threshold_index < len(PAUSE_THRESHOLDS) and 
-        current_users >= PAUSE_THRESHOLDS[current_threshold_index]):
-        paused = True
-        pause_time = time.time()
-        logger.info(f"已达到 {PAUSE_THRESHOLDS[current_threshold_index]} 人，增长已暂停")
-    
-    # 如果已暂停，返回暂停时的人数
-    if paused:
-        return PAUSE_THRESHOLDS[current_threshold_index]
-    
-    return current_users
+simulator = Simulator()
+# 不带 scenario 参数的请求使用的场景
+default_scenario = DEFAULT_SCENARIO
+
+
+def create_default_scenario():
+    return LinearScenario(DEFAULT_SCENARIO, INITIAL_USERS, GROWTH_RATE, PAUSE_THRESHOLDS, VirtualClock())
+
+
+simulator.add(create_default_scenario())
+
+
+def get_scenario():
+    """按 ?scenario= 参数选择场景，返回 (场景, 错误响应)"""
+    name = request.args.get('scenario', default_scenario)
+    return get_named_scenario(name)
+
+
+def get_named_scenario(name):
+    try:
+        return simulator.get(name), None
+    except KeyError:
+        return None, (jsonify({'status': 'error', 'message': f'场景 {name} 不存在', 'scenarios': simulator.names()}), 404)
+
 
 @app.route('/api/online-users', methods=['GET'])
 def get_online_users():
-    current_users = calculate_online_users()
-    current_time = datetime.datetime.now()
-    
+    scenario, error = get_scenario()
+    if error:
+        return error
+    current_users = scenario.online_users()
+    clock = scenario.clock.status()
+
     response = {
         'online_users': current_users,
+        'scenario': scenario.name,
         'start_time': start_datetime.isoformat(),
-        'current_time': current_time.isoformat(),
-        'elapsed_seconds': int(time.time() - start_time - accumulated_time),
-        'growth_rate': f"{GROWTH_RATE}",
-        'paused': paused
+        'current_time': datetime.datetime.now().isoformat(),
+        'virtual_time': datetime.datetime.fromtimestamp(clock['virtual_time']).isoformat(),
+        'virtual_timestamp': clock['virtual_time'],
+        'elapsed_seconds': int(clock['elapsed_seconds']),
+        'speed': clock['speed'],
+        'paused': clock['paused']
     }
-    
-    # 如果处于暂停状态，添加额外信息
-    if paused:
-        response['paused_at'] = PAUSE_THRESHOLDS[current_threshold_index]
-        response['pause_duration'] = int(time.time() - pause_time) if pause_time else 0
-    
+
+    if isinstance(scenario, LinearScenario):
+        response['growth_rate'] = f"{scenario.growth_rate}"
+        # 如果处于暂停状态，添加额外信息
+        if scenario.paused:
+            response['paused_at'] = scenario.next_threshold
+            response['pause_duration'] = scenario.pause_duration()
+
     return jsonify(response)
 
 @app.route('/api/continue-growth', methods=['POST'])
 def continue_growth():
-    """继续增长的API端点"""
-    global paused, accumulated_time, current_threshold_index
-    
-    if not paused:
+    """继续增长的API端点(线性增长场景)"""
+    scenario, error = get_scenario()
+    if error:
+        return error
+    if not isinstance(scenario, LinearScenario):
+        return jsonify({
+            'status': 'error',
+            'message': f'场景 {scenario.name} 不是线性增长场景'
+        }), 400
+
+    result = scenario.continue_growth()
+    if result is None:
         return jsonify({
             'status': 'error',
             'message': '当前未处于暂停状态'
         }), 400
-    
-    # 计算已暂停的时间并累加
-    pause_duration = time.time() - pause_time
-    accumulated_time += pause_duration
-    
-    # 更新状态
-    paused = False
-    current_threshold_index += 1
-    
-    logger.info(f"继续增长，已在 {PAUSE_THRESHOLDS[current_threshold_index-1]} 人处暂停了 {int(pause_duration)} 秒")
-    
+
+    threshold, pause_duration = result
+    logger.info(f"继续增长，已在 {threshold} 人处暂停了 {pause_duration} 秒")
+
     return jsonify({
         'status': 'success',
-        'message': f'增长已继续，已在 {PAUSE_THRESHOLDS[current_threshold_index-1]} 人处暂停了 {int(pause_duration)} 秒',
-        'next_pause': PAUSE_THRESHOLDS[current_threshold_index] if current_threshold_index < len(PAUSE_THRESHOLDS) else None
+        'message': f'增长已继续，已在 {threshold} 人处暂停了 {pause_duration} 秒',
+        'next_pause': scenario.next_threshold
     })
 
 @app.route('/api/reset', methods=['POST'])
 def reset_simulation():
-    """重置模拟器"""
-    global start_time, start_datetime, paused, pause_time, accumulated_time, current_threshold_index
-    
-    start_time = time.time()
-    start_datetime = datetime.datetime.now()
-    paused = False
-    pause_time = None
-    accumulated_time = 0
-    current_threshold_index = 0
-    
-    logger.info("模拟器已重置")
-    
+    """重置模拟器(场景的虚拟时钟回到起点)"""
+    scenario, error = get_scenario()
+    if error:
+        return error
+    scenario.reset()
+
+    logger.info(f"模拟器场景 {scenario.name} 已重置")
+
     return jsonify({
         'status': 'success',
         'message': '模拟器已重置',
-        'online_users': INITIAL_USERS
+        'online_users': scenario.online_users()
     })
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """获取当前模拟器状态"""
-    current_users = calculate_online_users()
-    
-    status = {
-        'online_users': current_users,
-        'paused': paused,
-        'initial_users': INITIAL_USERS,
-        'growth_rate': GROWTH_RATE,
-        'pause_thresholds': PAUSE_THRESHOLDS,
-        'elapsed_seconds': int(time.time() - start_time - accumulated_time),
-    }
-    
-    if paused:
-        status['current_pause_threshold'] = PAUSE_THRESHOLDS[current_threshold_index]
-        status['pause_duration'] = int(time.time() - pause_time) if pause_time else 0
-    
-    if current_threshold_index < len(PAUSE_THRESHOLDS):
-        status['next_pause_threshold'] = PAUSE_THRESHOLDS[current_threshold_index]
-    else:
-        status['next_pause_threshold'] = None
-    
+    scenario, error = get_scenario()
+    if error:
+        return error
+    status = scenario.status()
+    status['elapsed_seconds'] = int(status['clock']['elapsed_seconds'])
+    if 'paused' not in status:
+        status['paused'] = status['clock']['paused']
     return jsonify(status)
 
+@app.route('/api/clock', methods=['GET', 'POST'])
+def scenario_clock():
+    """
+    查看或调整场景的虚拟时钟
+
+    POST 参数(JSON): speed 倍速，seek 跳转到的已播放秒数，paused 是否暂停
+    """
+    scenario, error = get_scenario()
+    if error:
+        return error
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        try:
+            if 'speed' in body:
+                scenario.clock.set_speed(float(body['speed']))
+            if 'seek' in body:
+                scenario.clock.seek(float(body['seek']))
+            if 'paused' in body:
+                scenario.clock.pause() if body['paused'] else scenario.clock.resume()
+        except (TypeError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        logger.info(f"场景 {scenario.name} 时钟已调整: {body}")
+    return jsonify(dict(scenario.clock.status(), scenario=scenario.name))
+
+@app.route('/api/scenarios', methods=['GET'])
+def list_scenarios():
+    """所有场景的状态"""
+    scenarios = []
+    for name in simulator.names():
+        scenario, _ = get_named_scenario(name)
+        if scenario is not None:
+            scenarios.append(scenario.status())
+    return jsonify({'default': default_scenario, 'scenarios': scenarios})
+
+@app.route('/api/scenarios/<name>', methods=['GET', 'PUT', 'DELETE'])
+def manage_scenario(name):
+    """
+    查看、创建(替换)或删除场景
+
+    PUT 参数(JSON)与 scenarios.yaml 中单个场景的定义相同，例如
+    {"trace": {"type": "csv", "path": "/data/users.csv"}, "speed": 600}
+    """
+    if request.method == 'PUT':
+        try:
+            scenario = simulator.add(create_scenario(name, request.get_json(force=True)))
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            return jsonify({'status': 'error', 'message': f'创建场景失败: {e}'}), 400
+        logger.info(f"已创建场景 {name}")
+        return jsonify(scenario.status())
+
+    scenario, error = get_named_scenario(name)
+    if error:
+        return error
+    if request.method == 'DELETE':
+        if name == default_scenario:
+            return jsonify({'status': 'error', 'message': '不能删除默认场景'}), 400
+        simulator.remove(name)
+        logger.info(f"已删除场景 {name}")
+        return jsonify({'status': 'success', 'message': f'场景 {name} 已删除'})
+    return jsonify(scenario.status())
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok', 'service': 'online-users-simulator'})
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="在线人数模拟服务")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--scenarios", default=SCENARIOS_FILE, help="场景定义文件，不存在时只有默认的线性增长场景")
+    parser.add_argument("--default", default=DEFAULT_SCENARIO, help="不带 scenario 参数的请求使用的场景")
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    port = 5000
-    logger.info(f"在线人数模拟服务启动于端口 {port}")
+    args = parse_args()
+    port = args.port
+    if os.path.exists(args.scenarios):
+        names = simulator.load_file(args.scenarios)
+        logger.info(f"已从 {args.scenarios} 加载场景: {names}")
+    if args.default not in simulator.names():
+        raise SystemExit(f"默认场景 {args.default} 不存在，可选: {simulator.names()}")
+    default_scenario = args.default
+
+    logger.info(f"在线人数模拟服务启动于端口 {port}，默认场景: {default_scenario}")
     logger.info(f"初始人数: {INITIAL_USERS}, 增长率: {GROWTH_RATE} 人/秒")
     logger.info(f"将在以下人数节点暂停: {PAUSE_THRESHOLDS}")
-    logger.info(f"访问 http://localhost:{port}/api/online-users 获取在线人数")
+    logger.info(f"访问 http://localhost:{port}/api/online-users?scenario=<名称> 获取在线人数")
     logger.info(f"使用 POST 请求 http://localhost:{port}/api/continue-growth 继续增长")
-    
+
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,280 @@
+# 在线人数模拟器: 每个场景一个虚拟时钟，按加速后的时钟播放曲线
+import sys
+import os
+import time
+import threading
+import yaml
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from traces import load_trace
+
+
+class VirtualClock:
+    """
+    可加速、暂停和跳转的虚拟时钟
+
+    虚拟时间 = 起始时间 + 已播放秒数，已播放秒数只在运行时按 speed 倍速随真实时间增长
+    """
+
+    def __init__(self, speed=1.0, start=None):
+        """
+        初始化
+
+        Args:
+            speed (float): 倍速，3600 表示真实1秒等于虚拟1小时
+            start (float): 虚拟起始时间戳，默认当前时间
+        """
+        if speed <= 0:
+            raise ValueError(f"倍速必须大于0: {speed}")
+        self._lock = threading.Lock()
+        self.speed = float(speed)
+        self.start = time.time() if start is None else float(start)
+        self._played = 0.0
+        self._anchor = time.monotonic()
+        self.paused = False
+
+    def _advance(self):
+        now = time.monotonic()
+        if not self.paused:
+            self._played += (now - self._anchor) * self.speed
+        self._anchor = now
+
+    def elapsed(self):
+        """已播放的虚拟秒数"""
+        with self._lock:
+            self._advance()
+            return self._played
+
+    def now(self):
+        """当前虚拟时间戳"""
+        return self.start + self.elapsed()
+
+    def pause(self):
+        with self._lock:
+            self._advance()
+            self.paused = True
+
+    def resume(self):
+        with self._lock:
+            self._advance()
+            self.paused = False
+
+    def set_speed(self, speed):
+        if speed <= 0:
+            raise ValueError(f"倍速必须大于0: {speed}")
+        with self._lock:
+            self._advance()
+            self.speed = float(speed)
+
+    def seek(self, elapsed):
+        """跳转到指定的已播放秒数"""
+        with self._lock:
+            self._advance()
+            self._played = max(0.0, float(elapsed))
+
+    def reset(self):
+        with self._lock:
+            self._played = 0.0
+            self._anchor = time.monotonic()
+            self.paused = False
+
+    def status(self):
+        elapsed = self.elapsed()
+        return {
+            "virtual_time": self.start + elapsed,
+            "elapsed_seconds": round(elapsed, 3),
+            "speed": self.speed,
+            "paused": self.paused
+        }
+
+
+class TraceScenario:
+    """按虚拟时钟播放一条曲线的场景"""
+
+    kind = "trace"
+
+    def __init__(self, name, trace, clock):
+        self.name = name
+        self.trace = trace
+        self.clock = clock
+
+    def online_users(self):
+        return self.trace.value_at(self.clock.elapsed())
+
+    def reset(self):
+        self.clock.reset()
+
+    def status(self):
+        elapsed = self.clock.elapsed()
+        finished = not self.trace.loop and elapsed >= self.trace.duration
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "online_users": self.trace.value_at(elapsed),
+            "clock": self.clock.status(),
+            "trace": self.trace.describe(),
+            "finished": finished
+        }
+
+
+class LinearScenario:
+    """
+    原有的线性增长模拟: 从 initial_users 开始每秒增长 growth_rate 人，
+    到达 pause_thresholds 中的人数节点后暂停，调用 continue_growth 后继续
+    """
+
+    kind = "linear"
+
+    def __init__(self, name, initial_users, growth_rate, pause_thresholds, clock):
+        self.name = name
+        self.initial_users = initial_users
+        self.growth_rate = growth_rate
+        self.pause_thresholds = list(pause_thresholds)
+        self.clock = clock
+        self.threshold_index = 0
+        self.pause_real_time = None
+        self._lock = threading.Lock()
+
+    @property
+    def paused(self):
+        return self.pause_real_time is not None
+
+    @property
+    def next_threshold(self):
+        if self.threshold_index < len(self.pause_thresholds):
+            return self.pause_thresholds[self.threshold_index]
+        return None
+
+    def online_users(self):
+        with self._lock:
+            if self.paused:
+                return self.next_threshold
+            current = self.initial_users + int(self.clock.elapsed() * self.growth_rate)
+            threshold = self.next_threshold
+            if threshold is not None and current >= threshold:
+                self.clock.pause()
+                self.pause_real_time = time.time()
+                return threshold
+            return current
+
+    def pause_duration(self):
+        return int(time.time() - self.pause_real_time) if self.paused else 0
+
+    def continue_growth(self):
+        """
+        从暂停的人数节点继续增长
+
+        Returns:
+            tuple: (暂停的人数节点, 暂停秒数)，未暂停时返回 None
+        """
+        with self._lock:
+            if not self.paused:
+                return None
+            threshold, duration = self.next_threshold, self.pause_duration()
+            self.threshold_index += 1
+            self.pause_real_time = None
+            # 暂停期间时钟停止，恢复后人数从暂停节点对应的时间点继续增长
+            if self.growth_rate:
+                self.clock.seek((threshold - self.initial_users) / self.growth_rate)
+            self.clock.resume()
+            return threshold, duration
+
+    def reset(self):
+        with self._lock:
+            self.threshold_index = 0
+            self.pause_real_time = None
+            self.clock.reset()
+
+    def status(self):
+        users = self.online_users()
+        status = {
+            "name": self.name,
+            "kind": self.kind,
+            "online_users": users,
+            "clock": self.clock.status(),
+            "paused": self.paused,
+            "initial_users": self.initial_users,
+            "growth_rate": self.growth_rate,
+            "pause_thresholds": self.pause_thresholds,
+            "next_pause_threshold": self.next_threshold
+        }
+        if self.paused:
+            status["current_pause_threshold"] = self.next_threshold
+            status["pause_duration"] = self.pause_duration()
+        return status
+
+
+def create_scenario(name, spec, base_dir=None):
+    """
+    按定义创建场景
+
+    Args:
+        name (str): 场景名称
+        spec (dict): trace 为曲线定义(见 traces.load_trace)，linear 为线性增长参数，
+            speed 为倍速，start 为虚拟起始时间(默认曲线本身的起始时间，相对时间的曲线为当前时间)
+        base_dir (str): 曲线文件相对路径的基准目录
+    """
+    spec = dict(spec)
+    speed = spec.pop("speed", 1.0)
+    start = spec.pop("start", None)
+    if "linear" in spec:
+        linear = spec["linear"]
+        clock = VirtualClock(speed, start)
+        return LinearScenario(
+            name, linear.get("initial_users", 6), linear.get("growth_rate", 3),
+            linear.get("pause_thresholds", []), clock
+        )
+    if "trace" not in spec:
+        raise ValueError(f"场景 {name} 需要 trace 或 linear 定义")
+
+    trace_spec = dict(spec["trace"])
+    path = trace_spec.get("path")
+    if path and base_dir and not os.path.isabs(path):
+        trace_spec["path"] = os.path.join(base_dir, path)
+    trace = load_trace(trace_spec)
+    if start is None and trace.start > 0:
+        # 录制的绝对时间曲线按原始时间播放，便于和线上日志对照
+        start = trace.start
+    return TraceScenario(name, trace, VirtualClock(speed, start))
+
+
+class Simulator:
+    """多个命名场景，同时播放、互不影响"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scenarios = {}
+
+    def add(self, scenario):
+        with self._lock:
+            self.scenarios[scenario.name] = scenario
+        return scenario
+
+    def get(self, name):
+        """
+        Raises:
+            KeyError: 场景不存在
+        """
+        with self._lock:
+            return self.scenarios[name]
+
+    def remove(self, name):
+        with self._lock:
+            return self.scenarios.pop(name)
+
+    def names(self):
+        with self._lock:
+            return sorted(self.scenarios)
+
+    def load_file(self, path):
+        """
+        从YAML文件加载场景: {scenarios: {名称: 定义}}，曲线文件的相对路径相对于该文件
+
+        Returns:
+            list: 加载的场景名称
+        """
+        with open(path, encoding="utf-8") as f:
+            definitions = (yaml.safe_load(f) or {}).get("scenarios") or {}
+        base_dir = os.path.dirname(os.path.abspath(path))
+        for name, spec in definitions.items():
+            self.add(create_scenario(name, spec, base_dir))
+        return list(definitions)
@@ -0,0 +1,227 @@
+# 在线人数曲线: 从 CSV、JSONL、时序存储加载，或按参数生成每日波动、突发流量
+import sys
+import os
+import csv
+import json
+import math
+import bisect
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# 时间列和人数列的候选列名，按顺序取第一个存在的
+TIME_FIELDS = ("ts", "timestamp", "time", "offset")
+VALUE_FIELDS = ("users", "online_users", "value", "avg")
+
+INTERPOLATION_LINEAR = "linear"
+INTERPOLATION_STEP = "step"
+
+
+def parse_time(value):
+    """秒级时间戳、相对秒数或ISO时间字符串 -> 秒"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _pick(row, fields, path):
+    for field in fields:
+        if row.get(field) not in (None, ""):
+            return row[field]
+    raise ValueError(f"{path} 缺少列 {'/'.join(fields)}: {row}")
+
+
+class Trace:
+    """
+    一条在线人数曲线
+
+    点按时间排序后转换为相对起点的偏移量，按偏移量取值时在相邻两点之间插值，
+    超出曲线长度时循环播放或停在最后一个点
+    """
+
+    def __init__(self, points, interpolation=INTERPOLATION_LINEAR, loop=False, scale=1.0, source=None):
+        """
+        初始化
+
+        Args:
+            points (list): [(时间秒, 人数), ...]，时间可以是时间戳或相对秒数
+            interpolation (str): linear 线性插值，step 保持上一个点的值
+            loop (bool): 播放到末尾后是否从头循环
+            scale (float): 人数缩放倍数，用于把小环境的曲线放大
+            source (str): 曲线来源说明
+        """
+        if not points:
+            raise ValueError(f"曲线 {source} 没有数据点")
+        if interpolation not in (INTERPOLATION_LINEAR, INTERPOLATION_STEP):
+            raise ValueError(f"不支持的插值方式: {interpolation}")
+        points = sorted((float(ts), float(value)) for ts, value in points)
+        self.start = points[0][0]
+        self.offsets = [ts - self.start for ts, _ in points]
+        self.values = [value for _, value in points]
+        self.interpolation = interpolation
+        self.loop = loop
+        self.scale = scale
+        self.source = source
+
+    @property
+    def duration(self):
+        """曲线长度(秒)"""
+        return self.offsets[-1]
+
+    def value_at(self, offset):
+        """
+        按相对起点的秒数取在线人数
+
+        Returns:
+            int: 在线人数
+        """
+        if self.loop and self.duration > 0:
+            offset %= self.duration
+        index = bisect.bisect_right(self.offsets, offset) - 1
+        if index < 0:
+            value = self.values[0]
+        elif index >= len(self.offsets) - 1:
+            value = self.values[-1]
+        elif self.interpolation == INTERPOLATION_STEP:
+            value = self.values[index]
+        else:
+            left, right = self.offsets[index], self.offsets[index + 1]
+            ratio = (offset - left) / (right - left) if right > left else 0
+            value = self.values[index] + (self.values[index + 1] - self.values[index]) * ratio
+        return max(0, int(round(value * self.scale)))
+
+    def describe(self):
+        return {
+            "source": self.source,
+            "points": len(self.offsets),
+            "duration_seconds": self.duration,
+            "start": self.start,
+            "min": min(self.values) * self.scale,
+            "max": max(self.values) * self.scale,
+            "interpolation": self.interpolation,
+            "loop": self.loop,
+            "scale": self.scale
+        }
+
+
+def load_csv(path, time_field=None, value_field=None):
+    """读取带表头的CSV，默认时间列为 ts/timestamp/time/offset，人数列为 users/online_users/value/avg"""
+    time_fields = (time_field,) if time_field else TIME_FIELDS
+    value_fields = (value_field,) if value_field else VALUE_FIELDS
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            (parse_time(_pick(row, time_fields, path)), float(_pick(row, value_fields, path)))
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_jsonl(path, time_field=None, value_field=None):
+    """读取每行一个对象的JSONL，列名规则与 load_csv 相同，空行跳过"""
+    time_fields = (time_field,) if time_field else TIME_FIELDS
+    value_fields = (value_field,) if value_field else VALUE_FIELDS
+    points = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            points.append((parse_time(_pick(row, time_fields, path)), float(_pick(row, value_fields, path))))
+    return points
+
+
+def load_history(directory, start=None, end=None, step=60):
+    """
+    从在线人数时序存储(history_dir)读取曲线，取每个步长的平均值
+
+    Args:
+        directory (str): 时序存储目录
+        start (float|str): 起始时间，默认最早的数据
+        end (float|str): 结束时间，默认最新的数据
+        step (int): 步长(秒)
+    """
+    from lib.timeseries import TimeSeriesStore
+
+    if not os.path.isdir(directory):
+        raise ValueError(f"时序存储目录不存在: {directory}")
+    store = TimeSeriesStore(directory)
+    try:
+        if start is None:
+            start = min(
+                (series.oldest_timestamp() for _, series in store.tiers if len(series)),
+                default=0
+            )
+        latest = store.latest()
+        if end is None:
+            end = latest[0][0] + 1 if latest else 0
+        result = store.query(parse_time(start), parse_time(end), step=step)
+    finally:
+        store.close()
+    return [(point["ts"], point["avg"]) for point in result["points"]]
+
+
+def daily_wave(base, peak, days=7, period=86400, peak_hour=20, step=300, weekend_factor=1.0):
+    """
+    生成每日波动曲线: 每个周期内按余弦从 base 到 peak 再回落，峰值在 peak_hour 点
+
+    Args:
+        weekend_factor (float): 每周第6、7天的峰值倍数
+    """
+    points = []
+    phase = peak_hour / 24 * period
+    for ts in range(0, int(days * period) + 1, step):
+        day = int(ts // period)
+        factor = weekend_factor if day % 7 in (5, 6) else 1.0
+        wave = (1 + math.cos(2 * math.pi * (ts - phase) / period)) / 2
+        points.append((ts, base + (peak - base) * factor * wave))
+    return points
+
+
+def flash_crowd(base, peak, at=600, ramp=60, hold=600, decay=1800, duration=None):
+    """
+    生成突发流量曲线: at 秒时在 ramp 秒内从 base 涨到 peak，保持 hold 秒，再用 decay 秒回落到 base
+    """
+    rise_end = at + ramp
+    hold_end = rise_end + hold
+    decay_end = hold_end + decay
+    points = [(0, base), (at, base), (rise_end, peak), (hold_end, peak), (decay_end, base)]
+    if duration is not None and duration > decay_end:
+        points.append((duration, base))
+    return points
+
+
+def load_trace(spec):
+    """
+    按场景定义加载曲线
+
+    Args:
+        spec (dict): type 为 csv/jsonl/history/points/daily_wave/flash_crowd，其余键为对应的参数，
+            interpolation/loop/scale 为播放参数
+
+    Returns:
+        Trace: 曲线
+    """
+    spec = dict(spec)
+    kind = spec.pop("type")
+    play = {key: spec.pop(key) for key in ("interpolation", "loop", "scale") if key in spec}
+    if kind == "csv":
+        points, source = load_csv(spec["path"], spec.get("time_field"), spec.get("value_field")), spec["path"]
+    elif kind == "jsonl":
+        points, source = load_jsonl(spec["path"], spec.get("time_field"), spec.get("value_field")), spec["path"]
+    elif kind == "history":
+        from conf import settings
+        directory = spec.get("path") or settings.HISTORY_DIR
+        points = load_history(directory, spec.get("start"), spec.get("end"), spec.get("step", 60))
+        source = f"history:{directory}"
+    elif kind == "points":
+        points, source = spec["points"], "points"
+    elif kind == "daily_wave":
+        points, source = daily_wave(**spec), kind
+    elif kind == "flash_crowd":
+        points, source = flash_crowd(**spec), kind
+    else:
+        raise ValueError(f"不支持的曲线类型: {kind}")
+    return Trace(points, source=source, **play)
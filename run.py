@@ -1,10 +1,12 @@
 from app import create_app
 import sys
 import os
-from apscheduler.schedulers.background import BackgroundScheduler
-from concurrent.futures import ProcessPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.core import AutoScalingService
+from lib.sampler import get_user_sampler
+from lib.check_scheduler import start_check_scheduler
+from lib.cluster_controller import load_cluster_configs, start_cluster_controller
+from lib.leader_election import start_leader_elector
 from lib.logger import logger
 from conf import settings
 
@@ -12,45 +14,37 @@ app = create_app()
 
 def auto_scaling_scheduler():
     """使用BackgroundScheduler启动定时检查任务"""
+    import atexit
+
+    # 多副本部署时只有持有租约的副本执行伸缩检查，其他副本只提供查询接口
+    elector = start_leader_elector()
+    if elector is not None:
+        atexit.register(elector.stop)
+
+    # 配置了 clusters 时每个集群单独调度
+    cluster_configs = load_cluster_configs()
+    if cluster_configs:
+        controller = start_cluster_controller(cluster_configs)
+        atexit.register(controller.shutdown)
+        return controller
+
     auto_scaling = AutoScalingService()
-    
-    # 正确配置APScheduler
-    executors = {
-        'default': {'type': 'threadpool', 'max_workers': 1},
-        'processpool': {'type': 'processpool', 'max_workers': 1}  # 修正这里
-    }
-    
-    job_defaults = {
-        'coalesce': False,
-        'max_instances': 1
-    }
-    
-    scheduler = BackgroundScheduler(executors=executors, job_defaults=job_defaults)
-    
-    # 添加定时任务，每5分钟执行一次
-    scheduler.add_job(
-        auto_scaling.check_and_scale,
-        'interval',
-        minutes=settings.CHECK_TIME,
-        id='autoscaling_job'
-    )
-    
-    # 立即执行一次
-    scheduler.add_job(
-        auto_scaling.check_and_scale,
-        id='initial_check'
-    )
-    
-    # 启动调度器
-    scheduler.start()
-    logger.info("自动伸缩服务已启动，每5分钟执行一次检查")
+
+    # 高频采样在线人数，伸缩周期只读取采样缓冲
+    sampler = get_user_sampler()
+    sampler.start()
+
+    # 固定间隔(check_time)或按距离级别边界自适应调整间隔
+    check_scheduler = start_check_scheduler(auto_scaling)
     
     # 注册应用关闭时的清理函数
-    import atexit
-    atexit.register(lambda: scheduler.shutdown(wait=False))
-    atexit.register(lambda: auto_scaling.scaling_manager.close())
+    atexit.register(check_scheduler.shutdown)
+    atexit.register(sampler.stop)
+    atexit.register(lambda: auto_scaling.registry.close())
+    atexit.register(lambda: auto_scaling.actuation_engine.shutdown())
+    atexit.register(lambda: auto_scaling.history.close())
     
-    return scheduler
+    return check_scheduler
 
 
 if __name__ == '__main__':